@@ -0,0 +1,228 @@
+"""
+Flavor analytics rollups
+
+Answer counts are kept per coffee_sample x question_id x matched_answer x
+day in ``answer_rollups``, incremented in the same transaction that stores
+the answers. Distribution queries then read one row per option (and day)
+instead of every answer. ``rebuild_rollups`` recomputes the table from the
+answers, e.g. for data recorded before rollups existed.
+
+Usage:
+    python analytics.py --rebuild
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Date, select, update, delete, insert, func, literal, cast
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Answer, AnswerRollup, Session
+from question_graph import QUESTION_FLOW
+
+# Label used in responses for answers that matched no option
+UNMATCHED = "(unmatched)"
+
+RollupKey = Tuple[str, str, str, date]
+
+
+def rollup_key(coffee_sample: Optional[str], question_id: str, matched_answer: Optional[str],
+               timestamp: datetime) -> RollupKey:
+    return (coffee_sample or "", question_id, matched_answer or "", timestamp.date())
+
+
+async def increment_rollups(db: AsyncSession, keys: Iterable[RollupKey]):
+    """
+    Add one to the rollup row of every key (repeated keys add more). Runs in
+    the caller's transaction; does not commit.
+    """
+    for (coffee_sample, question_id, matched_answer, day), n in Counter(keys).items():
+        where = (
+            (AnswerRollup.coffee_sample == coffee_sample)
+            & (AnswerRollup.question_id == question_id)
+            & (AnswerRollup.matched_answer == matched_answer)
+            & (AnswerRollup.day == day)
+        )
+        result = await db.execute(update(AnswerRollup).where(where).values(count=AnswerRollup.count + n))
+        if result.rowcount:
+            continue
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(AnswerRollup).values(
+                    coffee_sample=coffee_sample, question_id=question_id,
+                    matched_answer=matched_answer, day=day, count=n,
+                ))
+        except IntegrityError:
+            # Another transaction created the row first
+            await db.execute(update(AnswerRollup).where(where).values(count=AnswerRollup.count + n))
+
+
+async def rebuild_rollups(db: AsyncSession) -> int:
+    """
+    Recompute every rollup row from the answers table; returns the row count.
+    The caller commits (admin requests run this through the DB writer).
+    """
+    if db.bind.dialect.name == "sqlite":
+        # SQLite stores dates as ISO strings; CAST(... AS DATE) would yield a number
+        day = func.date(Answer.timestamp)
+    else:
+        day = cast(Answer.timestamp, Date)
+    coffee_sample = func.coalesce(Session.coffee_sample, literal(""))
+    matched_answer = func.coalesce(Answer.matched_answer, literal(""))
+    grouped = (
+        select(coffee_sample, Answer.question_id, matched_answer, day, func.count())
+        .join(Session, Session.id == Answer.session_id)
+        .group_by(coffee_sample, Answer.question_id, matched_answer, day)
+    )
+    await db.execute(delete(AnswerRollup))
+    await db.execute(
+        insert(AnswerRollup).from_select(
+            ["coffee_sample", "question_id", "matched_answer", "day", "count"], grouped
+        )
+    )
+    return await db.scalar(select(func.count()).select_from(AnswerRollup))
+
+
+def _filtered(query, coffee_sample: Optional[str], since: Optional[date], until: Optional[date]):
+    if coffee_sample is not None:
+        query = query.where(AnswerRollup.coffee_sample == coffee_sample)
+    if since:
+        query = query.where(AnswerRollup.day >= since)
+    if until:
+        query = query.where(AnswerRollup.day <= until)
+    return query
+
+
+def _distribution(counts: Dict[str, int], total: Optional[int] = None) -> List[Dict]:
+    total = sum(counts.values()) if total is None else total
+    return [
+        {
+            "matched_answer": option or UNMATCHED,
+            "count": count,
+            "percent": round(100.0 * count / total, 1) if total else 0.0,
+        }
+        for option, count in sorted(counts.items(), key=lambda item: -item[1])
+    ]
+
+
+async def list_samples(db: AsyncSession) -> List[Dict]:
+    """Coffee samples with rollups, with their answer totals and date span."""
+    result = await db.execute(
+        select(AnswerRollup.coffee_sample, func.sum(AnswerRollup.count),
+               func.min(AnswerRollup.day), func.max(AnswerRollup.day))
+        .group_by(AnswerRollup.coffee_sample)
+        .order_by(AnswerRollup.coffee_sample)
+    )
+    return [
+        {"coffee_sample": sample, "answers": total, "first_day": first, "last_day": last}
+        for sample, total, first, last in result.all()
+    ]
+
+
+async def question_distribution(db: AsyncSession, question_id: str, coffee_sample: Optional[str] = None,
+                                since: Optional[date] = None, until: Optional[date] = None,
+                                by_day: bool = False) -> Dict:
+    """Share of each matched option among a question's answers."""
+    columns = [AnswerRollup.matched_answer, func.sum(AnswerRollup.count)]
+    group = [AnswerRollup.matched_answer]
+    if by_day:
+        columns.insert(0, AnswerRollup.day)
+        group.insert(0, AnswerRollup.day)
+    query = _filtered(
+        select(*columns).where(AnswerRollup.question_id == question_id).group_by(*group),
+        coffee_sample, since, until,
+    )
+    rows = (await db.execute(query)).all()
+
+    counts: Counter = Counter()
+    days: Dict[date, Counter] = {}
+    for row in rows:
+        if by_day:
+            day, option, count = row
+            days.setdefault(day, Counter())[option] += count
+        else:
+            option, count = row
+        counts[option] += count
+    report = {
+        "question_id": question_id,
+        "coffee_sample": coffee_sample,
+        "total": sum(counts.values()),
+        "options": _distribution(counts),
+    }
+    if by_day:
+        report["days"] = [
+            {"day": day, "total": sum(c.values()), "options": _distribution(c)}
+            for day, c in sorted(days.items())
+        ]
+    return report
+
+
+async def flavor_tree(db: AsyncSession, coffee_sample: Optional[str] = None,
+                      since: Optional[date] = None, until: Optional[date] = None,
+                      root: str = "flavor_main") -> Dict:
+    """
+    Primary flavor distribution with each branch's follow-up distribution,
+    e.g. "Fruity -> Berry" as a share of all primary flavor answers.
+    """
+    # Follow-up questions are the branches that are themselves part of the flow
+    next_map = {
+        option: question_id
+        for option, question_id in QUESTION_FLOW.get(root, {}).get("next_map", {}).items()
+        if question_id in QUESTION_FLOW and question_id != root
+    }
+    question_ids = [root] + sorted(set(next_map.values()))
+    query = _filtered(
+        select(AnswerRollup.question_id, AnswerRollup.matched_answer, func.sum(AnswerRollup.count))
+        .where(AnswerRollup.question_id.in_(question_ids))
+        .group_by(AnswerRollup.question_id, AnswerRollup.matched_answer),
+        coffee_sample, since, until,
+    )
+    by_question: Dict[str, Counter] = {}
+    for question_id, option, count in (await db.execute(query)).all():
+        by_question.setdefault(question_id, Counter())[option] += count
+
+    primary = by_question.get(root, Counter())
+    total = sum(primary.values())
+    flavors = []
+    for entry in _distribution(primary, total):
+        branch = next_map.get(entry["matched_answer"])
+        follow_up = by_question.get(branch, Counter())
+        entry["question_id"] = branch
+        # Percent of the follow-up answers, and of all primary answers (the full path)
+        entry["specific"] = [
+            dict(item, path_percent=round(100.0 * item["count"] / total, 1) if total else 0.0)
+            for item in _distribution(follow_up)
+        ]
+        flavors.append(entry)
+    return {"coffee_sample": coffee_sample, "question_id": root, "total": total, "flavors": flavors}
+
+
+async def _main(args):
+    from dotenv import load_dotenv
+    from database import init_engine, dispose_engine, init_db
+
+    load_dotenv()
+    _, async_session_maker = init_engine()
+    await init_db()
+    try:
+        async with async_session_maker() as session:
+            if args.rebuild:
+                report = {"rollup_rows": await rebuild_rollups(session)}
+                await session.commit()
+            else:
+                report = {"samples": await list_samples(session)}
+    finally:
+        await dispose_engine()
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flavor analytics rollups")
+    parser.add_argument("--rebuild", action="store_true", help="recompute all rollups from the answers table")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,184 @@
+"""
+Load test for the full tasting flow
+
+Boots the app with uvicorn against a scratch SQLite database and the fake
+OpenAI/ElevenLabs upstreams (benchmarks/fake_upstreams.py), then drives N
+concurrent simulated testers through start_session -> submit_answer (until
+the questionnaire ends) -> complete_session -> get_report, optionally
+fetching each question's TTS audio. Prints throughput and p50/p95/p99 per
+endpoint and writes them, with LLM/TTS upstream call counts, to a JSON file
+under benchmarks/results/ (compare two with benchmarks/harness.py).
+
+A share of the answers (--llm-share) is garbled so the local matcher is
+unsure and the request goes on to the (fake) LLM.
+
+Usage (from backend/):
+    python benchmarks/bench_flow.py [--testers 20] [--sessions 5] [--openai-latency-ms 300]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+
+from fake_upstreams import FakeUpstreams  # noqa: E402
+from harness import ServerThread, seed_questions, summarize, write_results  # noqa: E402
+
+PLAIN_TEMPLATES = ["{}", "{} I think", "mostly {}", "it was {}", "definitely {}"]
+GARBLED_TEMPLATES = ["umm maybe {}", "something like {} i guess", "{} kind of thing"]
+
+
+def garble(option: str, rng: random.Random) -> str:
+    """Mangle an option so only its first letters survive (the fake LLM still matches it)."""
+    head = option.lower()[:4]
+    return head + "".join(rng.sample("xqzvk", 3))
+
+
+def phrase(option: str, rng: random.Random, llm_share: float) -> str:
+    if rng.random() < llm_share:
+        return rng.choice(GARBLED_TEMPLATES).format(garble(option, rng))
+    return rng.choice(PLAIN_TEMPLATES).format(option.lower())
+
+
+def question_options(question: dict) -> list:
+    if question.get("options"):
+        return question["options"]
+    return [option for group in question.get("optionGroups") or [] for option in group.get("options", [])]
+
+
+class Recorder:
+    """Latency samples and error counts per endpoint."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, name: str, request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            raise
+        self.samples[name].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+            response.raise_for_status()
+        return response
+
+
+async def tester(client: httpx.AsyncClient, recorder: Recorder, index: int, args) -> int:
+    """Run ``args.sessions`` sessions back to back; returns the number completed."""
+    rng = random.Random(args.seed * 1000 + index)
+    completed = 0
+    for n in range(args.sessions):
+        try:
+            response = await recorder.call("POST /api/sessions/start", client.post(
+                "/api/sessions/start", json={"tester_name": f"tester {index}", "coffee_sample": f"sample {n % 3}"}
+            ))
+            session = response.json()
+            question = session.get("current_question")
+            answers = 0
+            while question and answers < args.max_answers:
+                if args.tts:
+                    await recorder.call("GET /api/tts", client.get("/api/tts", params={"text": question["text"]}))
+                options = question_options(question)
+                text = phrase(rng.choice(options), rng, args.llm_share) if options else "no comment"
+                response = await recorder.call("POST /api/feedback/answer", client.post("/api/feedback/answer", json={
+                    "session_id": session["id"], "question_id": question["id"], "answer_text": text,
+                }))
+                question = response.json().get("next_question")
+                answers += 1
+                if args.think_ms:
+                    await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+            await recorder.call("POST /api/sessions/{id}/complete",
+                                client.post(f"/api/sessions/{session['id']}/complete", json={}))
+            await recorder.call("GET /api/reports/{id}", client.get(f"/api/reports/{session['id']}"))
+            completed += 1
+        except httpx.HTTPError:
+            continue
+    return completed
+
+
+async def drive(base_url: str, args) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.testers, max_keepalive_connections=args.testers)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        completed = await asyncio.gather(*(tester(client, recorder, i, args) for i in range(args.testers)))
+        elapsed = time.perf_counter() - start
+        matching = (await client.get("/api/admin/matching/stats")).json()
+    requests = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        "duration_s": round(elapsed, 3),
+        "sessions": sum(completed),
+        "requests": requests,
+        "errors": sum(recorder.errors.values()),
+        "throughput_rps": round(requests / elapsed, 2),
+        "sessions_per_s": round(sum(completed) / elapsed, 2),
+        "endpoints": {
+            name: dict(summarize(samples), errors=recorder.errors.get(name, 0))
+            for name, samples in sorted(recorder.samples.items())
+        },
+        "matching": matching,
+    }
+
+
+def main(args):
+    upstreams = FakeUpstreams(openai_latency=args.openai_latency_ms / 1000, tts_latency=args.tts_latency_ms / 1000)
+    fake = ServerThread(upstreams.app).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": f"{fake.url}/v1",
+            "ELEVENLABS_API_KEY": "bench",
+            "ELEVENLABS_API_URL": fake.url,
+            "TTS_CACHE_DIR": os.path.join(tmp, "tts_cache"),
+            "TTS_PREWARM_ON_STARTUP": "false",
+            "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+        })
+        asyncio.run(seed_questions())
+
+        import main as app_module
+        server = ServerThread(app_module.app).start()
+        try:
+            results = asyncio.run(drive(server.url, args))
+        finally:
+            server.stop()
+            fake.stop()
+    results["upstream"] = upstreams.stats()
+
+    print(f"{args.testers} testers x {args.sessions} sessions: {results['sessions']} sessions, "
+          f"{results['requests']} requests, {results['errors']} errors in {results['duration_s']}s")
+    print(f"throughput {results['throughput_rps']} req/s, {results['sessions_per_s']} sessions/s; "
+          f"upstream calls {results['upstream']['calls']}")
+    for name, stats in results["endpoints"].items():
+        print(f"  {name:<34} n={stats['count']:<6} p50 {stats['p50_ms']:8.2f}  p95 {stats['p95_ms']:8.2f}  "
+              f"p99 {stats['p99_ms']:8.2f} ms")
+    path = write_results("flow", vars(args), results, args.output)
+    print(f"results written to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--testers", type=int, default=20, help="concurrent simulated testers")
+    parser.add_argument("--sessions", type=int, default=5, help="sessions per tester")
+    parser.add_argument("--max-answers", type=int, default=10, help="answers per session at most")
+    parser.add_argument("--llm-share", type=float, default=0.2, help="share of garbled answers")
+    parser.add_argument("--openai-latency-ms", type=float, default=300)
+    parser.add_argument("--tts-latency-ms", type=float, default=200)
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between answers")
+    parser.add_argument("--tts", action="store_true", help="also fetch each question's TTS audio")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/flow-<commit>-<time>.json)")
+    main(parser.parse_args())
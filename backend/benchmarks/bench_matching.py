@@ -0,0 +1,99 @@
+"""
+Benchmark for the local answer matcher
+
+Runs a corpus of real tester phrasings for the primary flavor question
+through matching.match_locally and reports accuracy, the share of answers
+that would still need an LLM call at the configured threshold, and the
+latency the local stage adds in front of that call.
+
+Usage (from backend/):
+    python benchmarks/bench_matching.py [--threshold 0.8] [--iterations 200]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from matching import match_locally, get_confidence_threshold, _index_for  # noqa: E402
+
+FLAVOR_OPTIONS = [
+    "Fruity", "Floral", "Nutty", "Cereal", "Cocoa", "Sweet", "Earthy",
+    "Roasted", "Spices", "Vegetative", "Stale/Papery", "Chemical",
+    "Alcohol/Fermented", "None", "Not Applicable",
+]
+
+# (utterance, expected option or None when only an LLM could tell)
+CORPUS = [
+    ("fruity", "Fruity"), ("Fruity.", "Fruity"), ("fruits", "Fruity"), ("frooti", "Fruity"),
+    ("I taste fruity flavor", "Fruity"), ("very fruity", "Fruity"), ("fruit", "Fruity"),
+    ("floral", "Floral"), ("flowers", "Floral"), ("flowery", "Floral"), ("kind of floral", "Floral"),
+    ("nutty", "Nutty"), ("nuts", "Nutty"), ("kind of nutty", "Nutty"), ("hazelnut", "Nutty"),
+    ("cereal", "Cereal"), ("serial", "Cereal"), ("grainy", "Cereal"), ("malty", "Cereal"),
+    ("cocoa", "Cocoa"), ("chocolate", "Cocoa"), ("chocolatey", "Cocoa"), ("chocolate flavor", "Cocoa"),
+    ("sweet", "Sweet"), ("sweetness", "Sweet"), ("caramel", "Sweet"), ("swete", "Sweet"),
+    ("earthy", "Earthy"), ("earthy taste", "Earthy"), ("arthi", "Earthy"), ("earth", "Earthy"),
+    ("roasted", "Roasted"), ("roasty", "Roasted"), ("it was roasted", "Roasted"), ("smoky", "Roasted"),
+    ("spices", "Spices"), ("spicy", "Spices"), ("a bit spicy", "Spices"), ("peppery", "Spices"),
+    ("vegetative", "Vegetative"), ("vegitative", "Vegetative"), ("grassy", "Vegetative"),
+    ("stale", "Stale/Papery"), ("papery", "Stale/Papery"), ("tastes like cardboard", "Stale/Papery"),
+    ("chemical", "Chemical"), ("kemical", "Chemical"), ("medicinal", "Chemical"),
+    ("alcohol", "Alcohol/Fermented"), ("fermented", "Alcohol/Fermented"), ("winey", "Alcohol/Fermented"),
+    ("none", "None"), ("nothing", "None"), ("nothing really", "None"),
+    ("not applicable", "Not Applicable"), ("n/a", "Not Applicable"),
+    ("reminds me of blueberries", None), ("like a campfire", None), ("hmm let me think", None),
+    ("fruity and nutty", None), ("roasted nuts", None),
+    # Negations, hedges and sound-alikes must not be accepted without the LLM
+    ("not sure", None), ("note", None), ("noted", None), ("not fruity", None),
+    ("no fruity notes", None), ("sweat", None), ("I don't know", None), ("never tasted that", None),
+    ("it isn't nutty", None), ("dunno maybe sweet", None), ("no idea", None),
+]
+
+
+def run(threshold: float, iterations: int):
+    correct = confident = confident_wrong = 0
+    for utterance, expected in CORPUS:
+        match = match_locally(utterance, FLAVOR_OPTIONS)
+        option = match.option if match else None
+        is_confident = bool(match and match.confidence >= threshold)
+        # Answers only an LLM can resolve count as correct when deferred to it
+        if option == expected or (expected is None and not is_confident):
+            correct += 1
+        if is_confident:
+            confident += 1
+            if option != expected:
+                confident_wrong += 1
+
+    _index_for.cache_clear()
+    start = time.perf_counter()
+    match_locally("warmup", FLAVOR_OPTIONS)
+    index_build_us = (time.perf_counter() - start) * 1e6
+
+    timings = []
+    for _ in range(iterations):
+        for utterance, _ in CORPUS:
+            start = time.perf_counter()
+            match_locally(utterance, FLAVOR_OPTIONS)
+            timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+
+    total = len(CORPUS)
+    print(f"corpus size:             {total}")
+    print(f"threshold:               {threshold}")
+    print(f"local accuracy:          {correct / total:.1%}")
+    print(f"resolved locally:        {confident / total:.1%}  (wrong when confident: {confident_wrong})")
+    print(f"LLM call rate:           {(total - confident) / total:.1%}  (was 100% before local matching)")
+    print(f"option index build:      {index_build_us:.0f} us (once per option set)")
+    print(f"added latency mean/p50:  {statistics.mean(timings):.1f} / {timings[len(timings) // 2]:.1f} us")
+    print(f"added latency p99/max:   {timings[int(len(timings) * 0.99)]:.1f} / {timings[-1]:.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threshold", type=float, default=get_confidence_threshold())
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    run(args.threshold, args.iterations)
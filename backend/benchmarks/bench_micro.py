@@ -0,0 +1,150 @@
+"""
+Micro-benchmarks for the per-answer hot paths
+
+Times, in-process and without HTTP:
+- get_next_question for a flavor branch, a branch end and an admin question
+  (question graph loaded from a scratch SQLite database)
+- answer matching: AnswerMatch.resolve for exact, synonym-style and
+  LLM-cached answers (the LLM result comes from the match cache)
+- TTS cache hits served from the memory tier and from disk
+
+and writes per-case latency percentiles and ops/s to a JSON file under
+benchmarks/results/ (compare two with benchmarks/harness.py).
+
+Usage (from backend/):
+    python benchmarks/bench_micro.py [--iterations 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+
+from harness import BENCH_FLAVORS, seed_questions, summarize, write_results  # noqa: E402
+
+FLAVOR_OPTIONS = list(BENCH_FLAVORS) + ["None", "Not Applicable"]
+
+
+async def measure(fn, iterations: int) -> dict:
+    """Latency of ``await fn()`` over ``iterations`` runs, after a short warm-up."""
+    for _ in range(min(50, iterations)):
+        await fn()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - start
+    return dict(summarize(samples), ops_per_s=round(iterations / elapsed, 1))
+
+
+async def bench_next_question(iterations: int) -> dict:
+    from database import get_read_session_maker
+    from services import AnswerMatch, get_next_question
+
+    cases = {}
+    async with get_read_session_maker()() as db:
+        cases["next_question/flavor_branch"] = await measure(
+            lambda: get_next_question("flavor_main", db, "Fruity"), iterations)
+        cases["next_question/branch_end"] = await measure(
+            lambda: get_next_question("flavor_fruity", db, "Berry"), iterations)
+        cases["next_question/admin"] = await measure(
+            lambda: get_next_question("intensity", db, "High"), iterations)
+        # Routing a free-form answer through the local matcher
+        cases["next_question/matched_answer"] = await measure(
+            lambda: get_next_question("flavor_main", db, "it was fruity", AnswerMatch("it was fruity")), iterations)
+    return cases
+
+
+async def bench_matching(iterations: int) -> dict:
+    import services
+    from match_cache import get_match_cache
+
+    async def resolve(text: str):
+        await services.AnswerMatch(text).resolve(FLAVOR_OPTIONS)
+
+    cases = {
+        "matching/exact": await measure(lambda: resolve("Fruity"), iterations),
+        "matching/phrase": await measure(lambda: resolve("I'd say it tastes mostly chocolatey"), iterations),
+    }
+    # An utterance the local matcher is unsure about, answered from the match cache
+    # (includes the local matcher's edit-distance pass, which runs first)
+    utterance = "fruixqz i guess"
+    await get_match_cache().put(utterance, FLAVOR_OPTIONS, "Fruity")
+    probe = services.AnswerMatch(utterance)
+    await probe.resolve(FLAVOR_OPTIONS)
+    assert probe.method == "llm_cache", probe.method
+    cases["matching/llm_cache_hit"] = await measure(lambda: resolve(utterance), iterations)
+    return cases
+
+
+async def bench_tts_cache(iterations: int, cache_dir: str) -> dict:
+    from tts import ElevenLabsClient, TTSCache
+
+    audio = b"\xff" * (48 * 1024)
+    client = ElevenLabsClient(api_key="bench", transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, content=audio)
+    ))
+    cache = TTSCache(cache_dir)
+    key = cache.cache_key("How intense is the flavor?", "voice")
+    await cache.fetch(key, "How intense is the flavor?", "voice", client)
+
+    async def serve(tts_cache: TTSCache):
+        entry = await tts_cache.lookup(key)
+        async for _ in tts_cache.iter_entry(key, entry):
+            pass
+
+    cases = {"tts_cache/memory_hit": await measure(lambda: serve(cache), iterations)}
+    await cache.flush()
+    cache.close()
+    # No memory tier, so every hit reads the file
+    disk_cache = TTSCache(cache_dir, memory_bytes=0)
+    cases["tts_cache/disk_hit"] = await measure(lambda: serve(disk_cache), iterations)
+    disk_cache.close()
+    await client.aclose()
+    return cases
+
+
+async def run(args, tmp: str) -> dict:
+    from database import init_engine, dispose_engine
+
+    await seed_questions()
+    init_engine()
+    try:
+        cases = {}
+        cases.update(await bench_next_question(args.iterations))
+        cases.update(await bench_matching(args.iterations))
+        cases.update(await bench_tts_cache(args.iterations, os.path.join(tmp, "tts_cache")))
+    finally:
+        await dispose_engine()
+    return {"cases": cases}
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            # Enables the LLM stage; no call is made because answers hit the match cache
+            "OPENAI_API_KEY": "sk-bench",
+        })
+        results = asyncio.run(run(args, tmp))
+
+    for name, stats in results["cases"].items():
+        print(f"  {name:<32} p50 {stats['p50_ms'] * 1000:9.1f}  p95 {stats['p95_ms'] * 1000:9.1f}  "
+              f"p99 {stats['p99_ms'] * 1000:9.1f} us   {stats['ops_per_s']:>10,.0f} ops/s")
+    path = write_results("micro", vars(args), results, args.output)
+    print(f"results written to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/micro-<commit>-<time>.json)")
+    main(parser.parse_args())
@@ -0,0 +1,159 @@
+"""
+Benchmark for report, export and session-list queries
+
+Seeds a scratch SQLite database with N answers (ANSWERS_PER_SESSION per
+session), times the statements behind get_report and the answer export
+(a session's answers in timestamp order) and list_sessions (newest first,
+with and without a status filter, and a keyset page mid-table) without the
+answer/session indexes, then applies the migrations and times them again. Query plans are printed for
+the largest size.
+
+Usage (from backend/):
+    python benchmarks/bench_queries.py [--sizes 10000,100000,1000000] [--repeat 50]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select, text, or_  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+import models  # noqa: E402,F401
+from database import Base  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models import Answer, Session  # noqa: E402
+
+ANSWERS_PER_SESSION = 20
+# Migration that adds NEW_INDEXES; undone before the "before" timings
+INDEX_MIGRATION = 2
+NEW_INDEXES = ("ix_answers_session_id_timestamp", "ix_sessions_start_time", "ix_sessions_status_start_time")
+# Seeded start times span 500000 minutes from SEED_START; this cursor sits in the middle
+SEED_START = datetime(2025, 1, 1)
+MID_CURSOR = (SEED_START + timedelta(minutes=250000), 0)
+
+
+def seed(path: str, answers: int):
+    """Write sessions and answers with the stdlib driver (much faster than the ORM)."""
+    sessions = max(1, answers // ANSWERS_PER_SESSION)
+    conn = sqlite3.connect(path)
+    start = SEED_START
+    rng = random.Random(42)
+    conn.executemany(
+        "INSERT INTO sessions (id, start_time, status, tester_name, coffee_sample) VALUES (?, ?, ?, ?, ?)",
+        (
+            (i, start + timedelta(minutes=rng.randrange(500000)),
+             "completed" if rng.random() < 0.9 else "active", f"tester {i % 50}", f"sample {i % 30}")
+            for i in range(1, sessions + 1)
+        ),
+    )
+    # Interleave sessions the way concurrent kiosks do, so a session's rows are scattered
+    conn.executemany(
+        "INSERT INTO answers (session_id, question_id, answer_text, matched_answer, answer_type, timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (n % sessions + 1, f"q{n // sessions}", "nutty", "Nutty", "voice", start + timedelta(seconds=n))
+            for n in range(answers)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def drop_new_indexes(path: str):
+    conn = sqlite3.connect(path)
+    for name in NEW_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.execute("DELETE FROM schema_migrations WHERE version = ?", (INDEX_MIGRATION,))
+    conn.commit()
+    conn.close()
+
+
+def statements(sessions: int):
+    session_id = random.Random(7).randrange(1, sessions + 1)
+    return {
+        "report/export": select(Answer).where(Answer.session_id == session_id).order_by(Answer.timestamp),
+        "list": select(Session).order_by(Session.start_time.desc()).limit(50),
+        "list status=active": select(Session).where(Session.status == "active")
+        .order_by(Session.start_time.desc()).limit(50),
+        # list_sessions keyset page halfway through the table, columns only
+        "list keyset mid-table": select(Session.id, Session.status, Session.start_time, Session.end_time,
+                                        Session.tester_name, Session.coffee_sample)
+        .where(Session.start_time <= MID_CURSOR[0],
+               or_(Session.start_time < MID_CURSOR[0], Session.id < MID_CURSOR[1]))
+        .order_by(Session.start_time.desc(), Session.id.desc()).limit(50),
+    }
+
+
+async def time_queries(engine, sessions: int, repeat: int):
+    timings = {}
+    async with engine.connect() as conn:
+        for name, stmt in statements(sessions).items():
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                (await conn.execute(stmt)).all()
+                samples.append((time.perf_counter() - start) * 1000)
+            samples.sort()
+            timings[name] = (statistics.median(samples), samples[int(len(samples) * 0.95)])
+    return timings
+
+
+async def query_plans(engine, sessions: int):
+    async with engine.connect() as conn:
+        for name, stmt in statements(sessions).items():
+            compiled = stmt.compile(engine.sync_engine, compile_kwargs={"literal_binds": True})
+            rows = (await conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+            print(f"    {name}: " + "; ".join(row[-1] for row in rows))
+
+
+async def run_size(answers: int, repeat: int, show_plans: bool):
+    sessions = max(1, answers // ANSWERS_PER_SESSION)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(run_migrations)
+        await engine.dispose()
+        drop_new_indexes(path)
+        seed(path, answers)
+
+        before = await time_queries(engine, sessions, repeat)
+        if show_plans:
+            print("  plans before:")
+            await query_plans(engine, sessions)
+        async with engine.begin() as conn:
+            await conn.run_sync(run_migrations)
+        after = await time_queries(engine, sessions, repeat)
+        if show_plans:
+            print("  plans after:")
+            await query_plans(engine, sessions)
+        await engine.dispose()
+
+    print(f"{answers:>9} answers / {sessions} sessions   (median / p95 ms)")
+    for name in before:
+        (b50, b95), (a50, a95) = before[name], after[name]
+        print(f"  {name:<20} before {b50:8.2f} / {b95:8.2f}   after {a50:6.2f} / {a95:6.2f}   x{b50 / a50:,.0f}")
+
+
+async def main(sizes, repeat: int):
+    for i, size in enumerate(sizes):
+        await run_size(size, repeat, show_plans=(i == len(sizes) - 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated answer counts")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main([int(s) for s in args.sizes.split(",")], args.repeat))
@@ -0,0 +1,134 @@
+"""
+Local stand-ins for OpenAI and ElevenLabs
+
+One small ASGI app serving the two endpoints the backend calls, with
+configurable latency, so benchmarks exercise the real SDK/httpx clients
+without network access or API costs:
+
+- POST /v1/chat/completions answers the matching prompt by picking the
+  option whose name (or its first four letters) appears in the utterance,
+  else NONE; batched prompts (JSON mode) get a {"matches": [...]} object.
+- POST /v1/text-to-speech/{voice_id}/stream streams ``audio_bytes`` of fake
+  mp3 data after the configured time to first byte.
+"""
+
+import asyncio
+import json
+import re
+import time
+from collections import Counter
+from typing import List, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+_UTTERANCE = re.compile(r'User said: "(.*)"')
+_SET_HEADER = re.compile(r"^Set (\d+):$")
+_BATCH_ANSWER = re.compile(r'^\d+\. Set (\d+): "(.*)"$')
+
+
+def pick_option(utterance: str, options: List[str]) -> Optional[str]:
+    """Deterministic stand-in for the model's answer."""
+    text = utterance.lower()
+    for option in options:
+        name = option.lower()
+        if name in text or name[:4] in text:
+            return option
+    return None
+
+
+def parse_matching_prompt(prompt: str):
+    """(utterance, options) from the prompt built by services.match_answer_with_ai."""
+    match = _UTTERANCE.search(prompt)
+    utterance = match.group(1) if match else ""
+    _, _, rest = prompt.partition("Available options:")
+    options = []
+    for line in rest.strip().splitlines():
+        if not line.startswith("- "):
+            break
+        options.append(line[2:].strip())
+    return utterance, options
+
+
+def parse_batch_prompt(prompt: str):
+    """[(utterance, options)] from the prompt built by services.match_answers_with_ai."""
+    option_sets, answers, current = {}, [], None
+    for line in prompt.splitlines():
+        header = _SET_HEADER.match(line)
+        answer = _BATCH_ANSWER.match(line)
+        if header:
+            current = option_sets.setdefault(header.group(1), [])
+        elif current is not None and line.startswith("- "):
+            current.append(line[2:].strip())
+        elif answer:
+            current = None
+            answers.append((answer.group(2), option_sets.get(answer.group(1), [])))
+        else:
+            current = None
+    return answers
+
+
+class FakeUpstreams:
+    """Counters and latency settings shared by the fake endpoints."""
+
+    def __init__(self, openai_latency: float = 0.3, tts_latency: float = 0.2,
+                 audio_bytes: int = 32 * 1024, chunk_size: int = 8 * 1024):
+        self.openai_latency = openai_latency
+        self.tts_latency = tts_latency
+        self.audio_bytes = audio_bytes
+        self.chunk_size = chunk_size
+        self.calls: Counter = Counter()
+        self.prompt_tokens = 0
+        self.app = Starlette(routes=[
+            Route("/v1/chat/completions", self.chat_completions, methods=["POST"]),
+            Route("/v1/text-to-speech/{voice_id}/stream", self.text_to_speech, methods=["POST"]),
+        ])
+
+    async def chat_completions(self, request: Request):
+        body = await request.json()
+        self.calls["openai"] += 1
+        prompt = body["messages"][-1]["content"]
+        # Rough token estimate, enough to compare prompt sizes between runs
+        tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+        self.prompt_tokens += tokens
+        await asyncio.sleep(self.openai_latency)
+        if body.get("response_format", {}).get("type") == "json_object":
+            answers = parse_batch_prompt(prompt)
+            self.calls["openai_batch_answers"] += len(answers)
+            content = json.dumps({"matches": [pick_option(utterance, options) or "NONE"
+                                              for utterance, options in answers]})
+        else:
+            utterance, options = parse_matching_prompt(prompt)
+            content = pick_option(utterance, options) or "NONE"
+        return JSONResponse({
+            "id": f"chatcmpl-fake-{self.calls['openai']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": tokens, "completion_tokens": 2, "total_tokens": tokens + 2},
+        })
+
+    async def text_to_speech(self, request: Request):
+        json.loads(await request.body())
+        self.calls["elevenlabs"] += 1
+        await asyncio.sleep(self.tts_latency)
+
+        async def audio():
+            remaining = self.audio_bytes
+            while remaining > 0:
+                size = min(self.chunk_size, remaining)
+                remaining -= size
+                yield b"\xff" * size
+                await asyncio.sleep(0)
+
+        return StreamingResponse(audio(), media_type="audio/mpeg")
+
+    def stats(self) -> dict:
+        return {"calls": dict(self.calls), "prompt_tokens": self.prompt_tokens}
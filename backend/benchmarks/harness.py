@@ -0,0 +1,192 @@
+"""
+Shared benchmark helpers
+
+Servers in background threads, a seeded questionnaire, latency summaries
+and JSON result files. Comparing two result files prints the p50/p95/p99
+change of every endpoint or case they share.
+
+Usage (from backend/):
+    python benchmarks/harness.py benchmarks/results/OLD.json benchmarks/results/NEW.json
+"""
+
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import uvicorn
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Specific notes for every flavor_<category> question of QUESTION_FLOW
+BENCH_FLAVORS = {
+    "Fruity": ["Berry", "Citrus", "Dried Fruit", "Stone Fruit"],
+    "Floral": ["Jasmine", "Rose", "Chamomile"],
+    "Nutty": ["Almond", "Hazelnut", "Peanut"],
+    "Cereal": ["Malt", "Grain"],
+    "Cocoa": ["Chocolate", "Dark Chocolate", "Cacao Nibs"],
+    "Sweet": ["Caramel", "Honey", "Molasses", "Vanilla"],
+    "Earthy": ["Soil", "Mushroom", "Musty"],
+    "Roasted": ["Smoky", "Burnt", "Tobacco"],
+    "Spices": ["Clove", "Cinnamon", "Pepper"],
+    "Vegetative": ["Green", "Herb-like", "Hay"],
+    "Stale/Papery": ["Cardboard", "Woody"],
+    "Chemical": ["Rubber", "Medicinal"],
+    "Alcohol/Fermented": ["Whiskey", "Winey", "Overripe"],
+}
+# Admin-ordered questions asked after the flavor branch
+BENCH_ADMIN_QUESTIONS = [
+    ("intensity", "How intense is the flavor?", ["Low", "Medium", "High"]),
+    ("body", "How would you describe the body?", ["Light", "Medium", "Full"]),
+    ("overall", "How would you rate this coffee overall?", ["Poor", "Fair", "Good", "Excellent"]),
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread:
+    """Run an ASGI app with uvicorn on its own thread and event loop."""
+
+    def __init__(self, app, port: Optional[int] = None):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning",
+                                access_log=False, log_config=None)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self, timeout: float = 30.0) -> "ServerThread":
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f"server on port {self.port} did not start")
+            time.sleep(0.02)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+async def seed_questions():
+    """Create the schema and the benchmark questionnaire in DATABASE_URL."""
+    from database import init_engine, init_db, dispose_engine
+    from models import Question
+
+    _, async_session_maker = init_engine()
+    await init_db()
+    async with async_session_maker() as session:
+        session.add(Question(
+            id="flavor_main", text="What is the primary flavor profile you detect?", type="single_choice",
+            option_groups=[{"title": "", "options": list(BENCH_FLAVORS) + ["None", "Not Applicable"]}],
+            category="Flavor", order_index=1,
+        ))
+        for i, (category, notes) in enumerate(BENCH_FLAVORS.items()):
+            session.add(Question(
+                id=f"flavor_{category.lower().replace('/', '_').replace(' ', '_')}",
+                text=f"Which specific {category} notes do you detect?", type="multiple_choice",
+                option_groups=[{"title": "", "options": notes}], category=category, order_index=2 + i,
+            ))
+        for i, (question_id, text, options) in enumerate(BENCH_ADMIN_QUESTIONS):
+            session.add(Question(
+                id=question_id, text=text, type="single_choice",
+                option_groups=[{"title": "", "options": options}], order_index=100 + i,
+            ))
+        await session.commit()
+    await dispose_engine()
+
+
+def summarize(samples_ms: Sequence[float]) -> Dict:
+    """Count, mean and nearest-rank p50/p95/p99 of latencies in milliseconds."""
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {"count": 0}
+
+    def rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, max(0, int(round(p * len(ordered))) - 1))], 4)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 4),
+        "p50_ms": rank(0.50),
+        "p95_ms": rank(0.95),
+        "p99_ms": rank(0.99),
+        "max_ms": round(ordered[-1], 4),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(name: str, config: Dict, results: Dict, output: Optional[str] = None) -> str:
+    """Write a result file (default: results/<name>-<commit>-<time>.json) and return its path."""
+    commit = git_commit()
+    document = {
+        "benchmark": name,
+        "git_commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{name}-{commit or 'nogit'}-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(document, f, indent=2)
+    return output
+
+
+def _latency_series(node, prefix: str = "") -> Dict[str, Dict]:
+    """Every nested dict holding p50_ms, keyed by its path."""
+    found = {}
+    if isinstance(node, dict):
+        if "p50_ms" in node:
+            found[prefix] = node
+        for key, value in node.items():
+            found.update(_latency_series(value, f"{prefix}/{key}" if prefix else key))
+    return found
+
+
+def compare(old: Dict, new: Dict) -> List[str]:
+    old_series = _latency_series(old["results"])
+    new_series = _latency_series(new["results"])
+    lines = [f"{old.get('git_commit')} -> {new.get('git_commit')}   (ms, change)"]
+    for name in sorted(set(old_series) & set(new_series)):
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            before, after = old_series[name][key], new_series[name][key]
+            change = f"{(after - before) / before * 100:+.0f}%" if before else "n/a"
+            cells.append(f"{key[:3]} {before:10.4f} -> {after:10.4f} {change:>6}")
+        lines.append(f"  {name:<40} " + "   ".join(cells))
+    for key in ("throughput_rps", "sessions_per_s"):
+        if key in old["results"] and key in new["results"]:
+            lines.append(f"  {key:<40} {old['results'][key]} -> {new['results'][key]}")
+    return lines
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    with open(sys.argv[1]) as f_old, open(sys.argv[2]) as f_new:
+        print("\n".join(compare(json.load(f_old), json.load(f_new))))
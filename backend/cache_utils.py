@@ -0,0 +1,78 @@
+"""
+Helpers shared by the caches: the size-bounded in-memory LRU (TTS audio,
+PDF reports) and ETag revalidation for cached HTTP responses
+"""
+
+from collections import OrderedDict
+from typing import Optional, Sized
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header value matches ``etag``: ``*`` or any tag
+    in its comma-separated list, using weak comparison (``W/`` is ignored).
+    """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return _opaque_tag(etag) in {_opaque_tag(tag) for tag in if_none_match.split(",")}
+
+
+class ByteLRU:
+    """LRU mapping of cache key to sized values (anything with ``len``), bounded by total size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items: "OrderedDict[str, Sized]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Sized]:
+        value = self._items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Sized):
+        if len(value) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.current_bytes -= len(old)
+        self._items[key] = value
+        self.current_bytes += len(value)
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.current_bytes -= len(evicted)
+            self.evictions += 1
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def discard(self, key: str):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.current_bytes -= len(old)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,104 @@
+"""
+Circuit breaker for upstream API calls
+
+After ``failure_threshold`` consecutive failed or slow calls the breaker
+opens and callers skip the upstream (falling back to whatever they can do
+locally) instead of waiting out its timeouts on every request. Once
+``reset_timeout`` has passed, a single probe call is let through
+(half-open): if it succeeds quickly the breaker closes again, otherwise it
+stays open for another ``reset_timeout``.
+"""
+
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from metrics import BREAKER_TRANSITIONS
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, HALF_OPEN, OPEN)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a half-open probe; see module docstring."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, slow_call: Optional[float] = None,
+                 reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str) -> "CircuitBreaker":
+        """Build a breaker from <prefix>_BREAKER_* environment variables."""
+        slow_ms = float(os.getenv(f"{prefix}_BREAKER_SLOW_CALL_MS", "2000"))
+        return cls(
+            name,
+            failure_threshold=int(os.getenv(f"{prefix}_BREAKER_FAILURES", "5")),
+            slow_call=slow_ms / 1000 if slow_ms > 0 else None,
+            reset_timeout=float(os.getenv(f"{prefix}_BREAKER_RESET_S", "30")),
+        )
+
+    def _transition(self, state: str):
+        if state != self.state:
+            self.state = state
+            BREAKER_TRANSITIONS.inc(breaker=self.name, state=state)
+        if state == OPEN:
+            self._opened_at = self.clock()
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now (claims the probe when half-open)."""
+        if self.state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED or (self.state == HALF_OPEN and not self._probe_in_flight):
+            self._probe_in_flight = self.state == HALF_OPEN
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, seconds: float):
+        """A call returned after ``seconds``; slow calls count as failures."""
+        if self.slow_call is not None and seconds >= self.slow_call:
+            self.record_failure()
+            return
+        self.consecutive_failures = 0
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._transition(OPEN)
+
+    def release(self):
+        """A permitted call was abandoned (e.g. cancelled) without an outcome."""
+        self._probe_in_flight = False
+
+    def state_values(self) -> Dict[str, int]:
+        """{state: 1 for the current state, else 0}, for the metrics gauge."""
+        if self.state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            # Due for a probe, which the next call will claim
+            current = HALF_OPEN
+        else:
+            current = self.state
+        return {state: int(state == current) for state in STATES}
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected": self.rejected,
+        }
@@ -2,35 +2,200 @@
 Database configuration and connection management
 """
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base
 import os
 
+from metrics import instrument_engine
+
 # Base class for models
 Base = declarative_base()
 
-def get_async_engine_and_session():
-    """Create and return async engine and session maker."""
-    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-    import os
-    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./coffee_feedback.db")
-    engine = create_async_engine(
-        DATABASE_URL,
-        echo=False,
-        future=True
-    )
-    async_session_maker = async_sessionmaker(
-        engine,
-        class_=AsyncSession,
-        expire_on_commit=False
+# Process-wide engine and session maker, created once in the app lifespan
+_engine = None
+_async_session_maker = None
+# Separate read-only engine for file-backed SQLite (the write engine otherwise)
+_read_engine = None
+_read_session_maker = None
+
+
+def get_database_url() -> str:
+    """Return the configured database URL."""
+    return os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./coffee_feedback.db")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_pool_settings(database_url: str) -> dict:
+    """
+    Build connection pool keyword arguments from environment variables.
+
+    In-memory SQLite databases use a single static connection, so the
+    QueuePool sizing options do not apply to them.
+    """
+    url = make_url(database_url)
+    settings = {"pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True)}
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return settings
+    settings.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
     )
-    return engine, async_session_maker
+    return settings
+
+
+def is_file_sqlite(database_url: str) -> bool:
+    url = make_url(database_url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def get_sqlite_pragmas() -> dict:
+    """
+    PRAGMAs applied to every file-backed SQLite connection. WAL lets readers
+    run alongside the writer; synchronous=NORMAL is durable in WAL mode
+    except for the last transactions on power loss.
+    """
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, i.e. 64MB
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "temp_store": "MEMORY",
+    }
+
+
+def _configure_sqlite(engine, read_only: bool = False):
+    """Apply PRAGMAs on connect and let SQLAlchemy own BEGIN so SAVEPOINTs work."""
+    pragmas = get_sqlite_pragmas()
+    if read_only:
+        pragmas["query_only"] = "ON"
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # Disable the driver's implicit transaction handling; see "begin" below
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def on_begin(conn):
+        immediate = not read_only and conn.get_execution_options().get("sqlite_begin_immediate")
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+
+# Execution options for a session that will write: on SQLite its transaction
+# takes the write lock up front. A deferred transaction that reads first
+# cannot upgrade once another connection has committed, and fails with
+# "database is locked" without waiting for busy_timeout. Only for sessions
+# that do not wait on other write connections while open (the DB writer).
+WRITE_LOCK_OPTIONS = {"sqlite_begin_immediate": True}
+
+
+def sqlite_performance_mode(database_url: str) -> bool:
+    return is_file_sqlite(database_url) and _env_bool("SQLITE_PERFORMANCE_MODE", True)
+
+
+def init_engine():
+    """Create the shared async engine and session maker (idempotent)."""
+    global _engine, _async_session_maker, _read_engine, _read_session_maker
+    if _engine is None:
+        database_url = get_database_url()
+        _engine = create_async_engine(
+            database_url,
+            echo=False,
+            future=True,
+            **get_pool_settings(database_url)
+        )
+        _async_session_maker = async_sessionmaker(
+            _engine,
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+        instrument_engine(_engine)
+        _read_engine, _read_session_maker = _engine, _async_session_maker
+        if sqlite_performance_mode(database_url):
+            _configure_sqlite(_engine)
+            _read_engine = create_async_engine(
+                database_url,
+                echo=False,
+                future=True,
+                **get_pool_settings(database_url)
+            )
+            _configure_sqlite(_read_engine, read_only=True)
+            instrument_engine(_read_engine)
+            _read_session_maker = async_sessionmaker(
+                _read_engine,
+                class_=AsyncSession,
+                expire_on_commit=False
+            )
+    return _engine, _async_session_maker
+
+
+async def dispose_engine():
+    """Close all pooled connections and drop the shared engine."""
+    global _engine, _async_session_maker, _read_engine, _read_session_maker
+    if _read_engine is not None and _read_engine is not _engine:
+        await _read_engine.dispose()
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = None
+    _async_session_maker = None
+    _read_engine = None
+    _read_session_maker = None
+
+
+def get_async_engine_and_session():
+    """Return the shared async engine and session maker, creating them on first use."""
+    return init_engine()
+
+
+def get_read_session_maker():
+    """Session maker for read-only work (a separate pool for file-backed SQLite)."""
+    init_engine()
+    return _read_session_maker
+
+
+def get_pool_stats() -> dict:
+    """Report checked-out and idle connections for the shared engine's pool(s)."""
+    engine, _ = init_engine()
+    stats = _pool_stats(engine.pool)
+    if _read_engine is not engine:
+        stats["read_pool"] = _pool_stats(_read_engine.pool)
+    return stats
+
+
+def _pool_stats(pool) -> dict:
+    stats = {"pool_class": type(pool).__name__, "status": pool.status()}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    if "checkedin" in stats:
+        stats["idle"] = stats.pop("checkedin")
+    return stats
+
 
 async def init_db():
-    """Initialize database tables"""
+    """Initialize database tables and apply pending schema migrations"""
+    from migrations import run_migrations
+
     engine, _ = get_async_engine_and_session()
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+
 
 async def get_db():
     """Dependency for getting database session"""
@@ -40,3 +205,12 @@ async def get_db():
             yield session
         finally:
             await session.close()
+
+
+async def get_read_db():
+    """Dependency for a session on the read-only pool"""
+    async with get_read_session_maker()() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
@@ -0,0 +1,161 @@
+"""
+Single-writer queue for database writes
+
+SQLite allows one writer at a time, so concurrent kiosks committing
+independently queue up on the database lock (and fail with "database is
+locked" once busy_timeout runs out). Instead, write operations are queued
+to one task that runs them back to back in a single session and commits
+each batch once. Every operation runs in its own SAVEPOINT, so one that
+fails is rolled back and reported to its caller without affecting the rest
+of the batch.
+"""
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import WRITE_LOCK_OPTIONS, get_async_engine_and_session, get_database_url, sqlite_performance_mode
+from metrics import detach_request, span
+
+WriteOp = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class DBWriter:
+    """Runs queued write operations in batches; see module docstring."""
+
+    def __init__(self, max_batch: int = 64, max_wait: float = 0.002):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.ops = 0
+        self._queue: "asyncio.Queue[Tuple[WriteOp, asyncio.Future]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "DBWriter":
+        return cls(
+            max_batch=int(os.getenv("DB_WRITER_MAX_BATCH", "64")),
+            max_wait=float(os.getenv("DB_WRITER_MAX_WAIT_MS", "2")) / 1000,
+        )
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, op: WriteOp) -> Any:
+        """Queue ``op(session)`` and return its result once its batch is committed."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        with span("db_write"):
+            await self._queue.put((op, future))
+            return await future
+
+    async def _next_batch(self) -> List[Tuple[Optional[WriteOp], Optional[asyncio.Future]]]:
+        """Wait for one operation, then take more for up to ``max_wait``."""
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch and batch[-1][0] is not None:
+            timeout = deadline - asyncio.get_running_loop().time()
+            try:
+                batch.append(self._queue.get_nowait() if timeout <= 0 else
+                             await asyncio.wait_for(self._queue.get(), timeout))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return batch
+
+    async def _run(self):
+        # Started from some request's context; batches belong to no single request
+        detach_request()
+        _, async_session_maker = get_async_engine_and_session()
+        stopping = False
+        while not stopping:
+            batch = await self._next_batch()
+            if batch[-1][0] is None:
+                # Shutdown marker from close(): commit what came before it, then stop
+                batch.pop()
+                stopping = True
+                if not batch:
+                    break
+            results = []
+            try:
+                async with async_session_maker() as session:
+                    await session.connection(execution_options=WRITE_LOCK_OPTIONS)
+                    for op, future in batch:
+                        try:
+                            async with session.begin_nested():
+                                results.append((future, await op(session), None))
+                        except Exception as e:
+                            results.append((future, None, e))
+                    await session.commit()
+            except Exception as e:
+                # The commit itself failed: nothing in the batch was written
+                results = [(future, None, e) for _, future in batch]
+            self.batches += 1
+            self.ops += len(batch)
+            for future, result, error in results:
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    async def close(self):
+        """Finish queued operations, then stop the writer task."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.put((None, None))
+            await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "ops": self.ops,
+            "ops_per_commit": round(self.ops / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+_writer: Optional[DBWriter] = None
+
+
+def single_writer_enabled() -> bool:
+    """Defaults to on for file-backed SQLite, where there is only one writer anyway."""
+    value = os.getenv("DB_SINGLE_WRITER")
+    if value is None:
+        return sqlite_performance_mode(get_database_url())
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_db_writer() -> Optional[DBWriter]:
+    global _writer
+    if _writer is None and single_writer_enabled():
+        _writer = DBWriter.from_env()
+    return _writer
+
+
+async def run_write(op: WriteOp) -> Any:
+    """
+    Run ``op(session)`` through the writer queue, or in its own session and
+    transaction when the single writer is disabled.
+    """
+    writer = get_db_writer()
+    if writer is not None:
+        return await writer.submit(op)
+    _, async_session_maker = get_async_engine_and_session()
+    async with async_session_maker() as session:
+        await session.connection(execution_options=WRITE_LOCK_OPTIONS)
+        result = await op(session)
+        await session.commit()
+        return result
+
+
+async def close_db_writer():
+    global _writer
+    if _writer is not None:
+        await _writer.close()
+    _writer = None
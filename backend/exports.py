@@ -0,0 +1,221 @@
+"""
+Streaming answer exports
+
+Answers for every session matching a filter are read through a server-side
+cursor in fixed-size partitions and encoded as they arrive, so memory stays
+constant however many rows are exported. CSV and NDJSON need nothing extra;
+Parquet and Arrow IPC output use pyarrow when it is installed.
+"""
+
+import csv
+import io
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Sequence
+
+from sqlalchemy import select
+
+from database import get_read_session_maker
+from models import Session, Answer
+
+# Field order of every export format
+EXPORT_FIELDS = [
+    "session_id", "tester_name", "coffee_sample", "session_status", "question_id",
+    "answer_text", "matched_answer", "answer_type", "confidence_score", "timestamp",
+]
+# Human-readable CSV headers, matching the original per-session CSV export
+CSV_HEADERS = [
+    "Session ID", "Tester Name", "Coffee Sample", "Session Status", "Question ID",
+    "Answer", "Matched Answer", "Answer Type", "Confidence", "Timestamp",
+]
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def get_export_batch_size() -> int:
+    """Rows fetched from the cursor and encoded per chunk."""
+    return int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+
+@dataclass
+class ExportFilter:
+    """Which sessions' answers to export; unset fields do not filter."""
+    session_id: Optional[int] = None
+    status: Optional[str] = None
+    coffee_sample: Optional[str] = None
+    tester_name: Optional[str] = None
+    started_after: Optional[datetime] = None
+    started_before: Optional[datetime] = None
+
+    def apply(self, query):
+        if self.session_id is not None:
+            query = query.where(Answer.session_id == self.session_id)
+        if self.status:
+            query = query.where(Session.status == self.status)
+        if self.coffee_sample:
+            query = query.where(Session.coffee_sample == self.coffee_sample)
+        if self.tester_name:
+            query = query.where(Session.tester_name == self.tester_name)
+        if self.started_after:
+            query = query.where(Session.start_time >= self.started_after)
+        if self.started_before:
+            query = query.where(Session.start_time < self.started_before)
+        return query
+
+
+def export_query(filters: ExportFilter):
+    query = (
+        select(
+            Answer.session_id, Session.tester_name, Session.coffee_sample,
+            Session.status.label("session_status"), Answer.question_id, Answer.answer_text,
+            Answer.matched_answer, Answer.answer_type, Answer.confidence_score, Answer.timestamp,
+        )
+        .join(Session, Session.id == Answer.session_id)
+        .order_by(Answer.session_id, Answer.timestamp)
+    )
+    return filters.apply(query)
+
+
+async def iter_answer_rows(filters: ExportFilter, batch_size: Optional[int] = None) -> AsyncIterator[Sequence]:
+    """Yield lists of result rows, ``batch_size`` at a time, from a server-side cursor."""
+    batch_size = batch_size or get_export_batch_size()
+    async with get_read_session_maker()() as session:
+        result = await session.stream(export_query(filters).execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            yield partition
+
+
+async def iter_csv(filters: ExportFilter) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADERS)
+    async for rows in iter_answer_rows(filters):
+        for row in rows:
+            writer.writerow([
+                row.session_id,
+                row.tester_name or "Anonymous",
+                row.coffee_sample or "Not specified",
+                row.session_status,
+                row.question_id,
+                row.answer_text,
+                row.matched_answer or "",
+                row.answer_type,
+                row.confidence_score if row.confidence_score is not None else "N/A",
+                row.timestamp.isoformat(),
+            ])
+        yield _drain(buffer).encode("utf-8")
+    tail = _drain(buffer)
+    if tail:
+        yield tail.encode("utf-8")
+
+
+async def iter_ndjson(filters: ExportFilter) -> AsyncIterator[bytes]:
+    async for rows in iter_answer_rows(filters):
+        lines = []
+        for row in rows:
+            record = dict(zip(EXPORT_FIELDS, row))
+            record["timestamp"] = row.timestamp.isoformat()
+            lines.append(json.dumps(record, ensure_ascii=False))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _drain(buffer: io.StringIO) -> str:
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object collecting pyarrow output until it is drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("session_id", pa.int64()),
+        ("tester_name", pa.string()),
+        ("coffee_sample", pa.string()),
+        ("session_status", pa.string()),
+        ("question_id", pa.string()),
+        ("answer_text", pa.string()),
+        ("matched_answer", pa.string()),
+        ("answer_type", pa.string()),
+        ("confidence_score", pa.float64()),
+        ("timestamp", pa.timestamp("us")),
+    ])
+
+
+async def iter_columnar(filters: ExportFilter, fmt: str) -> AsyncIterator[bytes]:
+    """
+    Parquet (one row group per cursor partition) or Arrow IPC stream
+    (one record batch per partition). Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        async for rows in iter_answer_rows(filters):
+            columns = list(zip(*rows))
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema,
+            )
+            writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_export(filters: ExportFilter, fmt: str) -> AsyncIterator[bytes]:
+    if fmt == "csv":
+        return iter_csv(filters)
+    if fmt == "ndjson":
+        return iter_ndjson(filters)
+    return iter_columnar(filters, fmt)
@@ -0,0 +1,126 @@
+"""
+Cross-request micro-batching of LLM matching calls
+
+During a group cupping many testers answer the same question within
+seconds of each other, each needing an LLM match. Instead of one chat
+completion per answer, requests are queued and collected for up to
+``max_wait`` (or until ``max_batch`` are pending), identical requests are
+merged, and the batch goes to a single handler call whose results are
+fanned back out to the waiting requests. Batches are dispatched
+concurrently, so a slow upstream call does not hold up the next batch.
+"""
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from metrics import LLM_BATCH_SIZE, detach_request, span
+
+BatchHandler = Callable[[List[Hashable]], Awaitable[List[Any]]]
+
+
+class LLMBatcher:
+    """Collects queued items into batches for ``handler``; see module docstring."""
+
+    def __init__(self, handler: BatchHandler, max_batch: int = 16, max_wait: float = 0.01):
+        self.handler = handler
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self.items = 0
+        self._queue: "asyncio.Queue[Tuple[Hashable, Optional[asyncio.Future]]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls, handler: BatchHandler) -> "LLMBatcher":
+        return cls(
+            handler,
+            max_batch=int(os.getenv("LLM_BATCH_MAX_SIZE", "16")),
+            max_wait=float(os.getenv("LLM_BATCH_MAX_WAIT_MS", "10")) / 1000,
+        )
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, item: Hashable) -> Any:
+        """Queue ``item`` and return its result once its batch has been handled."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        with span("llm_batch"):
+            await self._queue.put((item, future))
+            return await future
+
+    async def _next_batch(self) -> List[Tuple[Hashable, Optional[asyncio.Future]]]:
+        """Wait for one item, then take more for up to ``max_wait``."""
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch and batch[-1][1] is not None:
+            timeout = deadline - asyncio.get_running_loop().time()
+            try:
+                batch.append(self._queue.get_nowait() if timeout <= 0 else
+                             await asyncio.wait_for(self._queue.get(), timeout))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return batch
+
+    async def _run(self):
+        # Started from some request's context; batches belong to no single request
+        detach_request()
+        stopping = False
+        while not stopping:
+            batch = await self._next_batch()
+            if batch[-1][1] is None:
+                # Shutdown marker from close()
+                batch.pop()
+                stopping = True
+            if batch:
+                task = asyncio.create_task(self._dispatch(batch))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Hashable, asyncio.Future]]):
+        waiters: Dict[Hashable, List[asyncio.Future]] = {}
+        for item, future in batch:
+            waiters.setdefault(item, []).append(future)
+        items = list(waiters)
+        self.batches += 1
+        self.requests += len(batch)
+        self.items += len(items)
+        LLM_BATCH_SIZE.observe(len(items))
+        try:
+            results = await self.handler(items)
+            outcomes = [(result, None) for result in results]
+        except Exception as e:
+            outcomes = [(None, e)] * len(items)
+        for item, (result, error) in zip(items, outcomes):
+            for future in waiters[item]:
+                if future.done():
+                    # The waiting request was cancelled
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    async def close(self):
+        """Dispatch queued items, wait for in-flight batches, then stop."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.put((None, None))
+            await self._task
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "unique_items": self.items,
+            "requests_per_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
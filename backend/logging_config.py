@@ -0,0 +1,166 @@
+"""
+Structured logging
+
+Records are rendered as one JSON object per line (or plain text with
+LOG_FORMAT=text) carrying the level, logger, message, any ``extra`` fields
+and the request's correlation ID. Handlers only enqueue records; a
+background thread formats and writes them, so logging never blocks the
+event loop on stdout.
+
+Every HTTP request gets a correlation ID from its ``X-Request-ID`` header
+(or a new one), echoed back in the response. DEBUG output from hot paths is
+sampled per request (LOG_DEBUG_SAMPLE_RATE), so a sampled request logs all
+of its debug events and the others log none.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Chatty third-party loggers (per-statement or per-request DEBUG/INFO lines)
+QUIET_LOGGERS = ("aiosqlite", "httpcore", "httpx", "openai", "multipart", "python_multipart")
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_debug_sampled: ContextVar[Optional[bool]] = ContextVar("debug_sampled", default=None)
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[logging.Handler] = None
+
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def get_debug_sample_rate() -> float:
+    return float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the correlation ID and drop unsampled DEBUG records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        if record.levelno > logging.DEBUG:
+            return True
+        sampled = _debug_sampled.get()
+        if sampled is None:
+            # Outside a request: sample each record on its own
+            return random.random() < get_debug_sample_rate()
+        return sampled
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue the record with its message and traceback rendered (the args
+    and exc_info may not survive until the listener thread gets to it), but
+    leave the JSON formatting to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging():
+    """Route the root logger through a queue to stdout (idempotent)."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    else:
+        output.setFormatter(JSONFormatter())
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _handler = _QueueHandler(records)
+    _handler.addFilter(RequestContextFilter())
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+
+
+def close_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    if _listener is not None:
+        _listener.stop()
+    _listener = None
+    _handler = None
+
+
+class RequestIdMiddleware:
+    """ASGI middleware assigning each HTTP request its correlation ID."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        id_token = _request_id.set(request_id)
+        sample_token = _debug_sampled.set(random.random() < get_debug_sample_rate())
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER, request_id.encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _request_id.reset(id_token)
+            _debug_sampled.reset(sample_token)
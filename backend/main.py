@@ -1,4 +1,3 @@
-import requests
 # ElevenLabs TTS endpoint
 from schemas import TTSRequest, OptionGroup
 """
@@ -6,41 +5,78 @@ Coffee Tester Feedback Collection API
 FastAPI backend for voice-enabled coffee tasting feedback system
 """
 
-from fastapi import FastAPI, HTTPException, Depends, Response
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager
+import asyncio
+import base64
+import logging
+import os
 import uvicorn
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
-from database import init_db, get_db
+from database import init_db, get_db, get_read_db, init_engine, dispose_engine, get_pool_stats
+from db_writer import run_write, get_db_writer, close_db_writer
 from models import Session, Answer, Question
 from schemas import (
     SessionCreate, SessionResponse, AnswerCreate, AnswerResponse,
-    QuestionResponse, SessionComplete, FeedbackReport, MergedFlavorQuestionsResponse
+    QuestionResponse, SessionComplete, FeedbackReport, MergedFlavorQuestionsResponse,
+    QuestionnaireBundle, AnswerBatchCreate, AnswerBatchItemResult, AnswerBatchResponse, SyncResponse,
+    ReportBatchRequest
+)
+from sqlalchemy import select, insert, func, or_
+from sqlalchemy.exc import IntegrityError
+from services import (
+    load_questions_from_csv, get_next_question, get_matching_stats, get_openai_breaker, close_match_batcher
+)
+from match_cache import get_match_cache
+from question_graph import get_question_graph, invalidate_question_graph
+from sync import read_sync_upload, merge_session
+from exports import EXPORT_FORMATS, ExportFilter, iter_export, pyarrow_available
+from reports import get_report_renderer, close_report_renderer
+from cache_utils import etag_matches
+from metrics import TimingMiddleware, register_gauge, render_metrics, span
+from logging_config import RequestIdMiddleware, setup_logging, close_logging
+from analytics import increment_rollups, rollup_key, list_samples, question_distribution, flavor_tree, rebuild_rollups
+from tts import DEFAULT_VOICE_ID, TTSUpstreamError, audio_response, get_tts_cache, close_tts_client, close_tts_cache
+from tts_prewarm import (
+    prewarm_questions, prewarm_options_enabled, prewarm_texts, question_prompts, tts_coverage, gc_tts_cache
 )
-from sqlalchemy import select
-from services import load_questions_from_csv, get_next_question, generate_pdf_report
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize database and load questions on startup"""
+    setup_logging()
+    _, async_session_maker = init_engine()
     await init_db()
     # Only load questions if database is empty
-    from services import load_questions_from_csv
-    from sqlalchemy import select
-    from database import get_async_engine_and_session
-    _, async_session_maker = get_async_engine_and_session()
     async with async_session_maker() as session:
         result = await session.execute(select(Question).limit(1))
         existing = result.scalar_one_or_none()
-        if not existing:
-            await load_questions_from_csv()
+    if not existing:
+        await load_questions_from_csv()
+    # Open the TTS cache manifest, then pre-warm in the background so startup is not delayed
+    get_tts_cache()
+    prewarm_task = None
+    if os.getenv("ELEVENLABS_API_KEY") and os.getenv("TTS_PREWARM_ON_STARTUP", "true").lower() != "false":
+        prewarm_task = asyncio.create_task(prewarm_questions())
     yield
+    if prewarm_task and not prewarm_task.done():
+        prewarm_task.cancel()
+    await close_tts_client()
+    close_tts_cache()
+    close_report_renderer()
+    await close_match_batcher()
+    await close_db_writer()
+    await dispose_engine()
+    close_logging()
 
 
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Coffee Feedback API",
@@ -53,19 +89,21 @@ app = FastAPI(
 @app.post("/api/sessions/start", response_model=SessionResponse)
 async def start_session(
     session_data: SessionCreate,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Initialize a new feedback session"""
-    from sqlalchemy import select
-    new_session = Session(
-        start_time=datetime.now(),
-        status="active",
-        tester_name=session_data.tester_name,
-        coffee_sample=session_data.coffee_sample
-    )
-    db.add(new_session)
-    await db.commit()
-    await db.refresh(new_session)
+    async def create(write_db: AsyncSession) -> Session:
+        new_session = Session(
+            start_time=datetime.now(),
+            status="active",
+            tester_name=session_data.tester_name,
+            coffee_sample=session_data.coffee_sample
+        )
+        write_db.add(new_session)
+        await write_db.flush()
+        return new_session
+
+    new_session = await run_write(create)
     # Get first question
     first_question = await get_next_question(None, db)
     return SessionResponse(
@@ -78,8 +116,6 @@ async def start_session(
     )
 
 # CORS configuration - Allow production URLs
-import os
-import hashlib
 allowed_origins = os.getenv("CORS_ORIGINS", "http://localhost:5173,http://localhost:5174").split(",")
 
 app.add_middleware(
@@ -88,86 +124,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
+# Wraps CORS and the routes, so the Server-Timing total covers the whole stack
+app.add_middleware(TimingMiddleware)
+# Outside the timing middleware, so everything logged for a request carries its ID
+app.add_middleware(RequestIdMiddleware)
 
 
 @app.post("/api/tts")
-async def tts_11labs(request: TTSRequest):
+async def tts_11labs(request: TTSRequest, http_request: Request):
     """
     Convert text to speech using ElevenLabs API and return audio (mp3), with caching.
     """
-    import sys
-    api_key = os.getenv("ELEVENLABS_API_KEY")
-    print(f"[TTS DEBUG] ELEVENLABS_API_KEY loaded: {api_key[:8] if api_key else 'NOT FOUND'}...", file=sys.stderr)
-    print(f"[TTS DEBUG] Request text: {request.text}", file=sys.stderr)
-    if not api_key:
-        print("[TTS DEBUG] ELEVENLABS_API_KEY not set in environment", file=sys.stderr)
-        raise HTTPException(status_code=500, detail="ELEVENLABS_API_KEY not set in environment")
-
-
-    voice_id = request.voice_id or "gfRt6Z3Z8aTbpLfexQ7N"  # Default voice
-    cache_key = hashlib.sha256((request.text + "|" + voice_id).encode("utf-8")).hexdigest()
-    cache_dir = os.path.join(os.path.dirname(__file__), "tts_cache")
-    os.makedirs(cache_dir, exist_ok=True)
-    cache_path = os.path.join(cache_dir, f"{cache_key}.mp3")
-
-    # Extra debug logging
-    print(f"[TTS DEBUG] text: {request.text}", file=sys.stderr)
-    print(f"[TTS DEBUG] voice_id: {voice_id}", file=sys.stderr)
-    print(f"[TTS DEBUG] cache_key: {cache_key}", file=sys.stderr)
-    print(f"[TTS DEBUG] cache_path: {cache_path}", file=sys.stderr)
-
-    # Serve from cache if exists
-    if os.path.exists(cache_path):
-        print(f"[TTS CACHE] Serving cached audio: {cache_path}", file=sys.stderr)
-        with open(cache_path, "rb") as f:
-            audio_data = f.read()
-        return Response(content=audio_data, media_type="audio/mpeg")
-
-    # Otherwise, call ElevenLabs API
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-    headers = {
-        "xi-api-key": api_key,
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "text": request.text,
-        "model_id": "eleven_monolingual_v1",
-        "voice_settings": {
-            "stability": 0.5,
-            "similarity_boost": 0.75
-        }
-    }
+    voice_id = request.voice_id or DEFAULT_VOICE_ID
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        print(f"[TTS DEBUG] ElevenLabs response status: {response.status_code}", file=sys.stderr)
-        if response.status_code != 200:
-            print(f"[TTS DEBUG] ElevenLabs response text: {response.text}", file=sys.stderr)
-            raise HTTPException(status_code=500, detail=f"TTS failed: {response.text}")
-        # Save to cache
-        with open(cache_path, "wb") as f:
-            f.write(response.content)
-        print(f"[TTS CACHE] Saved audio to cache: {cache_path}", file=sys.stderr)
-        return Response(content=response.content, media_type="audio/mpeg")
-    except Exception as e:
-        print(f"[TTS DEBUG] Exception: {str(e)}", file=sys.stderr)
-        raise HTTPException(status_code=500, detail=f"TTS error: {str(e)}")
-    first_question = await get_next_question(None, db)
-    
-    return SessionResponse(
-        id=new_session.id,
-        status=new_session.status,
-        start_time=new_session.start_time,
-        tester_name=new_session.tester_name,
-        coffee_sample=new_session.coffee_sample,
-        current_question=first_question
-    )
+        return await audio_response(http_request, request.text, voice_id)
+    except TTSUpstreamError as e:
+        logger.warning("TTS upstream failed: %s", e.detail, extra={"status_code": e.status_code})
+        raise HTTPException(status_code=500, detail=e.detail)
+
+
+@app.get("/api/tts")
+async def tts_11labs_get(http_request: Request, text: str, voice_id: Optional[str] = None):
+    """
+    GET variant of /api/tts so audio elements can stream, seek with Range
+    requests and revalidate with ETag/Last-Modified.
+    """
+    return await tts_11labs(TTSRequest(text=text, voice_id=voice_id), http_request)
 
 
 @app.post("/api/feedback/answer", response_model=AnswerResponse)
 async def submit_answer(
     answer_data: AnswerCreate,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Submit an answer and get the next question"""
     from sqlalchemy import select
@@ -182,33 +172,59 @@ async def submit_answer(
     if session.status != "active":
         raise HTTPException(status_code=400, detail="Session is not active")
     
-    # Use AI to match/correct answer (if possible)
-    from services import match_answer_with_ai
-    # Get options for this question
-    result = await db.execute(select(Question).where(Question.id == answer_data.question_id))
-    question = result.scalar_one_or_none()
+    if answer_data.idempotency_key:
+        stored = await _answer_for_key(answer_data, db)
+        if stored:
+            return stored
+
+    if answer_data.graph_version:
+        await validate_answer_path(answer_data, db)
+
+    # Match/correct answer locally, falling back to AI when unsure. The same
+    # match object is reused for next-question routing (at most one LLM call)
+    from services import AnswerMatch
+    answer_match = AnswerMatch(answer_data.answer_text)
+    # Get options for this question from the compiled question graph
+    question = (await get_question_graph()).get(answer_data.question_id)
     matched = None
-    if question and question.option_groups:
-        # Extract options from all option groups
-        available_options = []
-        for group in question.option_groups:
-            available_options.extend(group.get('options', []))
-        matched = await match_answer_with_ai(answer_data.answer_text, available_options)
-    # Save the answer
-    new_answer = Answer(
-        session_id=answer_data.session_id,
-        question_id=answer_data.question_id,
-        answer_text=answer_data.answer_text,
-        matched_answer=matched,
-        answer_type=answer_data.answer_type,
-        confidence_score=answer_data.confidence_score,
-        timestamp=datetime.now()
-    )
-    db.add(new_answer)
-    await db.commit()
-    await db.refresh(new_answer)
+    if question and question.options:
+        with span("match"):
+            matched = await answer_match.resolve(question.options)
+    # Save the answer through the writer queue
+    async def save(write_db: AsyncSession) -> Answer:
+        new_answer = Answer(
+            session_id=answer_data.session_id,
+            question_id=answer_data.question_id,
+            answer_text=answer_data.answer_text,
+            matched_answer=matched,
+            answer_type=answer_data.answer_type,
+            confidence_score=answer_data.confidence_score,
+            timestamp=datetime.now(),
+            idempotency_key=answer_data.idempotency_key
+        )
+        write_db.add(new_answer)
+        await write_db.flush()
+        await increment_rollups(write_db, [
+            rollup_key(session.coffee_sample, new_answer.question_id, matched, new_answer.timestamp)
+        ])
+        return new_answer
+
+    try:
+        new_answer = await run_write(save)
+    except IntegrityError:
+        # A concurrent retry with the same idempotency key was stored first;
+        # end the read transaction so its snapshot includes that answer
+        await db.rollback()
+        stored = await _answer_for_key(answer_data, db)
+        if stored:
+            return stored
+        raise
     # Get next question
-    next_question = await get_next_question(answer_data.question_id, db, matched or answer_data.answer_text)
+    with span("next_question"):
+        next_question = await get_next_question(
+            answer_data.question_id, db, matched or answer_data.answer_text, answer_match
+        )
+    answer_match.record()
     return AnswerResponse(
         id=new_answer.id,
         session_id=new_answer.session_id,
@@ -220,49 +236,289 @@ async def submit_answer(
     )
 
 
+async def _answer_for_key(answer_data: AnswerCreate, db: AsyncSession) -> Optional[AnswerResponse]:
+    """Return the answer already stored under the request's idempotency key, if any."""
+    result = await db.execute(select(Answer).where(Answer.idempotency_key == answer_data.idempotency_key))
+    answer = result.scalar_one_or_none()
+    if answer is None:
+        return None
+    if answer.session_id != answer_data.session_id or answer.question_id != answer_data.question_id:
+        raise HTTPException(status_code=409, detail="Idempotency key was used for a different answer")
+    next_question = await get_next_question(answer.question_id, db, answer.matched_answer or answer.answer_text)
+    return AnswerResponse(
+        id=answer.id,
+        session_id=answer.session_id,
+        question_id=answer.question_id,
+        answer_text=answer.answer_text,
+        matched_answer=answer.matched_answer,
+        timestamp=answer.timestamp,
+        next_question=next_question
+    )
+
+
+def answer_path_error(graph, question_id: str, previous: Optional[tuple]) -> Optional[str]:
+    """
+    Return why ``question_id`` cannot follow ``previous`` (question_id, answer)
+    in the graph, or None if it can. Re-answering the previous question
+    (e.g. a retry) is accepted.
+    """
+    allowed = graph.allowed_next(*previous) if previous else graph.allowed_next(None)
+    if question_id in allowed or (previous and previous[0] == question_id):
+        return None
+    return f"Question {question_id} does not follow the previous answer"
+
+
+async def validate_answer_path(answer_data: AnswerCreate, db: AsyncSession):
+    """
+    Check that a client navigating from the questionnaire bundle used the
+    current graph and answered a question reachable from its previous answer.
+    """
+    graph = await get_question_graph()
+    if answer_data.graph_version != graph.version_tag:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Questionnaire has changed, reload it", "graph_version": graph.version_tag}
+        )
+    result = await db.execute(
+        select(Answer.question_id, Answer.matched_answer, Answer.answer_text)
+        .where(Answer.session_id == answer_data.session_id)
+        .order_by(Answer.timestamp.desc())
+        .limit(1)
+    )
+    previous = result.first()
+    error = answer_path_error(
+        graph,
+        answer_data.question_id,
+        (previous.question_id, previous.matched_answer or previous.answer_text) if previous else None
+    )
+    if error:
+        raise HTTPException(status_code=409, detail=error)
+
+
+@app.post("/api/feedback/answers/batch", response_model=AnswerBatchResponse)
+async def submit_answers_batch(
+    batch: AnswerBatchCreate,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Submit an ordered list of answers for one or more sessions.
+
+    Items are validated against the sessions (loaded in one query) and the
+    compiled question graph; valid ones are bulk-inserted in a single
+    transaction. Items whose idempotency key is already stored (or repeated
+    in the batch) return the stored answer instead. Returns a result per
+    item and the next question per session.
+    """
+    from services import AnswerMatch
+    graph = await get_question_graph()
+    keys = {a.idempotency_key for a in batch.answers if a.idempotency_key}
+    stored_by_key = {}
+    if keys:
+        result = await db.execute(select(Answer).where(Answer.idempotency_key.in_(keys)))
+        stored_by_key = {answer.idempotency_key: answer for answer in result.scalars()}
+    session_ids = {a.session_id for a in batch.answers}
+    result = await db.execute(
+        select(Session.id, Session.status, Session.coffee_sample).where(Session.id.in_(session_ids))
+    )
+    sessions = {row.id: row for row in result.all()}
+
+    # Latest stored answer per session, to validate bundle-navigated paths
+    previous = {}
+    if any(a.graph_version for a in batch.answers):
+        latest = (
+            select(Answer.session_id, func.max(Answer.timestamp).label("timestamp"))
+            .where(Answer.session_id.in_(session_ids))
+            .group_by(Answer.session_id)
+            .subquery()
+        )
+        result = await db.execute(
+            select(Answer.session_id, Answer.question_id, Answer.matched_answer, Answer.answer_text)
+            .join(latest, (Answer.session_id == latest.c.session_id) & (Answer.timestamp == latest.c.timestamp))
+        )
+        previous = {r.session_id: (r.question_id, r.matched_answer or r.answer_text) for r in result}
+
+    results: List[Optional[AnswerBatchItemResult]] = [None] * len(batch.answers)
+    accepted = []
+    replayed = []  # (index, item, stored answer or index of the first item with its key)
+    first_with_key = {}
+    for index, item in enumerate(batch.answers):
+        if item.idempotency_key in stored_by_key:
+            stored = stored_by_key[item.idempotency_key]
+            replayed.append((index, item, stored))
+            previous[item.session_id] = (stored.question_id, stored.matched_answer or stored.answer_text)
+            continue
+        if item.idempotency_key in first_with_key:
+            replayed.append((index, item, first_with_key[item.idempotency_key]))
+            continue
+        session = sessions.get(item.session_id)
+        if session is None:
+            error = "Session not found"
+        elif session.status != "active":
+            error = "Session is not active"
+        elif item.graph_version and item.graph_version != graph.version_tag:
+            error = "Questionnaire has changed, reload it"
+        elif item.graph_version:
+            error = answer_path_error(graph, item.question_id, previous.get(item.session_id))
+        else:
+            error = None
+        if error:
+            results[index] = AnswerBatchItemResult(index=index, status="error", error=error)
+            continue
+        previous[item.session_id] = (item.question_id, item.answer_text)
+        accepted.append((index, item, AnswerMatch(item.answer_text)))
+        if item.idempotency_key:
+            first_with_key[item.idempotency_key] = index
+
+    # Match all accepted answers concurrently (local first, LLM when unsure)
+    async def resolve(item, answer_match):
+        question = graph.get(item.question_id)
+        if question and question.options:
+            return await answer_match.resolve(question.options)
+        return None
+    matched = await asyncio.gather(*(resolve(item, m) for _, item, m in accepted))
+
+    inserted = []
+    if accepted:
+        base_time = datetime.now()
+        rows = [
+            {
+                "session_id": item.session_id,
+                "question_id": item.question_id,
+                "answer_text": item.answer_text,
+                "matched_answer": match,
+                "answer_type": item.answer_type,
+                "confidence_score": item.confidence_score,
+                # Keep submission order stable when ordering by timestamp
+                "timestamp": base_time + timedelta(microseconds=i),
+                "idempotency_key": item.idempotency_key,
+            }
+            for i, ((_, item, _), match) in enumerate(zip(accepted, matched))
+        ]
+        async def save(write_db: AsyncSession) -> List[Answer]:
+            try:
+                async with write_db.begin_nested():
+                    result = await write_db.scalars(
+                        insert(Answer).returning(Answer, sort_by_parameter_order=True), rows
+                    )
+                    answers = result.all()
+                new_answers = answers
+            except IntegrityError:
+                # A concurrent retry stored some of these keys first: insert
+                # row by row and return the stored answer for those
+                answers, new_answers = [], []
+                for row in rows:
+                    try:
+                        async with write_db.begin_nested():
+                            answer = (await write_db.scalars(insert(Answer).values(**row).returning(Answer))).one()
+                        new_answers.append(answer)
+                    except IntegrityError:
+                        answer = (await write_db.scalars(
+                            select(Answer).where(Answer.idempotency_key == row["idempotency_key"])
+                        )).one()
+                    answers.append(answer)
+            await increment_rollups(write_db, [
+                rollup_key(sessions[a.session_id].coffee_sample, a.question_id, a.matched_answer, a.timestamp)
+                for a in new_answers
+            ])
+            return answers
+
+        inserted = await run_write(save)
+
+    def answer_result(index: int, item: AnswerCreate, answer: Answer) -> AnswerBatchItemResult:
+        if answer.session_id != item.session_id or answer.question_id != item.question_id:
+            return AnswerBatchItemResult(
+                index=index, status="error", error="Idempotency key was used for a different answer"
+            )
+        return AnswerBatchItemResult(
+            index=index,
+            status="ok",
+            answer=AnswerResponse(
+                id=answer.id,
+                session_id=answer.session_id,
+                question_id=answer.question_id,
+                answer_text=answer.answer_text,
+                matched_answer=answer.matched_answer,
+                timestamp=answer.timestamp
+            )
+        )
+
+    answer_at = {index: answer for (index, _, _), answer in zip(accepted, inserted)}
+    for index, item, stored in replayed:
+        answer_at[index] = answer_at[stored] if isinstance(stored, int) else stored
+    match_at = {index: answer_match for index, _, answer_match in accepted}
+    last_per_session = {}
+    for index in sorted(answer_at):
+        item, answer = batch.answers[index], answer_at[index]
+        results[index] = answer_result(index, item, answer)
+        if results[index].status == "ok":
+            last_per_session[item.session_id] = (item, answer.matched_answer, match_at.get(index))
+
+    next_questions = {}
+    for session_id, (item, match, answer_match) in last_per_session.items():
+        next_questions[session_id] = await get_next_question(
+            item.question_id, db, match or item.answer_text, answer_match
+        )
+    for _, _, answer_match in accepted:
+        answer_match.record()
+
+    return AnswerBatchResponse(results=results, next_questions=next_questions)
+
+
+@app.post("/api/sync/sessions", response_model=SyncResponse)
+async def sync_sessions(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """
+    Merge sessions captured offline by a kiosk. The body is a SyncUpload,
+    optionally sent with Content-Encoding: gzip; replaying it is harmless.
+    """
+    upload = await read_sync_upload(request)
+    results = [await merge_session(db, session) for session in upload.sessions]
+    return SyncResponse(sessions=results)
+
+
+@app.get("/api/questionnaire", response_model=QuestionnaireBundle)
+async def get_questionnaire(request: Request):
+    """
+    Whole question graph (questions, branches, admin order) in one payload so
+    kiosks can navigate client-side. Revalidate with If-None-Match.
+    """
+    bundle = (await get_question_graph()).bundle()
+    etag = f'"{bundle["graph_version"]}"'
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=bundle, headers=headers)
+
+
 @app.get("/api/questions/{question_id}", response_model=QuestionResponse)
-async def get_question(question_id: str, db: AsyncSession = Depends(get_db)):
+async def get_question(question_id: str):
     """Fetch a specific question by ID"""
-    from sqlalchemy import select
-    
-    result = await db.execute(select(Question).where(Question.id == question_id))
-    question = result.scalar_one_or_none()
+    question = (await get_question_graph()).get(question_id)
     
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
     
-    return QuestionResponse(
-        id=question.id,
-        text=question.text,
-        type=question.type,
-        options=[opt for group in (question.option_groups or []) for opt in group.get('options', [])],
-        optionGroups=question.option_groups,
-        category=question.category,
-        order_index=question.order_index
-    )
+    return question
 
 
 @app.post("/api/sessions/{session_id}/complete", response_model=SessionResponse)
 async def complete_session(
     session_id: int,
-    completion_data: SessionComplete,
-    db: AsyncSession = Depends(get_db)
+    completion_data: SessionComplete
 ):
     """Mark a session as complete"""
-    from sqlalchemy import select
-    
-    result = await db.execute(select(Session).where(Session.id == session_id))
-    session = result.scalar_one_or_none()
-    
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    session.status = "completed"
-    session.end_time = datetime.now()
-    session.notes = completion_data.notes
-    
-    await db.commit()
-    await db.refresh(session)
+    async def complete(write_db: AsyncSession) -> Session:
+        result = await write_db.execute(select(Session).where(Session.id == session_id))
+        session = result.scalar_one_or_none()
+
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+
+        session.status = "completed"
+        session.end_time = datetime.now()
+        session.notes = completion_data.notes
+        return session
+
+    session = await run_write(complete)
     
     return SessionResponse(
         id=session.id,
@@ -275,7 +531,7 @@ async def complete_session(
 
 
 @app.get("/api/reports/{session_id}", response_model=FeedbackReport)
-async def get_report(session_id: int, db: AsyncSession = Depends(get_db)):
+async def get_report(session_id: int, db: AsyncSession = Depends(get_read_db)):
     """Generate a feedback report for a session"""
     from sqlalchemy import select
     
@@ -316,68 +572,204 @@ async def get_report(session_id: int, db: AsyncSession = Depends(get_db)):
     )
 
 
+def encode_session_cursor(start_time: datetime, session_id: int) -> str:
+    """Opaque keyset cursor for the (start_time, id) position of a session"""
+    raw = f"{start_time.isoformat()}|{session_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_session_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        start_time, session_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(start_time), int(session_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/api/reports/{session_id}/pdf")
+async def get_report_pdf(session_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    """Download a session's PDF report (rendered off the event loop, cached until the session changes)"""
+    renderer = get_report_renderer()
+    keys = await renderer.cache_keys([session_id], db)
+    if session_id not in keys:
+        raise HTTPException(status_code=404, detail="Session not found")
+    etag = renderer.etag(keys[session_id])
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    pdf, etag, cached = (await renderer.render([session_id], db, keys))[session_id]
+    headers["Content-Disposition"] = f'attachment; filename="feedback_session_{session_id}.pdf"'
+    headers["X-Report-Cache"] = "hit" if cached else "miss"
+    return Response(content=pdf, media_type="application/pdf", headers=headers)
+
+
+@app.post("/api/reports/pdf/batch")
+async def get_report_pdfs(batch: ReportBatchRequest, db: AsyncSession = Depends(get_read_db)):
+    """Render many sessions' PDF reports in parallel and return them as one zip"""
+    import io
+    import zipfile
+
+    session_ids = list(dict.fromkeys(batch.session_ids))
+    reports = await get_report_renderer().render(session_ids, db)
+    if not reports:
+        raise HTTPException(status_code=404, detail="No matching sessions")
+    archive = io.BytesIO()
+    # PDFs are already compressed
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf:
+        for session_id in session_ids:
+            if session_id in reports:
+                zf.writestr(f"feedback_session_{session_id}.pdf", reports[session_id][0])
+    missing = [str(sid) for sid in session_ids if sid not in reports]
+    headers = {"Content-Disposition": 'attachment; filename="feedback_reports.zip"'}
+    if missing:
+        headers["X-Missing-Sessions"] = ",".join(missing)
+    return Response(content=archive.getvalue(), media_type="application/zip", headers=headers)
+
+
+@app.get("/api/analytics/samples")
+async def analytics_samples(db: AsyncSession = Depends(get_read_db)):
+    """Coffee samples with recorded answers"""
+    return await list_samples(db)
+
+
+@app.get("/api/analytics/questions/{question_id}")
+async def analytics_question(
+    question_id: str,
+    coffee_sample: Optional[str] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    by_day: bool = False,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Distribution of matched answers for a question, optionally for one sample and per day"""
+    return await question_distribution(db, question_id, coffee_sample, since, until, by_day)
+
+
+@app.get("/api/analytics/flavors")
+async def analytics_flavors(
+    coffee_sample: Optional[str] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Primary flavor distribution with the specific flavors detected under each"""
+    return await flavor_tree(db, coffee_sample, since, until)
+
+
 @app.get("/api/sessions", response_model=List[SessionResponse])
 async def list_sessions(
-    limit: int = 50,
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
     status: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
+    coffee_sample: Optional[str] = None,
+    tester_name: Optional[str] = None,
+    started_after: Optional[datetime] = None,
+    started_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    include_answer_counts: bool = False,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """List all feedback sessions"""
-    from sqlalchemy import select
-    
-    query = select(Session).order_by(Session.start_time.desc()).limit(limit)
-    
+    """
+    List feedback sessions, newest first.
+
+    Paginated by keyset on (start_time, id): pass the X-Next-Cursor header
+    of one page as ``cursor`` to get the next (also linked via Link rel=next).
+    Only the listed columns are selected, and answer counts, when asked for,
+    come from one grouped subquery over the page.
+    """
+    query = select(
+        Session.id, Session.status, Session.start_time, Session.end_time,
+        Session.tester_name, Session.coffee_sample
+    )
     if status:
         query = query.where(Session.status == status)
-    
-    result = await db.execute(query)
-    sessions = result.scalars().all()
-    
-    return [
-        SessionResponse(
-            id=session.id,
-            status=session.status,
-            start_time=session.start_time,
-            end_time=session.end_time,
-            tester_name=session.tester_name,
-            coffee_sample=session.coffee_sample
+    if coffee_sample:
+        query = query.where(Session.coffee_sample == coffee_sample)
+    if tester_name:
+        query = query.where(Session.tester_name == tester_name)
+    if started_after:
+        query = query.where(Session.start_time >= started_after)
+    if started_before:
+        query = query.where(Session.start_time < started_before)
+    if cursor:
+        after_time, after_id = decode_session_cursor(cursor)
+        # The leading bound lets the start_time index seek instead of scanning from the top
+        query = query.where(
+            Session.start_time <= after_time,
+            or_(Session.start_time < after_time, Session.id < after_id)
+        )
+    # One extra row tells whether there is a next page
+    page = query.order_by(Session.start_time.desc(), Session.id.desc()).limit(limit + 1)
+
+    if include_answer_counts:
+        page = page.subquery()
+        counts = (
+            select(Answer.session_id, func.count().label("answer_count"))
+            .where(Answer.session_id.in_(select(page.c.id)))
+            .group_by(Answer.session_id)
+            .subquery()
+        )
+        page = (
+            select(page, func.coalesce(counts.c.answer_count, 0).label("answer_count"))
+            .outerjoin(counts, counts.c.session_id == page.c.id)
+            .order_by(page.c.start_time.desc(), page.c.id.desc())
         )
-        for session in sessions
-    ]
 
-    
-    result = await db.execute(select(Question).order_by(Question.order_index))
-    questions = result.scalars().all()
-    
+    rows = (await db.execute(page)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_session_cursor(rows[-1].start_time, rows[-1].id)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+
     return [
-        QuestionResponse(
-            id=question.id,
-            text=question.text,
-            type=question.type,
-            options=question.options,
-            category=question.category,
-            order_index=question.order_index
+        SessionResponse(
+            id=row.id,
+            status=row.status,
+            start_time=row.start_time,
+            end_time=row.end_time,
+            tester_name=row.tester_name,
+            coffee_sample=row.coffee_sample,
+            answer_count=row.answer_count if include_answer_counts else None
         )
-        for question in questions
+        for row in rows
     ]
 
 
-@app.post("/api/sessions/{session_id}/export-csv")
-async def export_csv(session_id: int, db: AsyncSession = Depends(get_db)):
-    """Export session feedback to CSV"""
-    from services import export_session_to_csv
-    import os
-    
-    filepath = await export_session_to_csv(session_id, db)
-    if not filepath:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    return {
-        "status": "success", 
-        "message": "CSV exported successfully",
-        "filename": os.path.basename(filepath),
-        "filepath": filepath
-    }
+@app.get("/api/exports/answers")
+async def export_answers(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet|arrow)$"),
+    session_id: Optional[int] = None,
+    status: Optional[str] = None,
+    coffee_sample: Optional[str] = None,
+    tester_name: Optional[str] = None,
+    started_after: Optional[datetime] = None,
+    started_before: Optional[datetime] = None
+):
+    """
+    Stream the answers of every session matching the filter as a download:
+    CSV, NDJSON, or (with pyarrow installed) Parquet / Arrow IPC stream.
+    """
+    if format in ("parquet", "arrow") and not pyarrow_available():
+        raise HTTPException(status_code=501, detail=f"{format} export requires pyarrow to be installed")
+    filters = ExportFilter(
+        session_id=session_id,
+        status=status,
+        coffee_sample=coffee_sample,
+        tester_name=tester_name,
+        started_after=started_after,
+        started_before=started_before
+    )
+    media_type, extension = EXPORT_FORMATS[format]
+    name = f"feedback_session_{session_id}" if session_id is not None else "feedback_answers"
+    filename = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return StreamingResponse(
+        iter_export(filters, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 
@@ -394,6 +786,14 @@ class AdminQuestionIn(BaseModel):
     category: Optional[str] = None
     order_index: Optional[int] = 0
 
+def _flatten_options(option_groups) -> List[str]:
+    return [opt for group in (option_groups or []) for opt in group.get('options', [])]
+
+def _schedule_prewarm(background_tasks: BackgroundTasks, question: Question):
+    """Synthesize a created/updated question's prompts after the response is sent"""
+    if os.getenv("ELEVENLABS_API_KEY"):
+        background_tasks.add_task(prewarm_texts, question_prompts(question, prewarm_options_enabled()))
+
 @app.get("/api/admin/questions")
 async def admin_list_questions(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Question).order_by(Question.order_index))
@@ -410,50 +810,173 @@ async def admin_list_questions(db: AsyncSession = Depends(get_db)):
     ]
 
 @app.post("/api/admin/questions", status_code=http_status.HTTP_201_CREATED)
-async def admin_create_question(q: AdminQuestionIn, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Question).where(Question.id == q.id))
-    if result.scalar_one_or_none():
-        raise HTTPException(status_code=400, detail="Question ID already exists")
-    question = Question(
-        id=q.id,
-        text=q.text,
-        type=q.type,
-        option_groups=[group.dict() for group in (q.optionGroups or [])],
-        category=q.category,
-        order_index=q.order_index or 0
-    )
-    db.add(question)
-    await db.commit()
-    await db.refresh(question)
+async def admin_create_question(q: AdminQuestionIn, background_tasks: BackgroundTasks):
+    async def create(write_db: AsyncSession) -> Question:
+        result = await write_db.execute(select(Question).where(Question.id == q.id))
+        if result.scalar_one_or_none():
+            raise HTTPException(status_code=400, detail="Question ID already exists")
+        question = Question(
+            id=q.id,
+            text=q.text,
+            type=q.type,
+            option_groups=[group.dict() for group in (q.optionGroups or [])],
+            category=q.category,
+            order_index=q.order_index or 0
+        )
+        write_db.add(question)
+        await write_db.flush()
+        return question
+
+    question = await run_write(create)
+    invalidate_question_graph()
+    _schedule_prewarm(background_tasks, question)
     return {"status": "created", "id": question.id}
 
 @app.put("/api/admin/questions/{question_id}")
-async def admin_update_question(question_id: str, q: AdminQuestionIn, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Question).where(Question.id == question_id))
-    question = result.scalar_one_or_none()
-    if not question:
-        raise HTTPException(status_code=404, detail="Question not found")
-    question.text = q.text
-    question.type = q.type
-    question.option_groups = [group.dict() for group in (q.optionGroups or [])]
-    question.category = q.category
-    question.order_index = q.order_index or 0
-    await db.commit()
-    await db.refresh(question)
+async def admin_update_question(question_id: str, q: AdminQuestionIn, background_tasks: BackgroundTasks):
+    async def update(write_db: AsyncSession) -> tuple:
+        result = await write_db.execute(select(Question).where(Question.id == question_id))
+        question = result.scalar_one_or_none()
+        if not question:
+            raise HTTPException(status_code=404, detail="Question not found")
+        old_options = _flatten_options(question.option_groups)
+        question.text = q.text
+        question.type = q.type
+        question.option_groups = [group.dict() for group in (q.optionGroups or [])]
+        question.category = q.category
+        question.order_index = q.order_index or 0
+        await write_db.flush()
+        return question, old_options
+
+    question, old_options = await run_write(update)
+    invalidate_question_graph()
+    if _flatten_options(question.option_groups) != old_options:
+        await get_match_cache().invalidate_options(old_options)
+    _schedule_prewarm(background_tasks, question)
+    background_tasks.add_task(gc_tts_cache)
     return {"status": "updated", "id": question.id}
 
 @app.delete("/api/admin/questions/{question_id}")
-async def admin_delete_question(question_id: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Question).where(Question.id == question_id))
-    question = result.scalar_one_or_none()
-    if not question:
-        raise HTTPException(status_code=404, detail="Question not found")
-    await db.delete(question)
-    await db.commit()
+async def admin_delete_question(question_id: str, background_tasks: BackgroundTasks):
+    async def remove(write_db: AsyncSession) -> list:
+        result = await write_db.execute(select(Question).where(Question.id == question_id))
+        question = result.scalar_one_or_none()
+        if not question:
+            raise HTTPException(status_code=404, detail="Question not found")
+        old_options = _flatten_options(question.option_groups)
+        await write_db.delete(question)
+        await write_db.flush()
+        return old_options
+
+    old_options = await run_write(remove)
+    invalidate_question_graph()
+    await get_match_cache().invalidate_options(old_options)
+    background_tasks.add_task(gc_tts_cache)
     return {"status": "deleted", "id": question_id}
 
+@app.get("/api/admin/db/pool")
+async def admin_db_pool_stats():
+    """Connection pool statistics for the shared database engine(s) and the writer queue"""
+    stats = get_pool_stats()
+    writer = get_db_writer()
+    stats["writer"] = writer.stats() if writer else None
+    return stats
+
+@app.get("/api/admin/tts/cache")
+async def admin_tts_cache_stats():
+    """Hit, miss and eviction counters for the TTS audio cache"""
+    return get_tts_cache().stats()
+
+@app.get("/api/admin/tts/coverage")
+async def admin_tts_coverage():
+    """Percentage of question prompts already in the TTS cache"""
+    return await tts_coverage()
+
+@app.post("/api/admin/tts/prewarm")
+async def admin_tts_prewarm():
+    """Synthesize every uncached question prompt now"""
+    return await prewarm_questions()
+
+@app.post("/api/admin/tts/gc")
+async def admin_tts_gc():
+    """Remove cached audio for prompts no question uses any more"""
+    return await gc_tts_cache()
+
+@app.get("/api/admin/reports/cache")
+async def admin_report_cache_stats():
+    """PDF report renderer and cache statistics"""
+    return get_report_renderer().stats()
+
+
+@app.post("/api/admin/analytics/rebuild")
+async def admin_rebuild_analytics():
+    """Recompute analytics rollups from all stored answers"""
+    return {"rollup_rows": await run_write(rebuild_rollups)}
+
+
+def _cache_lookups() -> dict:
+    match_cache, tts_cache = get_match_cache(), get_tts_cache()
+    report_cache = get_report_renderer().cache
+    return {
+        ("match", "memory_hit"): match_cache.memory_hits,
+        ("match", "db_hit"): match_cache.db_hits,
+        ("match", "miss"): match_cache.misses,
+        ("tts", "memory_hit"): tts_cache.memory.hits,
+        ("tts", "disk_hit"): tts_cache.disk_hits,
+        ("tts", "miss"): tts_cache.memory.misses - tts_cache.disk_hits,
+        ("report", "hit"): report_cache.hits,
+        ("report", "miss"): report_cache.misses,
+    }
+
+
+def _cache_hit_ratios() -> dict:
+    totals: dict = {}
+    for (cache, result), count in _cache_lookups().items():
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (0 if result == "miss" else count), lookups + count)
+    return {cache: round(hits / lookups, 4) if lookups else 0.0 for cache, (hits, lookups) in totals.items()}
+
+
+def _db_connections() -> dict:
+    stats = get_pool_stats()
+    pools = {"write": stats, "read": stats.get("read_pool")}
+    return {
+        (pool, state): values.get(key)
+        for pool, values in pools.items() if values
+        for state, key in (("checked_out", "checkedout"), ("idle", "idle"))
+    }
+
+
+register_gauge("coffee_cache_lookups", "Cache lookups by result since startup", _cache_lookups, ["cache", "result"])
+register_gauge("coffee_cache_hit_ratio", "Share of cache lookups that hit", _cache_hit_ratios, ["cache"])
+register_gauge("coffee_llm_calls_per_answer", "Average LLM calls per submitted answer",
+               lambda: get_matching_stats()["llm_calls_per_answer"])
+register_gauge("coffee_breaker_state", "Circuit breaker state (1 for the current one)",
+               lambda: {("openai", state): value for state, value in get_openai_breaker().state_values().items()},
+               ["breaker", "state"])
+register_gauge("coffee_db_connections", "Pooled database connections", _db_connections, ["pool", "state"])
+register_gauge("coffee_db_writer_queued", "Write operations waiting for the writer",
+               lambda: get_db_writer().stats()["queued"] if get_db_writer() else 0)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: route and dependency latencies, call counts, cache hit ratios"""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/admin/matching/stats")
+async def admin_matching_stats():
+    """How many LLM calls answers took to match"""
+    return get_matching_stats()
+
+@app.get("/api/admin/matching/cache")
+async def admin_matching_cache():
+    """Hit rate and most frequently cached utterances of the LLM match cache"""
+    return await get_match_cache().stats()
+
 @app.get("/api/sessions/{session_id}/next", response_model=QuestionResponse)
-async def get_next_question_endpoint(session_id: int, db: AsyncSession = Depends(get_db)):
+async def get_next_question_endpoint(session_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get the next question for a session (fallback endpoint)"""
     from sqlalchemy import select
     
@@ -466,16 +989,10 @@ async def get_next_question_endpoint(session_id: int, db: AsyncSession = Depends
     
     # Get next question (first if none answered yet)
     question = await get_next_question(None, db)
+    if not question:
+        raise HTTPException(status_code=404, detail="No questions available")
     
-    return QuestionResponse(
-        id=question.id,
-        text=question.text,
-        type=question.type,
-        options=[opt for group in (question.option_groups or []) for opt in group.get('options', [])],
-        optionGroups=question.option_groups,
-        category=question.category,
-        order_index=question.order_index
-    )
+    return question
 
 @app.post("/api/sessions", response_model=SessionResponse)
 async def start_session_alias(
@@ -0,0 +1,204 @@
+"""
+Persistent memoization of LLM answer matches
+
+Testers repeat the same few phrasings, so LLM match results are cached by
+normalized utterance plus a hash of the option set: an in-process LRU in
+front of the ``match_cache`` table. NONE results are cached too, with a
+shorter TTL, and entries for an option set are dropped when a question's
+options change.
+"""
+
+import hashlib
+import logging
+import os
+from collections import OrderedDict, Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, delete, update
+
+from database import get_read_session_maker
+from db_writer import run_write
+from matching import normalize
+from models import MatchCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Returned by get() when nothing is cached (None is a cached NONE result)
+MISS = object()
+# Pending memory-tier hit counts are written back after this many hits
+HIT_FLUSH_THRESHOLD = 50
+
+
+def options_hash(options: List[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(options)).encode("utf-8")).hexdigest()
+
+
+class MatchCache:
+    """LRU in front of the match_cache table; see module docstring."""
+
+    def __init__(self, max_entries: int = 1024, ttl: timedelta = timedelta(days=30),
+                 negative_ttl: timedelta = timedelta(days=1)):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[Tuple[str, str], Tuple[Optional[str], datetime]]" = OrderedDict()
+        self._pending_hits: Counter = Counter()
+
+    @classmethod
+    def from_env(cls) -> "MatchCache":
+        return cls(
+            max_entries=int(os.getenv("MATCH_CACHE_SIZE", "1024")),
+            ttl=timedelta(seconds=int(os.getenv("MATCH_CACHE_TTL", str(30 * 24 * 3600)))),
+            negative_ttl=timedelta(seconds=int(os.getenv("MATCH_CACHE_NEGATIVE_TTL", str(24 * 3600)))),
+        )
+
+    def _expiry(self, matched: Optional[str], created_at: datetime) -> datetime:
+        return created_at + (self.ttl if matched is not None else self.negative_ttl)
+
+    def _remember(self, key: Tuple[str, str], matched: Optional[str], expires_at: datetime):
+        self._items[key] = (matched, expires_at)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    async def get(self, utterance: str, options: List[str]):
+        """Return the cached match (possibly None for NONE) or ``MISS``."""
+        key = (normalize(utterance), options_hash(options))
+        now = datetime.now()
+        cached = self._items.get(key)
+        if cached is not None:
+            matched, expires_at = cached
+            if expires_at > now:
+                self._items.move_to_end(key)
+                self.memory_hits += 1
+                await self._count_hit(key)
+                return matched
+            del self._items[key]
+
+        # Read-only lookup; the hit count is written back with the memory-tier hits
+        async with get_read_session_maker()() as session:
+            result = await session.execute(
+                select(MatchCacheEntry.matched_answer, MatchCacheEntry.created_at)
+                .where(MatchCacheEntry.utterance == key[0])
+                .where(MatchCacheEntry.options_hash == key[1])
+            )
+            entry = result.one_or_none()
+        if entry is None or self._expiry(entry.matched_answer, entry.created_at) <= now:
+            self.misses += 1
+            return MISS
+        self.db_hits += 1
+        await self._count_hit(key)
+        self._remember(key, entry.matched_answer, self._expiry(entry.matched_answer, entry.created_at))
+        return entry.matched_answer
+
+    async def _count_hit(self, key: Tuple[str, str]):
+        self._pending_hits[key] += 1
+        if sum(self._pending_hits.values()) >= HIT_FLUSH_THRESHOLD:
+            try:
+                await self.flush_hits()
+            except Exception as e:
+                # Hit statistics only; the lookup itself succeeded
+                logger.warning("Match cache hit flush failed: %s", e, extra={"error_type": type(e).__name__})
+
+    async def put(self, utterance: str, options: List[str], matched: Optional[str]):
+        key = (normalize(utterance), options_hash(options))
+        now = datetime.now()
+        self._remember(key, matched, self._expiry(matched, now))
+
+        async def store(session):
+            # Replace any expired row for the same key
+            await session.execute(
+                delete(MatchCacheEntry)
+                .where(MatchCacheEntry.utterance == key[0])
+                .where(MatchCacheEntry.options_hash == key[1])
+            )
+            session.add(MatchCacheEntry(
+                utterance=key[0][:255],
+                options_hash=key[1],
+                matched_answer=matched,
+                hit_count=0,
+                created_at=now,
+            ))
+            await session.flush()
+
+        await run_write(store)
+
+    async def flush_hits(self):
+        """Write memory-tier hit counts back to the table."""
+        if not self._pending_hits:
+            return
+        pending, self._pending_hits = self._pending_hits, Counter()
+        now = datetime.now()
+
+        async def write_hits(session):
+            for (utterance, opts_hash), hits in pending.items():
+                await session.execute(
+                    update(MatchCacheEntry)
+                    .where(MatchCacheEntry.utterance == utterance)
+                    .where(MatchCacheEntry.options_hash == opts_hash)
+                    .values(hit_count=MatchCacheEntry.hit_count + hits, last_hit_at=now)
+                )
+
+        try:
+            await run_write(write_hits)
+        except Exception:
+            # Keep the counts for the next flush
+            self._pending_hits.update(pending)
+            raise
+
+    async def invalidate_options(self, options: List[str]) -> int:
+        """Drop every cached match for an option set that has changed."""
+        opts_hash = options_hash(options)
+        for key in [k for k in self._items if k[1] == opts_hash]:
+            del self._items[key]
+        for key in [k for k in self._pending_hits if k[1] == opts_hash]:
+            del self._pending_hits[key]
+
+        async def delete_entries(session) -> int:
+            result = await session.execute(
+                delete(MatchCacheEntry).where(MatchCacheEntry.options_hash == opts_hash)
+            )
+            return result.rowcount or 0
+
+        return await run_write(delete_entries)
+
+    async def stats(self, top: int = 20) -> Dict:
+        await self.flush_hits()
+        async with get_read_session_maker()() as session:
+            result = await session.execute(
+                select(MatchCacheEntry).order_by(MatchCacheEntry.hit_count.desc()).limit(top)
+            )
+            top_entries = result.scalars().all()
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_entries": len(self._items),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+            "top_utterances": [
+                {
+                    "utterance": e.utterance,
+                    "matched_answer": e.matched_answer,
+                    "hit_count": e.hit_count,
+                    "created_at": e.created_at.isoformat(),
+                    "last_hit_at": e.last_hit_at.isoformat() if e.last_hit_at else None,
+                }
+                for e in top_entries
+            ],
+        }
+
+
+_match_cache: Optional[MatchCache] = None
+
+
+def get_match_cache() -> MatchCache:
+    """Return the process-wide match cache."""
+    global _match_cache
+    if _match_cache is None:
+        _match_cache = MatchCache.from_env()
+    return _match_cache
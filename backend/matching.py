@@ -0,0 +1,302 @@
+"""
+Deterministic local answer matching
+
+Matches a spoken/typed answer against a question's options without calling
+an LLM. Candidates are scored by, in order of confidence: normalized exact
+match, synonym tables, stemming/plural rules, option words found anywhere
+in the sentence, phonetic keys and edit distance. The LLM is only needed
+when the best local score falls below the configured threshold; phonetic
+and edit-distance guesses always score below the default threshold, and
+negated or hedged answers ("not fruity", "not sure") are left to the LLM.
+"""
+
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Spoken words that mean an option without sharing its spelling or sound
+SYNONYMS: Dict[str, str] = {
+    "chocolate": "Cocoa",
+    "chocolatey": "Cocoa",
+    "chocolaty": "Cocoa",
+    "cacao": "Cocoa",
+    "mocha": "Cocoa",
+    "flower": "Floral",
+    "flowery": "Floral",
+    "blossom": "Floral",
+    "perfume": "Floral",
+    "nut": "Nutty",
+    "almond": "Nutty",
+    "hazelnut": "Nutty",
+    "peanut": "Nutty",
+    "fruit": "Fruity",
+    "grain": "Cereal",
+    "grainy": "Cereal",
+    "malt": "Cereal",
+    "malty": "Cereal",
+    "bread": "Cereal",
+    "toast": "Roasted",
+    "toasty": "Roasted",
+    "burnt": "Roasted",
+    "smoky": "Roasted",
+    "smoke": "Roasted",
+    "spicy": "Spices",
+    "pepper": "Spices",
+    "peppery": "Spices",
+    "cinnamon": "Spices",
+    "sugar": "Sweet",
+    "sugary": "Sweet",
+    "caramel": "Sweet",
+    "honey": "Sweet",
+    "soil": "Earthy",
+    "dirt": "Earthy",
+    "musty": "Earthy",
+    "grassy": "Vegetative",
+    "grass": "Vegetative",
+    "herbal": "Vegetative",
+    "vegetable": "Vegetative",
+    "stale": "Stale/Papery",
+    "paper": "Stale/Papery",
+    "cardboard": "Stale/Papery",
+    "woody": "Stale/Papery",
+    "medicinal": "Chemical",
+    "rubber": "Chemical",
+    "boozy": "Alcohol/Fermented",
+    "wine": "Alcohol/Fermented",
+    "winey": "Alcohol/Fermented",
+    "fermented": "Alcohol/Fermented",
+    "nothing": "None",
+    "nope": "None",
+    "n/a": "Not Applicable",
+}
+
+# Confidence assigned by each matching stage
+SCORES = {
+    "exact": 1.0,
+    "synonym": 0.95,
+    "stem": 0.95,
+    "token": 0.9,
+    # Below the default threshold: "sweat" sounds like Sweet, "note" like Nutty
+    "phonetic": 0.75,
+}
+# Confidence when several options are mentioned in one answer
+AMBIGUOUS_SCORE = 0.6
+# Edit-distance similarity below which no candidate is reported
+MIN_EDIT_SIMILARITY = 0.6
+
+# Words that negate or hedge an answer ("t" is what normalize leaves of n't)
+NEGATORS = frozenset({
+    "not", "no", "never", "neither", "nor", "without", "t",
+    "dont", "doesnt", "didnt", "isnt", "wasnt", "cant", "unsure", "dunno",
+})
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+@dataclass(frozen=True)
+class LocalMatch:
+    """Best local match for an answer: option, confidence (0-1) and stage."""
+    option: str
+    confidence: float
+    method: str
+
+
+def get_confidence_threshold() -> float:
+    """Local matches at or above this confidence skip the LLM."""
+    return float(os.getenv("MATCH_CONFIDENCE_THRESHOLD", "0.8"))
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def stem(word: str) -> str:
+    """
+    Light suffix stripper so plurals and adjective forms share a stem:
+    fruity/fruits -> fruit, nutty/nuts -> nut, roasted/roasty -> roast.
+    """
+    if len(word) <= 3:
+        return word
+    for suffix, replacement in (("ies", "y"), ("es", ""), ("s", "")):
+        if word.endswith(suffix) and not word.endswith("ss") and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)] + replacement
+            break
+    for suffix in ("iness", "ness", "ing", "ed", "ish", "ey", "y", "e"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)]
+            break
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "aeiou":
+        word = word[:-1]
+    return word
+
+
+_PHONETIC_RULES = tuple((re.compile(pattern), replacement) for pattern, replacement in (
+    (r"^kn", "n"), (r"^wr", "r"), (r"^ps", "s"), (r"^wh", "w"),
+    (r"ph", "f"), (r"ck", "k"), (r"sch", "sk"), (r"tch", "ch"),
+    (r"c(?=[eiy])", "s"), (r"dg(?=[eiy])", "j"), (r"gh", ""),
+    (r"th", "0"), (r"sh", "x"), (r"ch", "x"),
+    (r"c", "k"), (r"q", "k"), (r"x", "ks"), (r"z", "s"), (r"v", "f"),
+))
+_VOWELS_RE = re.compile(r"[aeiouyhw]")
+
+
+@lru_cache(maxsize=4096)
+def phonetic_key(word: str) -> str:
+    """
+    Metaphone-style sound key: consonant clusters are rewritten to a
+    canonical sound and vowels dropped (a leading vowel becomes "A"), so
+    "serial"/"cereal" and "arthi"/"earthy" share a key.
+    """
+    if not word:
+        return ""
+    key = word
+    for pattern, replacement in _PHONETIC_RULES:
+        key = pattern.sub(replacement, key)
+    if not key:
+        return ""
+    head = "A" if key[0] in "aeiouy" else key[0]
+    body = _VOWELS_RE.sub("", key[1:])
+    collapsed = head
+    for ch in body:
+        if ch != collapsed[-1]:
+            collapsed += ch
+    return collapsed
+
+
+def edit_similarity(a: str, b: str) -> float:
+    """1 - Levenshtein distance / longer length."""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return 1.0 - previous[-1] / max(len(a), len(b))
+
+
+class OptionIndex:
+    """Precomputed lookup tables for one question's option list."""
+
+    def __init__(self, options: Sequence[str]):
+        self.options = list(options)
+        self.by_phrase: Dict[str, str] = {}
+        self.by_stem: Dict[str, str] = {}
+        self.by_sound: Dict[str, str] = {}
+        self.stems: List[Tuple[str, str]] = []
+        lowered = {opt.lower(): opt for opt in self.options}
+        self.synonyms = {
+            normalize(word): lowered[target.lower()]
+            for word, target in SYNONYMS.items() if target.lower() in lowered
+        }
+        for option in self.options:
+            phrase = normalize(option)
+            if not phrase:
+                continue
+            self.by_phrase.setdefault(phrase, option)
+            # "Stale/Papery" is also reachable as "stale" or "papery"
+            parts = [phrase] + [normalize(p) for p in option.split("/") if "/" in option]
+            for part in parts:
+                self.by_phrase.setdefault(part, option)
+                part_stem = " ".join(stem(w) for w in part.split())
+                self.by_stem.setdefault(part_stem, option)
+                self.stems.append((part_stem, option))
+                if " " not in part:
+                    sound = phonetic_key(part_stem)
+                    if len(sound) >= 2:
+                        self.by_sound.setdefault(sound, option)
+        # Option phrases that contain a negator themselves ("Not Applicable")
+        self.negator_phrases = [
+            phrase for phrase in list(self.by_phrase) + list(self.synonyms)
+            if NEGATORS.intersection(phrase.split())
+        ]
+
+    def match(self, answer: str) -> Optional[LocalMatch]:
+        text = normalize(answer)
+        if not text:
+            return None
+        if text in self.by_phrase:
+            return LocalMatch(self.by_phrase[text], SCORES["exact"], "exact")
+        if text in self.synonyms:
+            return LocalMatch(self.synonyms[text], SCORES["synonym"], "synonym")
+        text_stem = " ".join(stem(w) for w in text.split())
+        if text_stem in self.by_stem:
+            return LocalMatch(self.by_stem[text_stem], SCORES["stem"], "stem")
+
+        if self._negated(text):
+            return None
+
+        words = text.split()
+        stems = [stem(w) for w in words]
+        found = self._find_in_sentence(words, stems)
+        if found:
+            distinct = list(dict.fromkeys(option for option, _ in found))
+            if len(distinct) == 1:
+                return LocalMatch(distinct[0], SCORES["token"], "token")
+            return LocalMatch(distinct[0], AMBIGUOUS_SCORE, "ambiguous")
+
+        sounds = {phonetic_key(s) for s in stems if len(s) >= 3}
+        heard = [self.by_sound[s] for s in sounds if s in self.by_sound]
+        if len(set(heard)) == 1:
+            return LocalMatch(heard[0], SCORES["phonetic"], "phonetic")
+
+        return self._closest(stems + ([text_stem] if len(words) > 1 else []))
+
+    def _negated(self, text: str) -> bool:
+        """Whether the answer negates or hedges, other than by naming an option like "Not Applicable"."""
+        remaining = f" {text} "
+        for phrase in self.negator_phrases:
+            remaining = remaining.replace(f" {phrase} ", " ")
+        return not NEGATORS.isdisjoint(remaining.split())
+
+    def _find_in_sentence(self, words: List[str], stems: List[str]) -> List[Tuple[str, int]]:
+        """Options (with word position) mentioned anywhere in a longer answer."""
+        found = []
+        for size in (3, 2, 1):
+            for i in range(len(words) - size + 1):
+                gram = " ".join(words[i:i + size])
+                gram_stem = " ".join(stems[i:i + size])
+                option = (self.by_phrase.get(gram) or self.synonyms.get(gram)
+                          or self.by_stem.get(gram_stem) or self.synonyms.get(gram_stem))
+                if option:
+                    found.append((option, i))
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def _closest(self, candidates: List[str]) -> Optional[LocalMatch]:
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            if len(candidate) < 3:
+                continue
+            for option_stem, option in self.stems:
+                # Length difference alone bounds the similarity; skip hopeless pairs
+                longest = max(len(candidate), len(option_stem))
+                if 1.0 - abs(len(candidate) - len(option_stem)) / longest <= max(best_score, MIN_EDIT_SIMILARITY):
+                    continue
+                score = edit_similarity(candidate, option_stem)
+                if score > best_score:
+                    best, best_score = option, score
+        if best is None or best_score < MIN_EDIT_SIMILARITY:
+            return None
+        # Scale into the band below a phonetic match
+        return LocalMatch(best, round(best_score * SCORES["phonetic"], 3), "edit_distance")
+
+
+@lru_cache(maxsize=256)
+def _index_for(options: Tuple[str, ...]) -> OptionIndex:
+    return OptionIndex(options)
+
+
+def match_locally(user_answer: str, available_options: Sequence[str]) -> Optional[LocalMatch]:
+    """Best deterministic match of ``user_answer`` against ``available_options``."""
+    if not user_answer or not available_options:
+        return None
+    return _index_for(tuple(available_options)).match(user_answer)
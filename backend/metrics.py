@@ -0,0 +1,312 @@
+"""
+Request timing and Prometheus metrics
+
+``TimingMiddleware`` opens a timing context for every HTTP request. Hot
+paths wrap their slow calls in ``span("name")`` (or report a duration with
+``record``): the time is added to the current request, sent back in its
+``Server-Timing`` header, and observed in the per-dependency latency
+histogram. Database statements and commits are timed through SQLAlchemy
+events (``instrument_engine``). ``render_metrics`` produces the Prometheus
+text exposition format without needing prometheus_client.
+"""
+
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.label_names), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}_total{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # {labels: [per-bucket counts (last is +Inf), sum, count]}
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = Lock()
+
+    def observe(self, seconds: float, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def samples(self) -> Iterator[str]:
+        names = self.label_names + ("le",)
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                yield f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Gauge:
+    """
+    Gauge read when metrics are scraped: ``collect`` returns either a number
+    or {label value (or tuple of values): number}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, collect: Callable, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.collect = collect
+
+    def samples(self) -> Iterator[str]:
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items(), key=lambda item: str(item[0])):
+            if value is None:
+                continue
+            key = key if isinstance(key, tuple) else (key,)
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+_registry: List = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def register_gauge(name: str, documentation: str, collect: Callable, labels: Sequence[str] = ()) -> Gauge:
+    """Add a scrape-time gauge (replacing one of the same name)."""
+    _registry[:] = [metric for metric in _registry if metric.name != name]
+    return _register(Gauge(name, documentation, collect, labels))
+
+
+HTTP_REQUEST_DURATION = _register(Histogram(
+    "coffee_http_request_duration_seconds",
+    "Time until the response headers were sent, per route",
+    ["method", "route", "status"],
+))
+DEPENDENCY_DURATION = _register(Histogram(
+    "coffee_dependency_duration_seconds",
+    "Time spent in databases, upstream APIs and caches",
+    ["dependency"],
+))
+LLM_CALLS = _register(Counter("coffee_llm_calls", "OpenAI matching calls", ["outcome"]))
+TTS_UPSTREAM_CALLS = _register(Counter("coffee_tts_upstream_calls", "ElevenLabs requests", ["status"]))
+BREAKER_TRANSITIONS = _register(Counter(
+    "coffee_breaker_transitions", "Circuit breaker state changes", ["breaker", "state"],
+))
+LLM_BATCH_SIZE = _register(Histogram(
+    "coffee_llm_batch_size", "Distinct answers per batched LLM matching call",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+))
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+class RequestTimings:
+    """Span totals of one request: {name: [seconds, calls]}."""
+
+    def __init__(self):
+        self.spans: Dict[str, list] = {}
+        self.pending: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        parts = []
+        for name, (seconds, calls) in self.spans.items():
+            part = f"{name};dur={seconds * 1000:.2f}"
+            if calls > 1:
+                part += f';desc="{calls} calls"'
+            parts.append(part)
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def detach_request():
+    """
+    Stop attributing spans to the request whose context this task inherited
+    (for long-lived tasks such as the DB writer).
+    """
+    _current.set(None)
+
+
+def record(name: str, seconds: float):
+    """Add a finished span to the current request and the dependency histogram."""
+    DEPENDENCY_DURATION.observe(seconds, dependency=name)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    """Time every statement ("db") and commit ("db_commit") run on ``engine``."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    # The start time lives on the statement's execution context, so a
+    # statement that fails (no after_cursor_execute) leaves nothing behind
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "query_start", None)
+        if started is not None:
+            record("db", time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "commit")
+    def on_commit(conn):
+        timings = _current.get()
+        if timings is not None:
+            timings.pending["db_commit"] = time.perf_counter()
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _after_commit(session):
+    timings = _current.get()
+    if timings is not None:
+        started = timings.pending.pop("db_commit", None)
+        if started is not None:
+            record("db_commit", time.perf_counter() - started)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware: collects the request's spans, adds a Server-Timing
+    header to the response and observes the route latency histogram.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        started = False
+
+        async def send_with_timing(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                elapsed = time.perf_counter() - start
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing(elapsed).encode("latin-1")))
+                message = dict(message, headers=headers)
+                HTTP_REQUEST_DURATION.observe(elapsed, method=scope["method"],
+                                              route=_route_label(scope), status=message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception:
+            if not started:
+                HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method=scope["method"],
+                                              route=_route_label(scope), status=500)
+            raise
+        finally:
+            _current.reset(token)
+
+
+def _route_label(scope) -> str:
+    """Route template (e.g. /api/reports/{session_id}) so labels stay bounded."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
@@ -0,0 +1,122 @@
+"""
+Lightweight schema migrations
+
+``Base.metadata.create_all`` only creates missing tables, so columns and
+indexes added to existing tables after a database was first created (e.g.
+an older coffee_feedback.db) are applied here. Each migration runs once and
+is recorded in the ``schema_migrations`` table; every step is idempotent so
+fresh databases, where create_all already built everything, just get marked
+as up to date.
+
+Usage:
+    python migrations.py [--status]
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+
+from database import Base
+
+logger = logging.getLogger(__name__)
+
+
+def _add_missing_columns(conn):
+    """Add nullable columns (and their indexes) that are in the models but not the table."""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        added = [c for c in table.columns if c.name not in existing and c.nullable]
+        for column in added:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        for index in table.indexes:
+            if any(c in added for c in index.columns):
+                index.create(conn, checkfirst=True)
+
+
+def _create_model_indexes(*names: str) -> Callable:
+    """Migration step creating the named indexes declared on the models."""
+    def create(conn):
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(conn, checkfirst=True)
+        if conn.dialect.name == "sqlite":
+            # Give the query planner statistics for the new indexes
+            conn.execute(text("ANALYZE"))
+    return create
+
+
+# (version, name, step) in the order they are applied
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "sync_columns", _add_missing_columns),
+    (2, "answer_and_session_indexes", _create_model_indexes(
+        "ix_answers_session_id_timestamp",
+        "ix_sessions_start_time",
+        "ix_sessions_status_start_time",
+    )),
+    (3, "session_filter_indexes", _create_model_indexes(
+        "ix_sessions_coffee_sample_start_time",
+        "ix_sessions_tester_name_start_time",
+    )),
+]
+
+
+def _ensure_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_versions(conn) -> List[int]:
+    _ensure_table(conn)
+    return [row[0] for row in conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))]
+
+
+def run_migrations(conn) -> List[str]:
+    """Apply pending migrations on a sync connection; returns the names applied."""
+    done = set(applied_versions(conn))
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version in done:
+            continue
+        step(conn)
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+            {"v": version, "n": name, "t": datetime.now()},
+        )
+        applied.append(name)
+        logger.info("Applied migration %d: %s", version, name)
+    return applied
+
+
+async def _main(args):
+    from dotenv import load_dotenv
+    from database import init_engine, dispose_engine, init_db
+    import models  # noqa: F401  (register tables on Base.metadata)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    load_dotenv()
+    engine, _ = init_engine()
+    try:
+        if not args.status:
+            await init_db()
+        async with engine.begin() as conn:
+            done = set(await conn.run_sync(applied_versions))
+    finally:
+        await dispose_engine()
+    for version, name, _ in MIGRATIONS:
+        print(f"{version:>4}  {name:<32} {'applied' if version in done else 'pending'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="only list migrations and whether they are applied")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -2,7 +2,7 @@
 SQLAlchemy database models
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, Text, ForeignKey, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -10,6 +10,13 @@ from database import Base
 class Session(Base):
     """Feedback session model"""
     __tablename__ = "sessions"
+    __table_args__ = (
+        # list_sessions pages by start_time, optionally filtered by status, sample or tester
+        Index("ix_sessions_start_time", "start_time"),
+        Index("ix_sessions_status_start_time", "status", "start_time"),
+        Index("ix_sessions_coffee_sample_start_time", "coffee_sample", "start_time"),
+        Index("ix_sessions_tester_name_start_time", "tester_name", "start_time"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     start_time = Column(DateTime, nullable=False)
@@ -18,6 +25,7 @@ class Session(Base):
     tester_name = Column(String(100), nullable=True)
     coffee_sample = Column(String(100), nullable=True)
     notes = Column(Text, nullable=True)
+    client_uuid = Column(String(36), nullable=True, unique=True, index=True)  # set by offline kiosks
     
     # Relationships
     answers = relationship("Answer", back_populates="session", cascade="all, delete-orphan")
@@ -26,6 +34,8 @@ class Session(Base):
 class Answer(Base):
     """Answer model for storing user responses"""
     __tablename__ = "answers"
+    # Reports and exports read a session's answers in timestamp order
+    __table_args__ = (Index("ix_answers_session_id_timestamp", "session_id", "timestamp"),)
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False)
@@ -35,6 +45,7 @@ class Answer(Base):
     answer_type = Column(String(20), default="voice")  # voice, click, text
     confidence_score = Column(Float, nullable=True)
     timestamp = Column(DateTime, nullable=False)
+    idempotency_key = Column(String(64), nullable=True, unique=True, index=True)  # client-generated, dedupes retries
     
     # Relationships
     session = relationship("Session", back_populates="answers")
@@ -51,3 +62,30 @@ class Question(Base):
     category = Column(String(100), nullable=True)
     order_index = Column(Integer, default=0)
     parent_answer = Column(String(100), nullable=True)  # For conditional questions
+
+
+class MatchCacheEntry(Base):
+    """Memoized LLM answer match for a normalized utterance and option set"""
+    __tablename__ = "match_cache"
+    __table_args__ = (UniqueConstraint("utterance", "options_hash"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    utterance = Column(String(255), nullable=False)  # normalized answer text
+    options_hash = Column(String(64), nullable=False, index=True)  # sha256 of sorted options
+    matched_answer = Column(String(100), nullable=True)  # NULL caches a NONE result
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, nullable=False)
+    last_hit_at = Column(DateTime, nullable=True)
+
+
+class AnswerRollup(Base):
+    """Answer counts per coffee sample, question, matched option and day"""
+    __tablename__ = "answer_rollups"
+    __table_args__ = (UniqueConstraint("coffee_sample", "question_id", "matched_answer", "day"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    coffee_sample = Column(String(100), nullable=False)  # "" when the session has no sample
+    question_id = Column(String(100), nullable=False)
+    matched_answer = Column(String(100), nullable=False)  # "" when the answer matched no option
+    day = Column(Date, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
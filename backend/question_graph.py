@@ -0,0 +1,191 @@
+"""
+Compiled question graph
+
+Combines the static QUESTION_FLOW branching with the admin-ordered question
+sequence into one immutable, versioned structure holding prebuilt
+QuestionResponse objects, so next-question resolution is a dictionary lookup
+instead of several queries per answer. Admin edits invalidate it; the next
+reader rebuilds it with a single query.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import select
+
+from database import get_read_session_maker
+from models import Question
+from schemas import QuestionResponse
+
+# Question flow logic based on the CSV data
+QUESTION_FLOW = {
+    # No welcome question - start directly with flavor
+    "flavor_main": {
+        "next_map": {
+            "Fruity": "flavor_fruity",
+            "Floral": "flavor_floral",
+            "Nutty": "flavor_nutty",
+            "Cereal": "flavor_cereal",
+            "Cocoa": "flavor_cocoa",
+            "Sweet": "flavor_sweet",
+            "Earthy": "flavor_earthy",
+            "Roasted": "flavor_roasted",
+            "Spices": "flavor_spices",
+            "Vegetative": "flavor_vegetative",
+            "Stale/Papery": "flavor_stale_papery",
+            "Chemical": "flavor_chemical",
+            "Alcohol/Fermented": "flavor_alcohol_fermented",
+            "None": "intensity",
+            "Not Applicable": "intensity"
+        }
+    },
+    # After each specific flavor, end the questionnaire
+    "flavor_fruity": {"next": None},
+    "flavor_floral": {"next": None},
+    "flavor_nutty": {"next": None},
+    "flavor_cereal": {"next": None},
+    "flavor_cocoa": {"next": None},
+    "flavor_sweet": {"next": None},
+    "flavor_earthy": {"next": None},
+    "flavor_roasted": {"next": None},
+    "flavor_spices": {"next": None},
+    "flavor_vegetative": {"next": None},
+    "flavor_stale_papery": {"next": None},
+    "flavor_chemical": {"next": None},
+    "flavor_alcohol_fermented": {"next": None}
+}
+
+
+class QuestionGraph:
+    """Immutable snapshot of all questions and the order they are asked in."""
+
+    def __init__(self, version: int, questions: List[Question]):
+        self.version = version
+        self.questions: Dict[str, QuestionResponse] = {
+            q.id: question_to_response(q) for q in questions
+        }
+        # Questions outside QUESTION_FLOW, in admin order
+        self.admin_sequence: List[str] = [
+            q.id for q in sorted(questions, key=lambda q: q.order_index or 0)
+            if q.id not in QUESTION_FLOW and q.id != "flavor_main"
+        ]
+        self.admin_next: Dict[str, Optional[str]] = {
+            qid: (self.admin_sequence[i + 1] if i + 1 < len(self.admin_sequence) else None)
+            for i, qid in enumerate(self.admin_sequence)
+        }
+
+        self._bundle: Optional[Dict] = None
+
+    def bundle(self) -> Dict:
+        """
+        Whole-questionnaire payload for client-side navigation, computed once.
+
+        ``graph_version`` is a hash of the content, so it is stable across
+        restarts and changes whenever any question or branch does.
+        """
+        if self._bundle is None:
+            content = {
+                "first_question_id": self.first().id if self.first() else None,
+                "questions": {qid: q.model_dump() for qid, q in self.questions.items()},
+                "flow": QUESTION_FLOW,
+                "admin_sequence": self.admin_sequence,
+            }
+            digest = hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8"))
+            self._bundle = dict(content, graph_version=digest.hexdigest()[:16])
+        return self._bundle
+
+    @property
+    def version_tag(self) -> str:
+        return self.bundle()["graph_version"]
+
+    def allowed_next(self, current_question_id: Optional[str], answer: Optional[str] = None) -> Set[Optional[str]]:
+        """
+        Question ids a client may legitimately show after ``current_question_id``.
+
+        When a branching answer cannot be resolved without the matcher, every
+        branch target is allowed.
+        """
+        if current_question_id is None:
+            first = self.first()
+            return {first.id if first else None}
+        if current_question_id not in QUESTION_FLOW:
+            return {self.admin_next.get(current_question_id)}
+        flow = QUESTION_FLOW[current_question_id]
+        if "next_map" in flow:
+            next_id = flow["next_map"].get(answer) if answer else None
+            targets = {next_id} if next_id else set(flow["next_map"].values())
+        else:
+            targets = {flow.get("next")}
+        # Admin questions follow the CSV flow when it ends
+        if None in targets:
+            targets.discard(None)
+            targets.add(self.first_admin_id())
+        return targets
+
+    def get(self, question_id: Optional[str]) -> Optional[QuestionResponse]:
+        return self.questions.get(question_id) if question_id else None
+
+    def first_admin_id(self) -> Optional[str]:
+        return self.admin_sequence[0] if self.admin_sequence else None
+
+    def first(self) -> Optional[QuestionResponse]:
+        """Admin questions replace the CSV flow when any exist."""
+        return self.get(self.first_admin_id() or "flavor_main")
+
+    def after_admin(self, question_id: str) -> Optional[QuestionResponse]:
+        return self.get(self.admin_next.get(question_id))
+
+
+def question_to_response(question: Question) -> QuestionResponse:
+    return QuestionResponse(
+        id=question.id,
+        text=question.text,
+        type=question.type,
+        options=[opt for group in (question.option_groups or []) for opt in group.get('options', [])],
+        optionGroups=question.option_groups,
+        category=question.category,
+        order_index=question.order_index or 0
+    )
+
+
+_graph: Optional[QuestionGraph] = None
+_version = 0
+_lock = asyncio.Lock()
+
+
+async def get_question_graph() -> QuestionGraph:
+    """Return the current graph, compiling it from the database if invalidated."""
+    graph = _graph
+    if graph is not None:
+        return graph
+    return await _rebuild()
+
+
+async def _rebuild() -> QuestionGraph:
+    global _graph
+    async with _lock:
+        if _graph is not None:
+            return _graph
+        version = _version
+        # A fresh session: a request's session may hold a snapshot older than
+        # the admin edit that invalidated the graph
+        async with get_read_session_maker()() as session:
+            result = await session.execute(select(Question))
+            graph = QuestionGraph(version, result.scalars().all())
+        # Only publish if no admin edit landed while we were reading
+        if version == _version:
+            _graph = graph
+        return graph
+
+
+def invalidate_question_graph():
+    """Drop the compiled graph; called after any question is created, changed or deleted."""
+    global _graph, _version
+    _version += 1
+    _graph = None
+
+
+def get_question_graph_version() -> int:
+    return _version
@@ -0,0 +1,102 @@
+"""
+PDF rendering of feedback reports
+
+Pure reportlab code with no database or app imports, so it can run in a
+worker process (see reports.py).
+"""
+
+from io import BytesIO
+from typing import Dict
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from xml.sax.saxutils import escape
+
+
+def generate_pdf_report(session_data: Dict) -> bytes:
+    """
+    Generate a PDF report for a feedback session
+
+    ``session_data`` holds the session fields plus ``answers``: a list of
+    dicts with question_id, question (prompt text, optional), answer,
+    matched_answer, type and timestamp.
+    """
+    buffer = BytesIO()
+    # invariant: same data renders to identical bytes (stable ETags)
+    doc = SimpleDocTemplate(buffer, pagesize=letter, invariant=1,
+                            title=f"Feedback session {session_data.get('session_id')}")
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Title
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#6F4E37'),
+        spaceAfter=30,
+    )
+
+    elements.append(Paragraph("Coffee Tasting Feedback Report", title_style))
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Session info
+    info_data = [
+        ["Tester Name:", session_data.get('tester_name') or 'N/A'],
+        ["Coffee Sample:", session_data.get('coffee_sample') or 'N/A'],
+        ["Date:", session_data.get('start_time') or 'N/A'],
+        ["Status:", session_data.get('status') or 'N/A'],
+        ["Session ID:", str(session_data.get('session_id', 'N/A'))],
+    ]
+
+    info_table = Table(info_data, colWidths=[2*inch, 4*inch])
+    info_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F5E6D3')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey)
+    ]))
+
+    elements.append(info_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Answers, one row per question in the order they were given
+    answers = session_data.get('answers') or []
+    elements.append(Paragraph(f"Responses ({len(answers)})", styles['Heading2']))
+    if answers:
+        cell = ParagraphStyle('Cell', parent=styles['BodyText'], fontSize=9, leading=11)
+        rows = [["Question", "Answer", "Matched", "Type"]]
+        for answer in answers:
+            rows.append([
+                Paragraph(escape(answer.get('question') or answer.get('question_id') or ''), cell),
+                Paragraph(escape(answer.get('answer') or ''), cell),
+                Paragraph(escape(answer.get('matched_answer') or '-'), cell),
+                answer.get('type') or '',
+            ])
+        answers_table = Table(rows, colWidths=[2.6*inch, 2*inch, 1.4*inch, 0.7*inch], repeatRows=1)
+        answers_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6F4E37')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#FAF3EB')]),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+        ]))
+        elements.append(answers_table)
+    else:
+        elements.append(Paragraph("No answers recorded.", styles['BodyText']))
+
+    # Build the PDF
+    doc.build(elements)
+
+    pdf_bytes = buffer.getvalue()
+    buffer.close()
+
+    return pdf_bytes
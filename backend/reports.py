@@ -0,0 +1,176 @@
+"""
+PDF feedback reports
+
+reportlab holds the GIL for the whole render, so reports are rendered in a
+bounded process pool rather than on the event loop. Rendered PDFs are kept
+in a size-bounded LRU keyed by (session_id, last answer timestamp, status):
+a session's report only changes when it gets a new answer or is completed,
+so repeated downloads (and ETag revalidations) skip rendering entirely.
+"""
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache_utils import ByteLRU
+from metrics import span
+from models import Session, Answer
+from question_graph import get_question_graph
+from report_pdf import generate_pdf_report
+
+
+class ReportRenderer:
+    """Process pool plus result cache for PDF reports; see module docstring."""
+
+    def __init__(self, max_workers: int = 2, cache_bytes: int = 64 * 1024 * 1024):
+        self.max_workers = max_workers
+        self.cache = ByteLRU(cache_bytes)
+        self.renders = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @classmethod
+    def from_env(cls) -> "ReportRenderer":
+        return cls(
+            max_workers=int(os.getenv("REPORT_PDF_WORKERS", str(min(2, os.cpu_count() or 1)))),
+            cache_bytes=int(os.getenv("REPORT_CACHE_BYTES", str(64 * 1024 * 1024))),
+        )
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: never fork a process that is running an event loop and driver threads
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    @staticmethod
+    def etag(cache_key: str) -> str:
+        return '"' + hashlib.sha256(cache_key.encode("utf-8")).hexdigest()[:32] + '"'
+
+    async def cache_keys(self, session_ids: List[int], db: AsyncSession) -> Dict[int, str]:
+        """Cache key of every existing session in ``session_ids``, in one grouped query."""
+        result = await db.execute(
+            select(Session.id, Session.status, func.max(Answer.timestamp))
+            .outerjoin(Answer, Answer.session_id == Session.id)
+            .where(Session.id.in_(session_ids))
+            .group_by(Session.id, Session.status)
+        )
+        keys = {}
+        for session_id, status, last_answer in result.all():
+            last = last_answer.isoformat() if last_answer else "-"
+            keys[session_id] = f"{session_id}:{last}:{status}"
+        return keys
+
+    async def render(self, session_ids: List[int], db: AsyncSession,
+                     keys: Optional[Dict[int, str]] = None) -> Dict[int, Tuple[bytes, str, bool]]:
+        """
+        Return {session_id: (pdf, etag, cached)} for the sessions that exist.
+        Misses are rendered in parallel, bounded by the pool size.
+        """
+        keys = keys if keys is not None else await self.cache_keys(session_ids, db)
+        results = {}
+        missing = []
+        for session_id, key in keys.items():
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[session_id] = (cached, self.etag(key), True)
+            else:
+                missing.append(session_id)
+        if missing:
+            data = await load_report_data(missing, db)
+            rendered = await asyncio.gather(*(self._render(keys[sid], data[sid]) for sid in missing))
+            for session_id, pdf in zip(missing, rendered):
+                results[session_id] = (pdf, self.etag(keys[session_id]), False)
+        return results
+
+    async def _render(self, key: str, data: Dict) -> bytes:
+        """Render in the pool; concurrent requests for the same key share one render."""
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            with span("pdf_render"):
+                pdf = await asyncio.get_running_loop().run_in_executor(self._executor(), generate_pdf_report, data)
+            self.renders += 1
+            self.cache.put(key, pdf)
+            future.set_result(pdf)
+            return pdf
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged as never retrieved
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "renders": self.renders,
+            "inflight": len(self._inflight),
+            "cache": self.cache.stats(),
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+async def load_report_data(session_ids: List[int], db: AsyncSession) -> Dict[int, Dict]:
+    """Session fields and answers (with question prompts) for generate_pdf_report."""
+    graph = await get_question_graph()
+    result = await db.execute(select(Session).where(Session.id.in_(session_ids)))
+    data = {
+        session.id: {
+            "session_id": session.id,
+            "tester_name": session.tester_name,
+            "coffee_sample": session.coffee_sample,
+            "start_time": session.start_time.strftime("%Y-%m-%d %H:%M"),
+            "status": session.status,
+            "answers": [],
+        }
+        for session in result.scalars().all()
+    }
+    result = await db.execute(
+        select(Answer.session_id, Answer.question_id, Answer.answer_text, Answer.matched_answer,
+               Answer.answer_type, Answer.timestamp)
+        .where(Answer.session_id.in_(session_ids))
+        .order_by(Answer.session_id, Answer.timestamp)
+    )
+    for row in result.all():
+        question = graph.get(row.question_id)
+        data[row.session_id]["answers"].append({
+            "question_id": row.question_id,
+            "question": question.text if question else None,
+            "answer": row.answer_text,
+            "matched_answer": row.matched_answer,
+            "type": row.answer_type,
+            "timestamp": row.timestamp.isoformat(),
+        })
+    return data
+
+
+_renderer: Optional[ReportRenderer] = None
+
+
+def get_report_renderer() -> ReportRenderer:
+    """Return the process-wide report renderer."""
+    global _renderer
+    if _renderer is None:
+        _renderer = ReportRenderer.from_env()
+    return _renderer
+
+
+def close_report_renderer():
+    global _renderer
+    if _renderer is not None:
+        _renderer.shutdown()
+    _renderer = None
@@ -45,6 +45,7 @@ class SessionResponse(BaseModel):
     tester_name: Optional[str] = None
     coffee_sample: Optional[str] = None
     current_question: Optional[QuestionResponse] = None
+    answer_count: Optional[int] = None  # set by list_sessions when include_answer_counts is true
     
     class Config:
         from_attributes = True
@@ -57,6 +58,8 @@ class AnswerCreate(BaseModel):
     answer_text: str
     answer_type: str = "voice"  # voice, click, text
     confidence_score: Optional[float] = None
+    graph_version: Optional[str] = None  # set by kiosks navigating from the questionnaire bundle
+    idempotency_key: Optional[str] = Field(None, max_length=64)  # retries with the same key return the stored answer
 
 
 class AnswerResponse(BaseModel):
@@ -73,6 +76,75 @@ class AnswerResponse(BaseModel):
         from_attributes = True
 
 
+class AnswerBatchCreate(BaseModel):
+    """Schema for submitting several answers at once, in order"""
+    answers: List[AnswerCreate] = Field(..., min_length=1, max_length=500)
+
+
+class AnswerBatchItemResult(BaseModel):
+    """Outcome of one item in a batch submission"""
+    index: int
+    status: str  # ok, error
+    answer: Optional[AnswerResponse] = None
+    error: Optional[str] = None
+
+
+class AnswerBatchResponse(BaseModel):
+    """Schema for batch submission response"""
+    results: List[AnswerBatchItemResult]
+    next_questions: Dict[int, Optional[QuestionResponse]]  # by session_id
+
+
+class SyncAnswer(BaseModel):
+    """One answer captured offline by a kiosk"""
+    idempotency_key: str = Field(..., min_length=1, max_length=64)
+    question_id: str
+    answer_text: str
+    answer_type: str = "voice"
+    confidence_score: Optional[float] = None
+    timestamp: datetime
+
+
+class SyncSession(BaseModel):
+    """A whole session captured offline, identified by a client-generated UUID"""
+    client_uuid: str = Field(..., min_length=1, max_length=36)
+    tester_name: Optional[str] = None
+    coffee_sample: Optional[str] = None
+    notes: Optional[str] = None
+    start_time: datetime
+    end_time: Optional[datetime] = None
+    status: str = "active"  # active, completed, abandoned
+    answers: List[SyncAnswer] = []
+
+
+class SyncUpload(BaseModel):
+    """Schema for a kiosk sync upload (optionally gzip-encoded)"""
+    sessions: List[SyncSession] = Field(..., min_length=1, max_length=100)
+
+
+class SyncSessionResult(BaseModel):
+    """Outcome of merging one uploaded session"""
+    client_uuid: str
+    session_id: int
+    status: str
+    inserted: int
+    duplicates: int
+
+
+class SyncResponse(BaseModel):
+    """Schema for sync response"""
+    sessions: List[SyncSessionResult]
+
+
+class QuestionnaireBundle(BaseModel):
+    """Schema for the whole questionnaire graph used for client-side navigation"""
+    graph_version: str
+    first_question_id: Optional[str] = None
+    questions: Dict[str, QuestionResponse]
+    flow: Dict[str, Dict[str, Any]]  # QUESTION_FLOW: {question_id: {next_map} or {next}}
+    admin_sequence: List[str]
+
+
 class SessionComplete(BaseModel):
     """Schema for completing a session"""
     notes: Optional[str] = None
@@ -90,6 +162,11 @@ class FeedbackReport(BaseModel):
     total_answers: int
 
 
+class ReportBatchRequest(BaseModel):
+    """Schema for rendering several sessions' PDF reports at once"""
+    session_ids: List[int] = Field(..., min_length=1, max_length=200)
+
+
 class OptionGroup(BaseModel):
     title: str
     options: List[str]
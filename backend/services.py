@@ -2,68 +2,134 @@
 Business logic and helper services
 """
 
+import asyncio
 import csv
+import json
+import logging
 import os
-from typing import Optional, Dict, List
+import time
+from collections import Counter
+from typing import Optional, Dict, List, Tuple
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from models import Question, Session, Answer
+from models import Question
 from schemas import QuestionResponse
+from matching import match_locally, get_confidence_threshold
+from match_cache import MISS, get_match_cache
+from question_graph import QUESTION_FLOW, get_question_graph, invalidate_question_graph
+from metrics import LLM_CALLS, span
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from llm_batcher import LLMBatcher
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
+logger = logging.getLogger(__name__)
+
+
+def get_openai_timeout() -> float:
+    """Hard deadline for one matching call, in seconds."""
+    return float(os.getenv("OPENAI_TIMEOUT_MS", "3000")) / 1000
+
+
+# Initialize OpenAI client. Retries would not fit in the per-call deadline;
+# the circuit breaker handles a struggling upstream instead.
 api_key = os.getenv("OPENAI_API_KEY")
-print(f"DEBUG: OpenAI API Key loaded: {api_key[:20] if api_key else 'NOT FOUND'}...")
-openai_client = AsyncOpenAI(api_key=api_key)
-
-
-# Question flow logic based on the CSV data
-QUESTION_FLOW = {
-    # No welcome question - start directly with flavor
-    "flavor_main": {
-        "next_map": {
-            "Fruity": "flavor_fruity",
-            "Floral": "flavor_floral",
-            "Nutty": "flavor_nutty",
-            "Cereal": "flavor_cereal",
-            "Cocoa": "flavor_cocoa",
-            "Sweet": "flavor_sweet",
-            "Earthy": "flavor_earthy",
-            "Roasted": "flavor_roasted",
-            "Spices": "flavor_spices",
-            "Vegetative": "flavor_vegetative",
-            "Stale/Papery": "flavor_stale_papery",
-            "Chemical": "flavor_chemical",
-            "Alcohol/Fermented": "flavor_alcohol_fermented",
-            "None": "intensity",
-            "Not Applicable": "intensity"
-        }
-    },
-    # After each specific flavor, end the questionnaire
-    "flavor_fruity": {"next": None},
-    "flavor_floral": {"next": None},
-    "flavor_nutty": {"next": None},
-    "flavor_cereal": {"next": None},
-    "flavor_cocoa": {"next": None},
-    "flavor_sweet": {"next": None},
-    "flavor_earthy": {"next": None},
-    "flavor_roasted": {"next": None},
-    "flavor_spices": {"next": None},
-    "flavor_vegetative": {"next": None},
-    "flavor_stale_papery": {"next": None},
-    "flavor_chemical": {"next": None},
-    "flavor_alcohol_fermented": {"next": None}
-}
-
-
-async def match_answer_with_ai(user_answer: str, available_options: List[str]) -> Optional[str]:
+openai_client = AsyncOpenAI(
+    api_key=api_key,
+    timeout=get_openai_timeout(),
+    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "0")),
+)
+_openai_breaker: Optional[CircuitBreaker] = None
+
+
+def get_openai_breaker() -> CircuitBreaker:
+    global _openai_breaker
+    if _openai_breaker is None:
+        _openai_breaker = CircuitBreaker.from_env("openai", "OPENAI")
+    return _openai_breaker
+
+
+MATCHING_RULES = """IMPORTANT RULES:
+1. Be VERY LENIENT - match similar sounding words
+2. Handle misspellings: "frooti" → "Fruity", "serial" → "Cereal", "arthi" → "Earthy"
+3. Handle variations: "chocolate" → "Cocoa", "flowers" → "Floral", "nuts" → "Nutty"
+4. Match phonetically similar words: "roasty" → "Roasted", "spicy" → "Spices"
+5. EXTRACT keywords from longer answers: "it was roasted" → "Roasted", "I taste fruity flavor" → "Fruity"
+6. Find the matching word ANYWHERE in the user's sentence
+7. ALWAYS try to find the closest match - only return "NONE" if completely unrelated"""
+
+
+async def _chat_completion(messages: List[Dict], max_tokens: int, **kwargs):
+    """
+    One OpenAI call under the circuit breaker, abandoned after
+    OPENAI_TIMEOUT_MS. Raises CircuitOpenError without calling while the
+    breaker is open.
+    """
+    breaker = get_openai_breaker()
+    if not breaker.allow():
+        LLM_CALLS.inc(outcome="rejected")
+        raise CircuitOpenError("OpenAI circuit breaker is open")
+
+    started = time.perf_counter()
+    try:
+        with span("openai"):
+            response = await asyncio.wait_for(openai_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                temperature=0,  # Deterministic
+                max_tokens=max_tokens,
+                **kwargs
+            ), timeout=get_openai_timeout())
+    except asyncio.TimeoutError:
+        LLM_CALLS.inc(outcome="timeout")
+        breaker.record_failure()
+        raise
+    except Exception:
+        LLM_CALLS.inc(outcome="error")
+        breaker.record_failure()
+        raise
+    except BaseException:
+        # Cancelled (request or shutdown): no verdict on the upstream
+        breaker.release()
+        raise
+    breaker.record_success(time.perf_counter() - started)
+    LLM_CALLS.inc(outcome="ok")
+    return response
+
+
+def _validate_suggestion(matched_option: str, available_options: List[str]) -> Optional[str]:
+    """The option the model's answer names, or None for NONE or anything unknown."""
+    if matched_option == "NONE":
+        return None
+
+    # Case-insensitive check
+    for option in available_options:
+        if option.lower() == matched_option.lower():
+            return option
+
+    # If exact match not found, try fuzzy
+    for option in available_options:
+        if matched_option.lower() in option.lower() or option.lower() in matched_option.lower():
+            logger.debug("LLM suggestion fuzzy matched", extra={"suggested": matched_option, "option": option})
+            return option
+
+    logger.info("LLM suggestion not among the options", extra={"suggested": matched_option})
+    return None
+
+
+async def match_answer_with_ai(user_answer: str, available_options: List[str],
+                               raise_errors: bool = False) -> Optional[str]:
     """
     Use OpenAI to intelligently match user's answer to available options.
     Handles misspellings, variations, and natural language.
+    With ``raise_errors`` API failures propagate instead of returning None,
+    so callers can tell a NONE answer from an outage.
+
+    The call is abandoned after OPENAI_TIMEOUT_MS. While the OpenAI circuit
+    breaker is open no call is made (CircuitOpenError, or None).
     
     Examples:
     - "frooti" -> "Fruity"
@@ -71,9 +137,6 @@ async def match_answer_with_ai(user_answer: str, available_options: List[str]) -
     - "earthy taste" -> "Earthy"
     """
     try:
-        print(f"DEBUG AI: Trying to match '{user_answer}' against {len(available_options)} options")
-        print(f"DEBUG AI: Options: {available_options[:5]}..." if len(available_options) > 5 else f"DEBUG AI: Options: {available_options}")
-        
         # Create prompt for GPT
         prompt = f"""You are a coffee tasting assistant helping with voice recognition. Match the user's spoken answer to one of the available options.
 
@@ -82,57 +145,213 @@ User said: "{user_answer}"
 Available options:
 {chr(10).join(f'- {opt}' for opt in available_options)}
 
-IMPORTANT RULES:
-1. Be VERY LENIENT - match similar sounding words
-2. Handle misspellings: "frooti" → "Fruity", "serial" → "Cereal", "arthi" → "Earthy"
-3. Handle variations: "chocolate" → "Cocoa", "flowers" → "Floral", "nuts" → "Nutty"
-4. Match phonetically similar words: "roasty" → "Roasted", "spicy" → "Spices"
-5. EXTRACT keywords from longer answers: "it was roasted" → "Roasted", "I taste fruity flavor" → "Fruity"
-6. Find the matching word ANYWHERE in the user's sentence
-7. ALWAYS try to find the closest match - only return "NONE" if completely unrelated
+{MATCHING_RULES}
 
 Return ONLY the exact option name from the list above, nothing else."""
 
-        print(f"DEBUG AI: Calling OpenAI API...")
-        response = await openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a precise text matcher. Return only the matched option name or NONE."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0,  # Deterministic
-            max_tokens=50
-        )
-        
-        print(f"DEBUG AI: Got response from OpenAI")
+        response = await _chat_completion([
+            {"role": "system", "content": "You are a precise text matcher. Return only the matched option name or NONE."},
+            {"role": "user", "content": prompt}
+        ], max_tokens=50)
+
         matched_option = response.choices[0].message.content.strip()
-        print(f"DEBUG AI: AI suggested: '{matched_option}'")
-        
-        # Validate that the matched option is actually in the list
-        if matched_option == "NONE":
-            print(f"DEBUG AI: AI returned NONE - no match found")
-            return None
-        
-        # Case-insensitive check
-        for option in available_options:
-            if option.lower() == matched_option.lower():
-                print(f"AI matched '{user_answer}' -> '{option}'")
-                return option
-        
-        # If exact match not found, try fuzzy
-        for option in available_options:
-            if matched_option.lower() in option.lower() or option.lower() in matched_option.lower():
-                print(f"AI fuzzy matched '{user_answer}' -> '{option}' (via {matched_option})")
-                return option
-        
-        print(f"AI returned '{matched_option}' but not in options list")
+        logger.debug("LLM suggestion", extra={
+            "answer": user_answer, "options": len(available_options), "suggested": matched_option,
+        })
+        return _validate_suggestion(matched_option, available_options)
+
+    except CircuitOpenError:
+        if raise_errors:
+            raise
         return None
-        
     except Exception as e:
-        print(f"AI matching error: {e}")
+        logger.warning("LLM matching failed: %s", str(e) or type(e).__name__, extra={"error_type": type(e).__name__})
+        if raise_errors:
+            raise
         return None
 
 
+async def match_answers_with_ai(items: List[Tuple[str, Tuple[str, ...]]]) -> List[Optional[str]]:
+    """
+    Match several (answer, options) pairs with one OpenAI call.
+
+    Option sets are listed once and referenced by number, and the model
+    replies with a JSON object ``{"matches": [...]}`` holding one option
+    name (or NONE) per answer, in order. Errors propagate, including a reply
+    that does not fit that shape.
+    """
+    option_sets: Dict[Tuple[str, ...], int] = {}
+    for _, options in items:
+        option_sets.setdefault(options, len(option_sets) + 1)
+    sets_text = "\n\n".join(
+        f"Set {number}:\n" + "\n".join(f"- {opt}" for opt in options)
+        for options, number in option_sets.items()
+    )
+    answers_text = "\n".join(
+        f'{i}. Set {option_sets[options]}: "{answer}"' for i, (answer, options) in enumerate(items, 1)
+    )
+    prompt = f"""You are a coffee tasting assistant helping with voice recognition. Match each user's spoken answer below to one of the options of its option set.
+
+Option sets:
+{sets_text}
+
+Answers:
+{answers_text}
+
+{MATCHING_RULES}
+
+Return a JSON object {{"matches": [...]}} with one entry per answer, in order: the exact option name from that answer's set, or "NONE"."""
+
+    response = await _chat_completion([
+        {"role": "system", "content": "You are a precise text matcher. Return only JSON."},
+        {"role": "user", "content": prompt}
+    ], max_tokens=20 + 15 * len(items), response_format={"type": "json_object"})
+
+    matches = json.loads(response.choices[0].message.content).get("matches")
+    if not isinstance(matches, list) or len(matches) != len(items):
+        raise ValueError(f"expected {len(items)} matches, got {matches!r}")
+    logger.debug("LLM batch suggestions", extra={"answers": len(items), "option_sets": len(option_sets)})
+    return [
+        _validate_suggestion(str(suggested).strip(), list(options)) if suggested else None
+        for (_, options), suggested in zip(items, matches)
+    ]
+
+
+async def _match_batch(items: List[Tuple[str, Tuple[str, ...]]]) -> List[Optional[str]]:
+    """LLMBatcher handler: a lone answer keeps the shorter single-answer prompt."""
+    if len(items) == 1:
+        answer, options = items[0]
+        return [await match_answer_with_ai(answer, list(options), raise_errors=True)]
+    try:
+        return await match_answers_with_ai(items)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.warning("LLM batch matching failed: %s", str(e) or type(e).__name__,
+                       extra={"error_type": type(e).__name__, "answers": len(items)})
+        raise
+
+
+_match_batcher: Optional[LLMBatcher] = None
+
+
+def get_match_batcher() -> LLMBatcher:
+    global _match_batcher
+    if _match_batcher is None:
+        _match_batcher = LLMBatcher.from_env(_match_batch)
+    return _match_batcher
+
+
+async def close_match_batcher():
+    global _match_batcher
+    if _match_batcher is not None:
+        await _match_batcher.close()
+        _match_batcher = None
+
+
+# How many LLM matches each answer asked for: {llm_requests: number_of_answers}.
+# Batched requests share one completion, so completions are counted
+# separately (LLM_CALLS, per outcome).
+LLM_REQUESTS_PER_ANSWER: Counter = Counter()
+
+
+class AnswerMatch:
+    """
+    Matching state for one submitted answer.
+
+    Created once per request and shared by submit_answer and
+    get_next_question, so results are reused per option set and each answer
+    asks for at most one LLM match. The deterministic local matcher runs first;
+    OpenAI is only asked when its confidence is below
+    MATCH_CONFIDENCE_THRESHOLD. If that call fails, times out or is skipped
+    by the circuit breaker, the local match is used as is.
+    """
+
+    def __init__(self, answer_text: str):
+        self.answer_text = answer_text
+        self.matched: Optional[str] = None
+        self.confidence: Optional[float] = None
+        self.method: Optional[str] = None
+        self.llm_requests = 0
+        self._results: Dict[frozenset, Optional[str]] = {}
+
+    async def resolve(self, available_options: List[str]) -> Optional[str]:
+        """Return the option this answer matches, computing it at most once per option set."""
+        key = frozenset(available_options)
+        if key in self._results:
+            return self._results[key]
+
+        local = match_locally(self.answer_text, available_options)
+        if local and local.confidence >= get_confidence_threshold():
+            logger.debug("Local match", extra={
+                "answer": self.answer_text, "option": local.option,
+                "method": local.method, "confidence": local.confidence,
+            })
+            matched, confidence, method = local.option, local.confidence, local.method
+        elif self.llm_requests == 0 and os.getenv("OPENAI_API_KEY"):
+            matched, method = await self._match_with_llm(available_options)
+            confidence = None
+            if method in ("llm_error", "llm_unavailable") and local:
+                matched, confidence, method = local.option, local.confidence, local.method
+        elif local:
+            matched, confidence, method = local.option, local.confidence, local.method
+        else:
+            matched, confidence, method = None, None, None
+
+        self._results[key] = matched
+        if matched and self.matched is None:
+            self.matched, self.confidence, self.method = matched, confidence, method
+        return matched
+
+    async def _match_with_llm(self, available_options: List[str]):
+        """
+        Ask OpenAI (batched with other answers arriving at the same time),
+        memoizing results (including NONE) in the match cache.
+        """
+        match_cache = get_match_cache()
+        try:
+            cached = await match_cache.get(self.answer_text, available_options)
+        except Exception as e:
+            # An unavailable cache is a miss, not a failed answer
+            logger.warning("Match cache lookup failed: %s", e, extra={"error_type": type(e).__name__})
+            cached = MISS
+        if cached is not MISS:
+            return cached, "llm_cache"
+        try:
+            matched = await get_match_batcher().submit((self.answer_text, tuple(available_options)))
+        except CircuitOpenError:
+            return None, "llm_unavailable"
+        except Exception:
+            self.llm_requests += 1
+            return None, "llm_error"
+        self.llm_requests += 1
+        try:
+            await match_cache.put(self.answer_text, available_options, matched)
+        except Exception as e:
+            logger.warning("Match cache store failed: %s", e, extra={"error_type": type(e).__name__})
+        return matched, "llm"
+
+    def record(self):
+        """Count this answer's LLM requests once the request is done."""
+        LLM_REQUESTS_PER_ANSWER[self.llm_requests] += 1
+
+
+def get_matching_stats() -> Dict:
+    answers = sum(LLM_REQUESTS_PER_ANSWER.values())
+    llm_requests = sum(requests * count for requests, count in LLM_REQUESTS_PER_ANSWER.items())
+    # Completions actually sent upstream (breaker rejections never were)
+    llm_calls = int(sum(LLM_CALLS.value(outcome=outcome) for outcome in ("ok", "timeout", "error")))
+    return {
+        "answers": answers,
+        "llm_requests": llm_requests,
+        "llm_calls": llm_calls,
+        "llm_calls_per_answer": round(llm_calls / answers, 4) if answers else 0.0,
+        "histogram": {str(requests): count for requests, count in sorted(LLM_REQUESTS_PER_ANSWER.items())},
+        "breaker": get_openai_breaker().stats(),
+        "batching": get_match_batcher().stats(),
+    }
+
+
 async def load_questions_from_csv():
     """Load questions from CSV file and populate database"""
     from database import get_async_engine_and_session
@@ -146,28 +365,23 @@ async def load_questions_from_csv():
     try:
         with open(csv_path, 'r', encoding='utf-8-sig') as file:  # utf-8-sig strips BOM
             reader = csv.DictReader(file)
-            print(f"DEBUG: CSV columns: {reader.fieldnames}")
             row_count = 0
             for row in reader:
                 row_count += 1
                 flavor_type = row.get('Fruity Types', '').strip()
                 sensory_group = row.get('Sensory Group', '').strip()
-                
-                if row_count <= 3:
-                    print(f"DEBUG: Row {row_count}: flavor_type='{flavor_type}', sensory_group='{sensory_group}'")
-                
+
                 if sensory_group and flavor_type and flavor_type != sensory_group:
                     if sensory_group not in flavor_categories:
                         flavor_categories[sensory_group] = []
-                        print(f"DEBUG: Created category '{sensory_group}'")
                     if flavor_type not in flavor_categories[sensory_group]:
                         flavor_categories[sensory_group].append(flavor_type)
-            print(f"DEBUG: Processed {row_count} rows from CSV")
+            logger.debug("Parsed flavor CSV", extra={"rows": row_count, "columns": reader.fieldnames})
     except FileNotFoundError:
-        print(f"Warning: Flavor.csv not found at {csv_path}")
+        logger.warning("Flavor.csv not found at %s", csv_path)
         flavor_categories = {}
-    except Exception as e:
-        print(f"ERROR parsing CSV: {e}")
+    except Exception:
+        logger.exception("Could not parse %s", csv_path)
         flavor_categories = {}
     
     # Define all questions
@@ -186,10 +400,9 @@ async def load_questions_from_csv():
     
     # Add specific flavor questions from CSV
     order_idx = 2
-    print(f"DEBUG: Found {len(flavor_categories)} flavor categories from CSV")
+    logger.debug("Flavor categories from CSV", extra={"categories": len(flavor_categories)})
     for category, flavors in flavor_categories.items():
         question_id = f"flavor_{category.lower().replace('/', '_').replace(' ', '_')}"
-        print(f"DEBUG: Creating question {question_id} with {len(flavors)} options")
         questions_data.append({
             "id": question_id,
             "text": f"Which specific {category} notes do you detect?",
@@ -207,7 +420,6 @@ async def load_questions_from_csv():
         existing = result.scalar_one_or_none()
         
         if not existing:
-            print(f"DEBUG: Loading {len(questions_data)} questions into database...")
             for q_data in questions_data:
                 # Convert flat options to option_groups format
                 option_groups = []
@@ -225,255 +437,79 @@ async def load_questions_from_csv():
                 session.add(question)
             
             await session.commit()
-            print(f"✅ Loaded {len(questions_data)} questions into database")
+            invalidate_question_graph()
+            logger.info("Loaded %d questions into database", len(questions_data))
         else:
-            print(f"DEBUG: Database already has questions, skipping load")
+            logger.debug("Database already has questions, skipping load")
 
 
 async def get_next_question(
     current_question_id: Optional[str],
     db: AsyncSession,
-    current_answer: Optional[str] = None
+    current_answer: Optional[str] = None,
+    answer_match: Optional[AnswerMatch] = None
 ) -> Optional[QuestionResponse]:
     """
-    Get the next question based on the current question and answer
-    """
-    if current_question_id is None:
-        # Check if there are admin questions - if so, use them instead of CSV questions
-        admin_questions = await db.execute(
-            select(Question)
-            .where(Question.id.not_in(list(QUESTION_FLOW.keys())))
-            .where(Question.id != "flavor_main")
-            .order_by(Question.order_index)
-        )
-        admin_question = admin_questions.first()
-
-        if admin_question:
-            # Use admin questions instead of CSV questions
-            print(f"DEBUG: Found admin questions, using them instead of CSV flow")
-            question = admin_question[0]
-        else:
-            # No admin questions, use the default CSV flow
-            result = await db.execute(select(Question).where(Question.id == "flavor_main"))
-            question = result.scalar_one_or_none()
-    else:
-        # Check if current question is an admin question
-        is_admin_question = current_question_id not in QUESTION_FLOW
-
-        if is_admin_question:
-            # Handle admin question flow
-            print(f"DEBUG: {current_question_id} is an admin question, finding next in sequence")
-            admin_questions = await db.execute(
-                select(Question)
-                .where(Question.id.not_in(list(QUESTION_FLOW.keys())))
-                .where(Question.id != "flavor_main")
-                .order_by(Question.order_index)
-            )
-            admin_qs = admin_questions.scalars().all()
-
-            # Find current question index and get next one
-            current_idx = next((i for i, q in enumerate(admin_qs) if q.id == current_question_id), -1)
-            if current_idx >= 0 and current_idx + 1 < len(admin_qs):
-                next_id = admin_qs[current_idx + 1].id
-                print(f"DEBUG: Next admin question: {next_id}")
-                result = await db.execute(select(Question).where(Question.id == next_id))
-                question = result.scalar_one_or_none()
-            else:
-                print(f"DEBUG: No more admin questions after {current_question_id}")
-                return None  # End of questionnaire
-        else:
-            # Handle CSV question flow
-            flow = QUESTION_FLOW.get(current_question_id, {})
-
-            # Check if there's a conditional next based on answer
-            if "next_map" in flow and current_answer:
-                # Try exact match first
-                next_id = flow["next_map"].get(current_answer)
-
-                # If no exact match, try simple fuzzy matching (singular/plural, case-insensitive)
-                if not next_id:
-                    answer_lower = current_answer.lower().strip()
-                    for key, value in flow["next_map"].items():
-                        key_lower = key.lower().strip()
-                        # Check if answer matches key (with or without 's', 'ies', etc.)
-                        if (answer_lower == key_lower or
-                            answer_lower == key_lower.rstrip('s') or
-                            answer_lower + 's' == key_lower or
-                            answer_lower + 'es' == key_lower):
-                            next_id = value
-                            print(f"DEBUG: Fuzzy matched '{current_answer}' to '{key}' -> {next_id}")
-                            break
-
-                # If still no match, use AI to intelligently match
-                if not next_id and os.getenv("OPENAI_API_KEY"):
-                    print(f"DEBUG: No fuzzy match, trying AI matching...")
-                    available_options = list(flow["next_map"].keys())
-                    matched_option = await match_answer_with_ai(current_answer, available_options)
-
-                    if matched_option:
-                        next_id = flow["next_map"].get(matched_option)
-                        print(f"DEBUG: AI matched '{current_answer}' to '{matched_option}' -> {next_id}")
-                    else:
-                        print(f"DEBUG: AI could not match '{current_answer}' to any option")
-
-                print(f"DEBUG: current_question={current_question_id}, answer={current_answer}, next_id={next_id}")
-            else:
-                next_id = flow.get("next")
-                print(f"DEBUG: current_question={current_question_id}, no answer mapping, next_id={next_id}")
-
-            if next_id is None:
-                print(f"DEBUG: No next question found for {current_question_id}")
-                # Check if there are admin questions to show after CSV flow
-                admin_questions = await db.execute(
-                    select(Question)
-                    .where(Question.id.not_in(list(QUESTION_FLOW.keys())))
-                    .where(Question.id != "flavor_main")
-                    .order_by(Question.order_index)
-                )
-                admin_question = admin_questions.first()
-                if admin_question:
-                    next_id = admin_question[0].id
-                    print(f"DEBUG: Found admin question to show after CSV flow: {next_id}")
-                else:
-                    return None  # End of questionnaire
-
-            result = await db.execute(select(Question).where(Question.id == next_id))
-            question = result.scalar_one_or_none()
-
-            if not question:
-                print(f"DEBUG: Question {next_id} not found in database!")
-            else:
-                print(f"DEBUG: Found question: {question.id} - {question.text}")
-
-    if question:
-        # Extract options from all option groups
-        all_options = []
-        for group in (question.option_groups or []):
-            all_options.extend(group.get('options', []))
-
-        return QuestionResponse(
-            id=question.id,
-            text=question.text,
-            type=question.type,
-            options=all_options,  # Keep flattened options for backward compatibility
-            optionGroups=question.option_groups,  # Add structured groups
-            category=question.category,
-            order_index=question.order_index
-        )
-
-    return None
-
+    Get the next question based on the current question and answer.
 
-def generate_pdf_report(session_data: Dict) -> bytes:
+    Resolved against the compiled question graph, so no queries are made
+    once it is loaded. Pass the request's ``answer_match`` to reuse its
+    matching result instead of matching (and possibly calling the LLM) a
+    second time.
     """
-    Generate a PDF report for a feedback session
-    """
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.units import inch
-    from io import BytesIO
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#6F4E37'),
-        spaceAfter=30,
-    )
-    
-    elements.append(Paragraph("Coffee Tasting Feedback Report", title_style))
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # Session info
-    info_data = [
-        ["Tester Name:", session_data.get('tester_name', 'N/A')],
-        ["Coffee Sample:", session_data.get('coffee_sample', 'N/A')],
-        ["Date:", session_data.get('start_time', 'N/A')],
-        ["Session ID:", str(session_data.get('session_id', 'N/A'))],
-    ]
-    
-    info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F5E6D3')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey)
-    ]))
-    
-    elements.append(info_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Build the PDF
-    doc.build(elements)
-    
-    pdf_bytes = buffer.getvalue()
-    buffer.close()
-    
-    return pdf_bytes
+    graph = await get_question_graph()
 
-
-async def export_session_to_csv(session_id: int, db: AsyncSession) -> str:
-    """
-    Export a session's feedback to CSV file
-    """
-    import csv
-    import os
-    from datetime import datetime
-    
-    # Get session and answers
-    result = await db.execute(
-        select(Session).where(Session.id == session_id)
-    )
-    session = result.scalar_one_or_none()
-    
-    if not session:
-        return None
-    
-    result = await db.execute(
-        select(Answer).where(Answer.session_id == session_id).order_by(Answer.timestamp)
-    )
-    answers = result.scalars().all()
-    
-    # Create exports directory if it doesn't exist
-    export_dir = os.path.join(os.path.dirname(__file__), "..", "exports")
-    os.makedirs(export_dir, exist_ok=True)
-    
-    # Generate filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"feedback_session_{session_id}_{timestamp}.csv"
-    filepath = os.path.join(export_dir, filename)
-    
-    # Write to CSV
-    with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = [
-            'Session ID', 'Tester Name', 'Coffee Sample', 
-            'Question ID', 'Answer', 'Answer Type', 'Confidence',
-            'Timestamp'
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        for answer in answers:
-            writer.writerow({
-                'Session ID': session.id,
-                'Tester Name': session.tester_name or 'Anonymous',
-                'Coffee Sample': session.coffee_sample or 'Not specified',
-                'Question ID': answer.question_id,
-                'Answer': answer.answer_text,
-                'Answer Type': answer.answer_type,
-                'Confidence': answer.confidence_score if answer.confidence_score else 'N/A',
-                'Timestamp': answer.timestamp.isoformat()
-            })
-    
-    return filepath
+    if current_question_id is None:
+        return graph.first()
+
+    # Check if current question is an admin question
+    if current_question_id not in QUESTION_FLOW:
+        next_question = graph.after_admin(current_question_id)
+        return next_question
+
+    # Handle CSV question flow
+    flow = QUESTION_FLOW[current_question_id]
+
+    # Check if there's a conditional next based on answer
+    if "next_map" in flow and current_answer:
+        # Try exact match first
+        next_id = flow["next_map"].get(current_answer)
+
+        # If no exact match, try simple fuzzy matching (singular/plural, case-insensitive)
+        if not next_id:
+            answer_lower = current_answer.lower().strip()
+            for key, value in flow["next_map"].items():
+                key_lower = key.lower().strip()
+                # Check if answer matches key (with or without 's', 'ies', etc.)
+                if (answer_lower == key_lower or
+                    answer_lower == key_lower.rstrip('s') or
+                    answer_lower + 's' == key_lower or
+                    answer_lower + 'es' == key_lower):
+                    next_id = value
+                    break
+
+        # If still no match, use local matching, then AI if unsure
+        if not next_id:
+            available_options = list(flow["next_map"].keys())
+            answer_match = answer_match or AnswerMatch(current_answer)
+            matched_option = await answer_match.resolve(available_options)
+
+            if matched_option:
+                next_id = flow["next_map"].get(matched_option)
+
+        logger.debug("Routed answer", extra={
+            "question_id": current_question_id, "answer": current_answer, "next_id": next_id,
+        })
+    else:
+        next_id = flow.get("next")
+
+    if next_id is None:
+        # Show admin questions after the CSV flow, if any
+        next_id = graph.first_admin_id()
+        if next_id is None:
+            return None  # End of questionnaire
+
+    question = graph.get(next_id)
+    if not question:
+        logger.warning("Next question %s not found in the question graph", next_id)
+    return question
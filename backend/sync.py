@@ -0,0 +1,199 @@
+"""
+Offline kiosk sync
+
+Kiosks in tasting rooms with flaky networks record whole sessions locally,
+identified by a client-generated session UUID and one idempotency key per
+answer, and upload them (optionally gzip-compressed) when they can. The
+merge relies on the unique indexes on ``sessions.client_uuid`` and
+``answers.idempotency_key``, so replaying an upload any number of times
+never creates duplicate rows.
+"""
+
+import asyncio
+import os
+import zlib
+from typing import List, Optional
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from analytics import increment_rollups, rollup_key
+from db_writer import run_write
+from models import Session, Answer
+from question_graph import get_question_graph
+from schemas import SyncUpload, SyncSession, SyncSessionResult
+
+# Later states win when the same session is uploaded more than once
+STATUS_RANK = {"active": 0, "abandoned": 1, "completed": 2}
+
+
+def get_max_sync_bytes() -> int:
+    """Largest accepted (decompressed) sync body."""
+    return int(os.getenv("SYNC_MAX_BODY_BYTES", str(10 * 1024 * 1024)))
+
+
+async def read_sync_upload(request: Request) -> SyncUpload:
+    """
+    Parse a sync body, inflating it first if sent with Content-Encoding: gzip.
+    The body is read in chunks and rejected as soon as it (or its inflated
+    form) passes the size limit, so an oversized upload is never buffered whole.
+    """
+    limit = get_max_sync_bytes()
+    too_large = HTTPException(status_code=413, detail="Sync body too large")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > limit:
+        raise too_large
+    encoding = request.headers.get("content-encoding", "identity").lower()
+    if encoding == "gzip":
+        inflater = zlib.decompressobj(wbits=31)
+    elif encoding == "identity":
+        inflater = None
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    body = bytearray()
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise too_large
+        if inflater is not None:
+            try:
+                # Inflate at most one byte past the limit
+                chunk = inflater.decompress(chunk, limit + 1 - len(body))
+            except zlib.error:
+                raise HTTPException(status_code=400, detail="Invalid gzip body")
+            if inflater.unconsumed_tail:
+                raise too_large
+        body += chunk
+        if len(body) > limit:
+            raise too_large
+    try:
+        return SyncUpload.model_validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+
+async def _upsert_session(db: AsyncSession, upload: SyncSession) -> Session:
+    """Find the session for ``upload.client_uuid`` or create it, advancing its state."""
+    result = await db.execute(select(Session).where(Session.client_uuid == upload.client_uuid))
+    session = result.scalar_one_or_none()
+    if session is None:
+        try:
+            async with db.begin_nested():
+                session = Session(
+                    client_uuid=upload.client_uuid,
+                    start_time=upload.start_time,
+                    status="active",
+                    tester_name=upload.tester_name,
+                    coffee_sample=upload.coffee_sample,
+                )
+                db.add(session)
+        except IntegrityError:
+            # A concurrent replay created it first
+            result = await db.execute(select(Session).where(Session.client_uuid == upload.client_uuid))
+            session = result.scalar_one()
+
+    session.tester_name = session.tester_name or upload.tester_name
+    session.coffee_sample = session.coffee_sample or upload.coffee_sample
+    session.notes = upload.notes or session.notes
+    if STATUS_RANK.get(upload.status, 0) > STATUS_RANK.get(session.status, 0):
+        session.status = upload.status
+    if upload.end_time and (session.end_time is None or upload.end_time > session.end_time):
+        session.end_time = upload.end_time
+    return session
+
+
+async def merge_session(db: AsyncSession, upload: SyncSession) -> SyncSessionResult:
+    """
+    Merge one uploaded session. Answers whose idempotency key is already
+    stored (or repeated within the upload) are skipped.
+
+    ``db`` is only read from: answers are matched first (which may call the
+    LLM and write the match cache), then the session upsert, answers and
+    rollups are written in one short transaction through the writer queue.
+    """
+    from services import AnswerMatch
+
+    # First occurrence of each key wins within the upload
+    unique = {}
+    for answer in upload.answers:
+        unique.setdefault(answer.idempotency_key, answer)
+    answers = list(unique.values())
+    keys = list(unique)
+    result = await db.execute(select(Answer.idempotency_key).where(Answer.idempotency_key.in_(keys)))
+    stored = set(result.scalars().all())
+    new_answers = [a for a in answers if a.idempotency_key not in stored]
+
+    graph = await get_question_graph()
+    matches = [AnswerMatch(a.answer_text) for a in new_answers]
+
+    async def resolve(answer, answer_match) -> Optional[str]:
+        question = graph.get(answer.question_id)
+        if question and question.options:
+            return await answer_match.resolve(question.options)
+        return None
+
+    matched = await asyncio.gather(*(resolve(a, m) for a, m in zip(new_answers, matches)))
+    # End the read transaction before waiting on the writer
+    await db.rollback()
+
+    async def save(write_db: AsyncSession) -> SyncSessionResult:
+        session = await _upsert_session(write_db, upload)
+        await write_db.flush()
+        rows = [
+            {
+                "session_id": session.id,
+                "question_id": a.question_id,
+                "answer_text": a.answer_text,
+                "matched_answer": match,
+                "answer_type": a.answer_type,
+                "confidence_score": a.confidence_score,
+                "timestamp": a.timestamp,
+                "idempotency_key": a.idempotency_key,
+            }
+            for a, match in zip(new_answers, matched)
+        ]
+        inserted_rows = await _insert_answers(write_db, rows)
+        await increment_rollups(write_db, [
+            rollup_key(session.coffee_sample, row["question_id"], row["matched_answer"], row["timestamp"])
+            for row in inserted_rows
+        ])
+        return SyncSessionResult(
+            client_uuid=upload.client_uuid,
+            session_id=session.id,
+            status=session.status,
+            inserted=len(inserted_rows),
+            duplicates=len(upload.answers) - len(inserted_rows),
+        )
+
+    merged = await run_write(save)
+    for answer_match in matches:
+        answer_match.record()
+    return merged
+
+
+async def _insert_answers(db: AsyncSession, rows: List[dict]) -> List[dict]:
+    """
+    Bulk insert; if a concurrent replay won a key, insert row by row skipping
+    those. Returns the rows actually inserted.
+    """
+    if not rows:
+        return []
+    try:
+        async with db.begin_nested():
+            await db.execute(insert(Answer), rows)
+        return rows
+    except IntegrityError:
+        pass
+    inserted = []
+    for row in rows:
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(Answer), [row])
+            inserted.append(row)
+        except IntegrityError:
+            continue
+    return inserted
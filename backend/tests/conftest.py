@@ -0,0 +1,29 @@
+"""
+Shared pytest setup: the backend modules are imported flat (as uvicorn runs
+them from backend/), and every test gets its own SQLite database.
+
+Run from backend/:
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# services builds its OpenAI client at import time; nothing in the tests
+# reaches the API (an unreachable base URL fails fast if something tries)
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1:9/v1")
+os.environ.setdefault("TTS_PREWARM_ON_STARTUP", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+@pytest.fixture
+def database_url(tmp_path, monkeypatch) -> str:
+    url = f"sqlite+aiosqlite:///{tmp_path / 'test.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.setenv("TTS_CACHE_DIR", str(tmp_path / "tts_cache"))
+    return url
@@ -0,0 +1,84 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from models import Answer
+from question_graph import invalidate_question_graph
+
+
+@pytest.fixture
+def client(database_url):
+    invalidate_question_graph()
+    with TestClient(main.app) as client:
+        yield client
+    invalidate_question_graph()
+
+
+@pytest.fixture
+def stored_answers(tmp_path):
+    def count():
+        with sqlite3.connect(tmp_path / "test.db") as conn:
+            return conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+    return count
+
+
+def start_session(client):
+    session_id = client.post("/api/sessions/start", json={"coffee_sample": "A", "tester_name": "t"}).json()["id"]
+    question = client.get(f"/api/sessions/{session_id}/next").json()
+    answer_text = question["options"][0] if question.get("options") else "yes"
+    return session_id, {"session_id": session_id, "question_id": question["id"], "answer_text": answer_text}
+
+
+def test_replayed_keys_return_the_stored_answer(client, stored_answers):
+    session_id, item = start_session(client)
+    item["idempotency_key"] = "k1"
+
+    response = client.post("/api/feedback/answers/batch", json={"answers": [item, item, item]}).json()
+    assert [r["status"] for r in response["results"]] == ["ok"] * 3
+    answer_ids = {r["answer"]["id"] for r in response["results"]}
+    assert len(answer_ids) == 1
+    assert str(session_id) in response["next_questions"]
+
+    # A later batch retry and the single-answer endpoint see the same row
+    retry = client.post("/api/feedback/answers/batch", json={"answers": [item]}).json()
+    assert retry["results"][0]["answer"]["id"] in answer_ids
+    assert retry["next_questions"][str(session_id)] == response["next_questions"][str(session_id)]
+    assert client.post("/api/feedback/answer", json=item).json()["id"] in answer_ids
+    assert stored_answers() == 1
+
+
+def test_key_reused_for_another_question_is_rejected(client, stored_answers):
+    _, item = start_session(client)
+    item["idempotency_key"] = "k1"
+    client.post("/api/feedback/answers/batch", json={"answers": [item]})
+
+    response = client.post("/api/feedback/answers/batch", json={"answers": [dict(item, question_id="other")]}).json()
+    assert response["results"][0]["status"] == "error"
+    assert response["results"][0]["error"] == "Idempotency key was used for a different answer"
+    assert stored_answers() == 1
+
+
+def test_concurrent_insert_of_the_same_key(client, stored_answers, monkeypatch):
+    session_id, item = start_session(client)
+    run_write = main.run_write
+
+    async def racing_run_write(op):
+        # Another request stores "k1" after this one looked up its keys
+        async def with_competitor(db):
+            competitor = Answer(session_id=session_id, question_id=item["question_id"],
+                                answer_text=item["answer_text"], timestamp=datetime.now(), idempotency_key="k1")
+            db.add(competitor)
+            await db.flush()
+            return await op(db)
+        return await run_write(with_competitor)
+    monkeypatch.setattr(main, "run_write", racing_run_write)
+
+    response = client.post("/api/feedback/answers/batch", json={"answers": [
+        dict(item, idempotency_key="k1"), dict(item, idempotency_key="k2"),
+    ]}).json()
+    assert [r["status"] for r in response["results"]] == ["ok", "ok"]
+    assert len({r["answer"]["id"] for r in response["results"]}) == 2
+    assert stored_answers() == 2
@@ -0,0 +1,131 @@
+import asyncio
+from datetime import timedelta
+
+from sqlalchemy import select
+
+import services
+from database import dispose_engine, get_read_session_maker, init_db, init_engine
+from db_writer import close_db_writer
+from match_cache import MISS, MatchCache
+from models import MatchCacheEntry
+
+OPTIONS = ["Fruity", "Floral", "Nutty"]
+
+
+def run_with_db(scenario):
+    """Run ``scenario()`` against a freshly created database."""
+    async def main():
+        init_engine()
+        await init_db()
+        try:
+            return await scenario()
+        finally:
+            await close_db_writer()
+            await dispose_engine()
+    return asyncio.run(main())
+
+
+async def stored_entries():
+    async with get_read_session_maker()() as session:
+        return (await session.execute(select(MatchCacheEntry))).scalars().all()
+
+
+def test_put_then_memory_hit(database_url):
+    async def scenario():
+        cache = MatchCache()
+        assert await cache.get("Blueberries!", OPTIONS) is MISS
+        await cache.put("Blueberries!", OPTIONS, "Fruity")
+        # Normalized utterance, option order does not matter
+        assert await cache.get("blueberries", list(reversed(OPTIONS))) == "Fruity"
+        assert (cache.memory_hits, cache.db_hits, cache.misses) == (1, 0, 1)
+        assert [(e.utterance, e.matched_answer) for e in await stored_entries()] == [("blueberries", "Fruity")]
+    run_with_db(scenario)
+
+
+def test_db_hit_after_restart_and_cached_none(database_url):
+    async def scenario():
+        await MatchCache().put("blueberries", OPTIONS, "Fruity")
+        await MatchCache().put("campfire", OPTIONS, None)
+        cache = MatchCache()
+        assert await cache.get("blueberries", OPTIONS) == "Fruity"
+        # A cached NONE is returned as None, not as a miss
+        assert await cache.get("campfire", OPTIONS) is None
+        assert (cache.memory_hits, cache.db_hits, cache.misses) == (0, 2, 0)
+        assert await cache.get("blueberries", OPTIONS) == "Fruity"
+        assert cache.memory_hits == 1
+    run_with_db(scenario)
+
+
+def test_expired_none_is_a_miss(database_url):
+    async def scenario():
+        await MatchCache(negative_ttl=timedelta(0)).put("campfire", OPTIONS, None)
+        assert await MatchCache(negative_ttl=timedelta(0)).get("campfire", OPTIONS) is MISS
+    run_with_db(scenario)
+
+
+def test_flush_hits_writes_hit_counts(database_url):
+    async def scenario():
+        cache = MatchCache()
+        await cache.put("blueberries", OPTIONS, "Fruity")
+        for _ in range(3):
+            await cache.get("blueberries", OPTIONS)
+        assert [e.hit_count for e in await stored_entries()] == [0]
+        await cache.flush_hits()
+        entries = await stored_entries()
+        assert [e.hit_count for e in entries] == [3]
+        assert entries[0].last_hit_at is not None
+    run_with_db(scenario)
+
+
+def test_invalidate_options_drops_memory_and_rows(database_url):
+    async def scenario():
+        cache = MatchCache()
+        await cache.put("blueberries", OPTIONS, "Fruity")
+        await cache.put("blueberries", ["Sweet", "Sour"], None)
+        assert await cache.invalidate_options(OPTIONS) == 1
+        assert await cache.get("blueberries", OPTIONS) is MISS
+        assert await cache.get("blueberries", ["Sweet", "Sour"]) is None
+    run_with_db(scenario)
+
+
+class FakeBatcher:
+    def __init__(self, result):
+        self.result = result
+        self.items = []
+
+    async def submit(self, item):
+        self.items.append(item)
+        return self.result
+
+
+def test_answer_match_uses_cached_llm_result(database_url, monkeypatch):
+    async def scenario():
+        cache = MatchCache()
+        await cache.put("reminds me of blueberries", OPTIONS, "Fruity")
+        monkeypatch.setattr(services, "get_match_cache", lambda: cache)
+        batcher = FakeBatcher("Floral")
+        monkeypatch.setattr(services, "get_match_batcher", lambda: batcher)
+
+        answer = services.AnswerMatch("reminds me of blueberries")
+        assert await answer.resolve(OPTIONS) == "Fruity"
+        assert (answer.method, answer.llm_requests, batcher.items) == ("llm_cache", 0, [])
+    run_with_db(scenario)
+
+
+def test_answer_match_treats_failed_cache_lookup_as_miss(database_url, monkeypatch):
+    async def scenario():
+        cache = MatchCache()
+
+        async def broken_get(utterance, options):
+            raise RuntimeError("database is locked")
+        monkeypatch.setattr(cache, "get", broken_get)
+        monkeypatch.setattr(services, "get_match_cache", lambda: cache)
+        batcher = FakeBatcher("Fruity")
+        monkeypatch.setattr(services, "get_match_batcher", lambda: batcher)
+
+        answer = services.AnswerMatch("reminds me of blueberries")
+        assert await answer.resolve(OPTIONS) == "Fruity"
+        assert (answer.method, answer.llm_requests) == ("llm", 1)
+        # The LLM result is still stored for next time
+        assert [e.matched_answer for e in await stored_entries()] == ["Fruity"]
+    run_with_db(scenario)
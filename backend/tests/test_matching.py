@@ -0,0 +1,57 @@
+import pytest
+
+from matching import get_confidence_threshold, match_locally
+
+FLAVOR_OPTIONS = [
+    "Fruity", "Floral", "Nutty", "Cereal", "Cocoa", "Sweet", "Earthy",
+    "Roasted", "Spices", "Vegetative", "Stale/Papery", "Chemical",
+    "Alcohol/Fermented", "None", "Not Applicable",
+]
+
+
+@pytest.mark.parametrize("answer, option", [
+    ("fruity", "Fruity"),
+    ("Fruity.", "Fruity"),
+    ("papery", "Stale/Papery"),
+    ("not applicable", "Not Applicable"),
+])
+def test_exact_match(answer, option):
+    match = match_locally(answer, FLAVOR_OPTIONS)
+    assert (match.option, match.method, match.confidence) == (option, "exact", 1.0)
+
+
+@pytest.mark.parametrize("answer, option", [
+    ("chocolate", "Cocoa"),
+    ("hazelnut", "Nutty"),
+])
+def test_synonym_match_skips_the_llm(answer, option):
+    match = match_locally(answer, FLAVOR_OPTIONS)
+    assert (match.option, match.method) == (option, "synonym")
+    assert match.confidence >= get_confidence_threshold()
+
+
+@pytest.mark.parametrize("answer, option", [
+    ("serial", "Cereal"),
+    ("frooti", "Fruity"),
+])
+def test_phonetic_only_match_still_asks_the_llm(answer, option):
+    match = match_locally(answer, FLAVOR_OPTIONS)
+    assert (match.option, match.method) == (option, "phonetic")
+    assert match.confidence < get_confidence_threshold()
+
+
+@pytest.mark.parametrize("answer", ["note", "sweat"])
+def test_sound_alike_words_are_not_confident(answer):
+    match = match_locally(answer, FLAVOR_OPTIONS)
+    assert match is None or match.confidence < get_confidence_threshold()
+
+
+@pytest.mark.parametrize("answer", ["not fruity", "no fruity notes", "it isn't nutty"])
+def test_negated_answer_has_no_local_match(answer):
+    assert match_locally(answer, FLAVOR_OPTIONS) is None
+
+
+def test_negation_does_not_block_option_phrases():
+    # "None" and "Not Applicable" start with negators themselves
+    assert match_locally("none", FLAVOR_OPTIONS).option == "None"
+    assert match_locally("not applicable", FLAVOR_OPTIONS).option == "Not Applicable"
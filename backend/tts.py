@@ -0,0 +1,566 @@
+"""
+ElevenLabs text-to-speech client
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+import tempfile
+import time
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from cache_utils import ByteLRU, etag_matches
+from metrics import TTS_UPSTREAM_CALLS, record, span
+from tts_manifest import ORIGIN_ADHOC, TTSManifest
+
+DEFAULT_VOICE_ID = "gfRt6Z3Z8aTbpLfexQ7N"
+DEFAULT_MODEL_ID = "eleven_monolingual_v1"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+STREAM_CHUNK_SIZE = 64 * 1024
+MANIFEST_FLUSH_THRESHOLD = 256
+
+
+class TTSUpstreamError(Exception):
+    """Raised when ElevenLabs cannot produce audio for a request."""
+
+    def __init__(self, detail: str, status_code: Optional[int] = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class ElevenLabsClient:
+    """
+    Async ElevenLabs client sharing one keep-alive connection pool.
+
+    Upstream calls are capped by a semaphore and retried with exponential
+    backoff on 429/5xx responses and transport errors. Pass ``base_url`` or
+    ``transport`` to point the client at a fake local upstream in tests.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = "https://api.elevenlabs.io",
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 10,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            transport=transport,
+        )
+
+    @classmethod
+    def from_env(cls, **overrides) -> "ElevenLabsClient":
+        """Build a client from ELEVENLABS_* environment variables."""
+        settings = dict(
+            api_key=os.getenv("ELEVENLABS_API_KEY"),
+            base_url=os.getenv("ELEVENLABS_API_URL", "https://api.elevenlabs.io"),
+            timeout=float(os.getenv("ELEVENLABS_TIMEOUT", "30")),
+            max_connections=int(os.getenv("ELEVENLABS_MAX_CONNECTIONS", "10")),
+            max_concurrency=int(os.getenv("ELEVENLABS_MAX_CONCURRENCY", "4")),
+            max_retries=int(os.getenv("ELEVENLABS_MAX_RETRIES", "3")),
+        )
+        settings.update(overrides)
+        return cls(**settings)
+
+    def _build_request(self, text: str, voice_id: str) -> httpx.Request:
+        return self._http.build_request(
+            "POST",
+            f"/v1/text-to-speech/{voice_id}/stream",
+            headers={"xi-api-key": self.api_key, "Content-Type": "application/json"},
+            json={
+                "text": text,
+                "model_id": DEFAULT_MODEL_ID,
+                "voice_settings": {
+                    "stability": 0.5,
+                    "similarity_boost": 0.75
+                }
+            },
+        )
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay * (0.5 + random.random() / 2)
+
+    async def stream(self, text: str, voice_id: str = DEFAULT_VOICE_ID) -> AsyncIterator[bytes]:
+        """
+        Yield mp3 chunks for ``text`` spoken by ``voice_id`` as they arrive.
+
+        Retries only happen before the first audio byte; a failure after
+        that is raised to the consumer.
+        """
+        if not self.api_key:
+            raise TTSUpstreamError("ELEVENLABS_API_KEY not set in environment")
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                last_attempt = attempt == self.max_retries
+                try:
+                    # Time to response headers; the body is streamed on to the caller
+                    with span("elevenlabs"):
+                        response = await self._http.send(self._build_request(text, voice_id), stream=True)
+                except httpx.TransportError as e:
+                    TTS_UPSTREAM_CALLS.inc(status="transport_error")
+                    if last_attempt:
+                        raise TTSUpstreamError(f"TTS error: {e}") from e
+                    await asyncio.sleep(self._retry_delay(attempt))
+                    continue
+                TTS_UPSTREAM_CALLS.inc(status=response.status_code)
+
+                try:
+                    if response.status_code == 200:
+                        try:
+                            async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                                yield chunk
+                        except httpx.HTTPError as e:
+                            raise TTSUpstreamError(f"TTS error: {e}") from e
+                        return
+                    await response.aread()
+                finally:
+                    await response.aclose()
+
+                if response.status_code in RETRY_STATUS_CODES and not last_attempt:
+                    await asyncio.sleep(self._retry_delay(attempt, response))
+                    continue
+                raise TTSUpstreamError(f"TTS failed: {response.text}", response.status_code)
+
+    async def synthesize(self, text: str, voice_id: str = DEFAULT_VOICE_ID) -> bytes:
+        """Return the complete mp3 for ``text`` spoken by ``voice_id``."""
+        return b"".join([chunk async for chunk in self.stream(text, voice_id)])
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+@dataclass
+class CachedAudio:
+    """A cache entry: audio bytes held in memory and/or a file on disk."""
+    size: int
+    mtime: float
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class InflightFill:
+    """
+    Upstream audio being fetched for one cache key.
+
+    Chunks are appended as they arrive so every waiting request can forward
+    them to its client immediately instead of waiting for the whole file.
+    """
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def append(self, chunk: bytes):
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        async with self._changed:
+            self.error = error
+            self.done = True
+            self._changed.notify_all()
+
+    async def wait_started(self):
+        """Wait for the first chunk; raise if the fetch failed before any audio."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.chunks or self.done)
+        if self.error is not None and not self.chunks:
+            raise self.error
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.chunks) or self.done)
+                pending = self.chunks[index:]
+                finished = self.done
+            index += len(pending)
+            for chunk in pending:
+                yield chunk
+            if finished:
+                if self.error is not None:
+                    raise self.error
+                return
+
+    async def result(self) -> bytes:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.done)
+        if self.error is not None:
+            raise self.error
+        return b"".join(self.chunks)
+
+
+class TTSCache:
+    """
+    Two-tier mp3 cache keyed by sha256 of ``text|voice_id``.
+
+    A byte-bounded in-memory LRU sits in front of the on-disk directory,
+    which is indexed by a manifest and kept under ``max_disk_bytes`` with
+    LRU or LFU eviction; disk I/O runs in a worker thread. Concurrent misses
+    for the same key share a single upstream stream, which is tee'd into a
+    temp file and renamed into place so a partially written mp3 is never
+    served.
+    """
+
+    def __init__(self, cache_dir: str, memory_bytes: int = 32 * 1024 * 1024,
+                 max_disk_bytes: Optional[int] = None, eviction_policy: str = "lru"):
+        self.cache_dir = cache_dir
+        self.memory = ByteLRU(memory_bytes)
+        self.max_disk_bytes = max_disk_bytes
+        self.eviction_policy = eviction_policy
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self.gc_removed = 0
+        self._inflight: Dict[str, InflightFill] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest = TTSManifest(os.path.join(cache_dir, "manifest.sqlite3"))
+        self.manifest.open()
+        self.manifest.reconcile(cache_dir)
+
+    @staticmethod
+    def cache_key(text: str, voice_id: str) -> str:
+        return hashlib.sha256((text + "|" + voice_id).encode("utf-8")).hexdigest()
+
+    def path_for(self, cache_key: str) -> str:
+        return os.path.join(self.cache_dir, f"{cache_key}.mp3")
+
+    async def lookup(self, cache_key: str) -> Optional[CachedAudio]:
+        """Return the memory entry, else the disk entry from the manifest, else None."""
+        entry = self.memory.get(cache_key)
+        if entry is None:
+            indexed = self.manifest.get(cache_key)
+            if indexed is None:
+                return None
+            self.disk_hits += 1
+            entry = CachedAudio(size=indexed.size, mtime=indexed.created_at, path=self.path_for(cache_key))
+        self.manifest.touch(cache_key)
+        if self.manifest.dirty_count() >= MANIFEST_FLUSH_THRESHOLD:
+            await self.flush()
+        return entry
+
+    async def contains(self, cache_key: str) -> bool:
+        """Check presence without touching LRU order or hit counters."""
+        return cache_key in self.memory or self.manifest.get(cache_key) is not None
+
+    async def flush(self):
+        """Persist buffered manifest changes."""
+        await asyncio.to_thread(self.manifest.write_entries, self.manifest.take_dirty())
+
+    def _delete_files(self, cache_keys: List[str]):
+        for key in cache_keys:
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+        self.manifest.delete_rows(cache_keys)
+
+    async def evict(self, cache_keys: List[str]) -> int:
+        """Drop entries from both tiers and the manifest."""
+        if not cache_keys:
+            return 0
+        self.manifest.remove(cache_keys)
+        for key in cache_keys:
+            self.memory.discard(key)
+        await asyncio.to_thread(self._delete_files, cache_keys)
+        return len(cache_keys)
+
+    async def enforce_budget(self, protect: Iterable[str] = ()) -> int:
+        """Evict entries until the directory is within ``max_disk_bytes``."""
+        if self.max_disk_bytes is None or self.manifest.total_bytes <= self.max_disk_bytes:
+            return 0
+        victims = self.manifest.eviction_candidates(
+            self.manifest.total_bytes - self.max_disk_bytes,
+            self.eviction_policy,
+            protect=set(protect) | set(self._inflight),
+        )
+        evicted = await self.evict(victims)
+        self.disk_evictions += evicted
+        return evicted
+
+    async def gc(self, live_texts: Set[str]) -> int:
+        """Remove question-derived entries whose text no question uses any more."""
+        removed = await self.evict(self.manifest.orphans(live_texts))
+        self.gc_removed += removed
+        return removed
+
+    def close(self):
+        self.manifest.close()
+
+    async def iter_entry(self, cache_key: str, entry: CachedAudio, start: int = 0,
+                         end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Yield bytes ``start..end`` (inclusive) of a cache entry.
+
+        Disk entries are read in chunks off the event loop; a complete read
+        of a disk entry promotes it into the memory tier.
+        """
+        end = entry.size - 1 if end is None else end
+        if entry.data is not None:
+            yield entry.data[start:end + 1]
+            return
+
+        promote = start == 0 and end == entry.size - 1 and entry.size <= self.memory.max_bytes
+        collected = [] if promote else None
+        started = time.perf_counter()
+        f = await asyncio.to_thread(open, entry.path, "rb")
+        reading = time.perf_counter() - started
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                started = time.perf_counter()
+                chunk = await asyncio.to_thread(f.read, min(STREAM_CHUNK_SIZE, remaining))
+                reading += time.perf_counter() - started
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                if collected is not None:
+                    collected.append(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+            # Disk read time only, not the time spent waiting on the client
+            record("tts_disk_read", reading)
+        if collected is not None and remaining == 0:
+            data = b"".join(collected)
+            self.memory.put(cache_key, CachedAudio(size=len(data), mtime=entry.mtime, data=data, path=entry.path))
+
+    async def _run_fill(self, fill: InflightFill, cache_key: str, text: str, voice_id: str,
+                        client: ElevenLabsClient, origin: str):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f".{cache_key}.", suffix=".tmp")
+        f = os.fdopen(fd, "wb")
+        try:
+            async for chunk in client.stream(text, voice_id):
+                await asyncio.to_thread(f.write, chunk)
+                await fill.append(chunk)
+            await asyncio.to_thread(f.close)
+            path = self.path_for(cache_key)
+            await asyncio.to_thread(os.replace, tmp_path, path)
+            data = b"".join(fill.chunks)
+            indexed = self.manifest.add(cache_key, text, voice_id, len(data), origin)
+            self.memory.put(cache_key, CachedAudio(size=len(data), mtime=indexed.created_at, data=data, path=path))
+            await fill.finish()
+            await self.enforce_budget(protect=[cache_key])
+            await self.flush()
+        except BaseException as e:
+            f.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if not fill.done:
+                error = e if isinstance(e, Exception) else TTSUpstreamError("TTS synthesis was cancelled")
+                # Shielded so coalesced waiters are released even if cancelled again
+                await asyncio.shield(fill.finish(error))
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self._inflight.pop(cache_key, None)
+
+    def start_fill(self, cache_key: str, text: str, voice_id: str,
+                   client: Optional[ElevenLabsClient] = None, origin: str = ORIGIN_ADHOC) -> InflightFill:
+        """
+        Return the in-flight upstream fetch for ``cache_key``, starting one if needed.
+
+        The fetch runs as its own task, so a disconnecting client never
+        aborts it for the other requests waiting on the same key.
+        """
+        fill = self._inflight.get(cache_key)
+        if fill is None:
+            fill = InflightFill()
+            self._inflight[cache_key] = fill
+            fill.task = asyncio.ensure_future(
+                self._run_fill(fill, cache_key, text, voice_id, client or get_tts_client(), origin)
+            )
+        return fill
+
+    async def fetch(self, cache_key: str, text: str, voice_id: str,
+                    client: Optional[ElevenLabsClient] = None, origin: str = ORIGIN_ADHOC) -> bytes:
+        """Synthesize ``text``, store it under ``cache_key`` and return the whole mp3."""
+        return await self.start_fill(cache_key, text, voice_id, client, origin).result()
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "disk": dict(
+                self.manifest.stats(),
+                max_bytes=self.max_disk_bytes,
+                eviction_policy=self.eviction_policy,
+                evictions=self.disk_evictions,
+                gc_removed=self.gc_removed,
+            ),
+            "disk_hits": self.disk_hits,
+            "inflight": len(self._inflight),
+        }
+
+
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single ``bytes=`` range into inclusive (start, end) offsets.
+
+    Returns None when the header is absent or not a single byte range (the
+    full body is served), and raises ValueError when it is unsatisfiable.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, _, last = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError("empty suffix range")
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def _not_modified(headers, etag: str, mtime: Optional[float]) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and mtime is not None:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def audio_response(request: Request, text: str, voice_id: str,
+                         cache: Optional["TTSCache"] = None) -> Response:
+    """
+    Build the HTTP response for a TTS request.
+
+    Hits are streamed from memory or disk with ETag/Last-Modified and
+    single ``Range`` support; misses forward upstream bytes to the client
+    while they are written to the cache.
+    """
+    cache = cache or get_tts_cache()
+    cache_key = cache.cache_key(text, voice_id)
+    etag = f'"{cache_key}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "public, no-cache"}
+
+    with span("tts_cache"):
+        entry = await cache.lookup(cache_key)
+    if _not_modified(request.headers, etag, entry.mtime if entry else None):
+        return Response(status_code=304, headers=headers)
+
+    if entry is None:
+        fill = cache.start_fill(cache_key, text, voice_id)
+        await fill.wait_started()
+        return StreamingResponse(fill.iter_chunks(), media_type="audio/mpeg", headers=headers)
+
+    headers["Last-Modified"] = formatdate(entry.mtime, usegmt=True)
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        try:
+            byte_range = parse_byte_range(request.headers.get("range"), entry.size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{entry.size}"
+            return Response(status_code=416, headers=headers)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(entry.size)
+        return StreamingResponse(cache.iter_entry(cache_key, entry), media_type="audio/mpeg", headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        cache.iter_entry(cache_key, entry, start, end),
+        status_code=206,
+        media_type="audio/mpeg",
+        headers=headers,
+    )
+
+
+_client: Optional[ElevenLabsClient] = None
+_cache: Optional[TTSCache] = None
+
+
+def get_tts_client() -> ElevenLabsClient:
+    """Return the process-wide ElevenLabs client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = ElevenLabsClient.from_env()
+    return _client
+
+
+def set_tts_client(client: Optional[ElevenLabsClient]):
+    """Replace the process-wide client (used to plug in a fake upstream)."""
+    global _client
+    _client = client
+
+
+def get_tts_cache() -> TTSCache:
+    """Return the process-wide TTS cache rooted at TTS_CACHE_DIR."""
+    global _cache
+    if _cache is None:
+        default_dir = os.path.join(os.path.dirname(__file__), "tts_cache")
+        max_disk_bytes = os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024))
+        _cache = TTSCache(
+            os.getenv("TTS_CACHE_DIR", default_dir),
+            memory_bytes=int(os.getenv("TTS_MEMORY_CACHE_BYTES", str(32 * 1024 * 1024))),
+            max_disk_bytes=int(max_disk_bytes) if max_disk_bytes else None,
+            eviction_policy=os.getenv("TTS_CACHE_EVICTION", "lru").lower(),
+        )
+    return _cache
+
+
+def close_tts_cache():
+    """Flush the manifest and release the shared cache."""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = None
+
+
+async def close_tts_client():
+    """Close the shared client's connection pool."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+    _client = None
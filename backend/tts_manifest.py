@@ -0,0 +1,215 @@
+"""
+Manifest index for the on-disk TTS cache
+
+Maps each cache key to the text and voice it was synthesized from, its
+origin, size, creation time and hit statistics, so the cache can be bounded
+and cleaned up without guessing from opaque file names.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Where an entry's text came from: a question prompt or option (garbage
+# collected once no question uses the text) or anything else the frontend
+# speaks, such as greetings and chat replies (left to size-based eviction)
+ORIGIN_QUESTION = "question"
+ORIGIN_ADHOC = "adhoc"
+
+
+@dataclass
+class ManifestEntry:
+    cache_key: str
+    text: Optional[str]
+    voice_id: Optional[str]
+    size: int
+    created_at: float
+    last_hit_at: float
+    hit_count: int = 0
+    origin: Optional[str] = None
+
+
+class TTSManifest:
+    """
+    SQLite-backed index of cached mp3 files, mirrored in memory.
+
+    Lookups only touch the in-memory mirror. Hit statistics are buffered and
+    written back in batches via ``take_dirty``/``write_entries``; all SQLite
+    calls are blocking and are meant to run in a worker thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, ManifestEntry] = {}
+        self.total_bytes = 0
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tts_cache_entries (
+                    cache_key TEXT PRIMARY KEY,
+                    text TEXT,
+                    voice_id TEXT,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_hit_at REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0,
+                    origin TEXT
+                )
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tts_cache_entries)")}
+            if "origin" not in columns:
+                self._conn.execute("ALTER TABLE tts_cache_entries ADD COLUMN origin TEXT")
+            rows = self._conn.execute(
+                "SELECT cache_key, text, voice_id, size, created_at, last_hit_at, hit_count, origin "
+                "FROM tts_cache_entries"
+            ).fetchall()
+        self.entries = {row[0]: ManifestEntry(*row) for row in rows}
+        self.total_bytes = sum(e.size for e in self.entries.values())
+
+    def close(self):
+        if self._conn is not None:
+            self.write_entries(self.take_dirty())
+            self._conn.close()
+            self._conn = None
+
+    def reconcile(self, cache_dir: str) -> Tuple[int, int]:
+        """
+        Sync the index with the directory contents.
+
+        Files missing from the index (e.g. written before the manifest
+        existed) are added with unknown text/voice; index rows whose file is
+        gone are dropped. Returns (added, removed).
+        """
+        on_disk = {}
+        for name in os.listdir(cache_dir):
+            if name.endswith(".mp3") and not name.startswith("."):
+                st = os.stat(os.path.join(cache_dir, name))
+                on_disk[name[:-len(".mp3")]] = st
+        added = [
+            ManifestEntry(key, None, None, st.st_size, st.st_mtime, st.st_mtime)
+            for key, st in on_disk.items() if key not in self.entries
+        ]
+        removed = [key for key in self.entries if key not in on_disk]
+        for entry in added:
+            self._add(entry)
+        self.remove(removed)
+        self.write_entries(added)
+        self.delete_rows(removed)
+        return len(added), len(removed)
+
+    def get(self, cache_key: str) -> Optional[ManifestEntry]:
+        return self.entries.get(cache_key)
+
+    def touch(self, cache_key: str):
+        entry = self.entries.get(cache_key)
+        if entry is not None:
+            entry.last_hit_at = time.time()
+            entry.hit_count += 1
+            self._dirty.add(cache_key)
+
+    def claim(self, cache_key: str, text: str, voice_id: str):
+        """
+        Mark an entry as synthesized from a question's ``text``, recording its
+        source if it was indexed with unknown text/voice.
+        """
+        entry = self.entries.get(cache_key)
+        if entry is not None and (entry.text is None or entry.origin != ORIGIN_QUESTION):
+            entry.text = text
+            entry.voice_id = voice_id
+            entry.origin = ORIGIN_QUESTION
+            self._dirty.add(cache_key)
+
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    def _add(self, entry: ManifestEntry):
+        old = self.entries.get(entry.cache_key)
+        if old is not None:
+            self.total_bytes -= old.size
+        self.entries[entry.cache_key] = entry
+        self.total_bytes += entry.size
+
+    def add(self, cache_key: str, text: str, voice_id: str, size: int,
+            origin: str = ORIGIN_ADHOC) -> ManifestEntry:
+        now = time.time()
+        entry = ManifestEntry(cache_key, text, voice_id, size, now, now, origin=origin)
+        self._add(entry)
+        self._dirty.add(cache_key)
+        return entry
+
+    def remove(self, cache_keys: Iterable[str]):
+        for key in cache_keys:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry.size
+            self._dirty.discard(key)
+
+    def take_dirty(self) -> List[ManifestEntry]:
+        """Snapshot buffered changes for ``write_entries`` and clear the buffer."""
+        rows = [self.entries[key] for key in self._dirty if key in self.entries]
+        self._dirty.clear()
+        return [ManifestEntry(**vars(e)) for e in rows]
+
+    def write_entries(self, entries: List[ManifestEntry]):
+        if not entries or self._conn is None:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tts_cache_entries "
+                "(cache_key, text, voice_id, size, created_at, last_hit_at, hit_count, origin) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(e.cache_key, e.text, e.voice_id, e.size, e.created_at, e.last_hit_at, e.hit_count, e.origin)
+                 for e in entries],
+            )
+
+    def delete_rows(self, cache_keys: List[str]):
+        if not cache_keys or self._conn is None:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM tts_cache_entries WHERE cache_key = ?",
+                [(key,) for key in cache_keys],
+            )
+
+    def eviction_candidates(self, bytes_to_free: int, policy: str = "lru",
+                            protect: Iterable[str] = ()) -> List[str]:
+        """Pick keys to drop, least recently (lru) or least frequently (lfu) hit first."""
+        protected = set(protect)
+        if policy == "lfu":
+            order = lambda e: (e.hit_count, e.last_hit_at)
+        else:
+            order = lambda e: e.last_hit_at
+        victims, freed = [], 0
+        for entry in sorted(self.entries.values(), key=order):
+            if freed >= bytes_to_free:
+                break
+            if entry.cache_key in protected:
+                continue
+            victims.append(entry.cache_key)
+            freed += entry.size
+        return victims
+
+    def orphans(self, live_texts: Set[str]) -> List[str]:
+        """Question-derived keys whose text is no longer spoken by any question."""
+        return [
+            e.cache_key for e in self.entries.values()
+            if e.origin == ORIGIN_QUESTION and e.text not in live_texts
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "unknown_source": sum(1 for e in self.entries.values() if e.text is None),
+            "question_derived": sum(1 for e in self.entries.values() if e.origin == ORIGIN_QUESTION),
+        }
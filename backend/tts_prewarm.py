@@ -0,0 +1,202 @@
+"""
+TTS cache pre-warming and garbage collection
+
+Synthesizes every question prompt ahead of time so the first tester to
+reach a question does not pay the ElevenLabs round trip, and removes cached
+audio for prompts that no longer exist. Only question-derived audio is
+garbage collected; other texts the frontend speaks (greetings, chat
+replies) are left to the cache's size-based eviction.
+
+Usage:
+    python tts_prewarm.py [--voices ID,ID] [--concurrency N] [--options] [--coverage-only] [--gc]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+
+from database import get_async_engine_and_session
+from models import Question
+from tts import TTSCache, TTSUpstreamError, get_tts_cache
+from tts_manifest import ORIGIN_QUESTION
+
+# Voice used by the frontend composable plus the backend default
+DEFAULT_PREWARM_VOICES = "EIsgvJT3rwoPvRFG6c4n,gfRt6Z3Z8aTbpLfexQ7N"
+
+
+def get_prewarm_voices() -> List[str]:
+    voices = os.getenv("TTS_PREWARM_VOICES", DEFAULT_PREWARM_VOICES)
+    return [v.strip() for v in voices.split(",") if v.strip()]
+
+
+def prewarm_options_enabled() -> bool:
+    return os.getenv("TTS_PREWARM_OPTIONS", "false").lower() in ("1", "true", "yes")
+
+
+def question_prompts(question: Question, include_options: bool = False) -> List[str]:
+    """Texts spoken for a question: its prompt and optionally each option label."""
+    prompts = [question.text]
+    if include_options:
+        for group in (question.option_groups or []):
+            prompts.extend(group.get('options', []))
+    return prompts
+
+
+async def collect_prompts(include_options: bool = False) -> List[str]:
+    """Return the distinct prompts of every question, in questionnaire order."""
+    _, async_session_maker = get_async_engine_and_session()
+    async with async_session_maker() as session:
+        result = await session.execute(select(Question).order_by(Question.order_index))
+        questions = result.scalars().all()
+    prompts = []
+    for question in questions:
+        prompts.extend(question_prompts(question, include_options))
+    return list(dict.fromkeys(p for p in prompts if p and p.strip()))
+
+
+async def _missing(cache: TTSCache, prompts: Iterable[str], voices: List[str]) -> List[tuple]:
+    missing = []
+    for voice_id in voices:
+        for text in prompts:
+            if not await cache.contains(cache.cache_key(text, voice_id)):
+                missing.append((text, voice_id))
+    return missing
+
+
+def _claim(cache: TTSCache, prompts: Iterable[str], voices: List[str]):
+    """Mark cached audio of these question texts as question-derived (e.g. first fetched ad hoc)."""
+    for voice_id in voices:
+        for text in prompts:
+            cache.manifest.claim(cache.cache_key(text, voice_id), text, voice_id)
+
+
+async def prewarm_texts(
+    prompts: List[str],
+    voices: Optional[List[str]] = None,
+    concurrency: Optional[int] = None,
+    cache: Optional[TTSCache] = None,
+) -> Dict:
+    """
+    Synthesize every uncached (prompt, voice) pair with bounded concurrency.
+
+    Returns a report with the coverage (percent of pairs cached) before and
+    after the run.
+    """
+    cache = cache or get_tts_cache()
+    voices = voices or get_prewarm_voices()
+    concurrency = concurrency or int(os.getenv("TTS_PREWARM_CONCURRENCY", "2"))
+    total = len(prompts) * len(voices)
+    missing = await _missing(cache, prompts, voices)
+    _claim(cache, prompts, voices)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = []
+
+    async def warm(text: str, voice_id: str):
+        async with semaphore:
+            try:
+                await cache.fetch(cache.cache_key(text, voice_id), text, voice_id, origin=ORIGIN_QUESTION)
+            except TTSUpstreamError as e:
+                failures.append({"text": text, "voice_id": voice_id, "error": e.detail})
+
+    await asyncio.gather(*(warm(text, voice_id) for text, voice_id in missing))
+
+    cached_before = total - len(missing)
+    cached_after = cached_before + len(missing) - len(failures)
+    return {
+        "prompts": len(prompts),
+        "voices": voices,
+        "total": total,
+        "cached_before": cached_before,
+        "synthesized": len(missing) - len(failures),
+        "failed": failures,
+        "coverage_before": _percent(cached_before, total),
+        "coverage": _percent(cached_after, total),
+    }
+
+
+async def prewarm_questions(
+    voices: Optional[List[str]] = None,
+    concurrency: Optional[int] = None,
+    include_options: Optional[bool] = None,
+) -> Dict:
+    """Pre-warm the cache for every question in the database."""
+    if include_options is None:
+        include_options = prewarm_options_enabled()
+    prompts = await collect_prompts(include_options)
+    return await prewarm_texts(prompts, voices, concurrency)
+
+
+async def tts_coverage(voices: Optional[List[str]] = None, include_options: Optional[bool] = None) -> Dict:
+    """Report how many (prompt, voice) pairs are already cached."""
+    if include_options is None:
+        include_options = prewarm_options_enabled()
+    cache = get_tts_cache()
+    voices = voices or get_prewarm_voices()
+    prompts = await collect_prompts(include_options)
+    total = len(prompts) * len(voices)
+    missing = await _missing(cache, prompts, voices)
+    return {
+        "prompts": len(prompts),
+        "voices": voices,
+        "total": total,
+        "cached": total - len(missing),
+        "coverage": _percent(total - len(missing), total),
+        "missing": [{"text": text, "voice_id": voice_id} for text, voice_id in missing],
+    }
+
+
+async def gc_tts_cache() -> Dict:
+    """Remove question-derived audio whose text no question or option uses any more."""
+    cache = get_tts_cache()
+    live_texts = set(await collect_prompts(include_options=True))
+    # Claim entries of live texts (legacy files indexed without a source, or
+    # first fetched ad hoc) by re-deriving their keys
+    _claim(cache, live_texts, get_prewarm_voices())
+    removed = await cache.gc(live_texts)
+    await cache.flush()
+    return {"removed": removed, "disk": cache.stats()["disk"]}
+
+
+def _percent(part: int, total: int) -> float:
+    return round(100.0 * part / total, 1) if total else 100.0
+
+
+async def _main(args):
+    from dotenv import load_dotenv
+    from database import init_engine, dispose_engine, init_db
+    from tts import close_tts_client, close_tts_cache
+
+    load_dotenv()
+    init_engine()
+    await init_db()
+    voices = [v.strip() for v in args.voices.split(",")] if args.voices else None
+    try:
+        if args.gc:
+            report = await gc_tts_cache()
+        elif args.coverage_only:
+            report = await tts_coverage(voices, args.options)
+        else:
+            report = await prewarm_questions(voices, args.concurrency, args.options)
+    finally:
+        await close_tts_client()
+        close_tts_cache()
+        await dispose_engine()
+    print(json.dumps(report, indent=2))
+    return 1 if report.get("failed") else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-synthesize TTS audio for every question prompt")
+    parser.add_argument("--voices", help="comma-separated ElevenLabs voice IDs (default: TTS_PREWARM_VOICES)")
+    parser.add_argument("--concurrency", type=int, help="max concurrent syntheses (default: TTS_PREWARM_CONCURRENCY)")
+    parser.add_argument("--options", action="store_true", default=None,
+                        help="also synthesize each option label (default: TTS_PREWARM_OPTIONS)")
+    parser.add_argument("--coverage-only", action="store_true", help="report coverage without synthesizing")
+    parser.add_argument("--gc", action="store_true", help="remove cached audio for prompts that no longer exist")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
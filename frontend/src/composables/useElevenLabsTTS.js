@@ -22,19 +22,17 @@ export function useElevenLabsTTS() {
         }
         // Use default female voice if none provided
         const finalVoiceId = voice_id || DEFAULT_FEMALE_VOICE_ID
-        const response = await api.post('/api/tts', { text, voice_id: finalVoiceId }, { responseType: 'blob' })
-        const blob = response.data
-        const url = URL.createObjectURL(blob)
+        // Stream via GET so the browser can start playback early, seek with
+        // Range requests and revalidate cached audio with ETag
+        const url = api.getUri({ url: '/api/tts', params: { text, voice_id: finalVoiceId } })
         audio = new Audio(url)
         audio.onended = () => {
           isSpeaking.value = false
-          URL.revokeObjectURL(url)
           resolve()
         }
         audio.onerror = (e) => {
           isSpeaking.value = false
           error.value = 'Audio playback error'
-          URL.revokeObjectURL(url)
           reject(error.value)
         }
         audio.play()
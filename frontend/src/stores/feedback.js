@@ -128,18 +128,18 @@ export const useFeedbackStore = defineStore('feedback', () => {
   }
 
   async function exportToCSV(sessionId) {
-    isLoading.value = true
-    error.value = null
-
-    try {
-      const response = await api.post(`/api/sessions/${sessionId}/export-csv`)
-      return response.data
-    } catch (err) {
-      error.value = err.message
-      throw err
-    } finally {
-      isLoading.value = false
-    }
+    // The export is streamed by the backend; let the browser download it
+    const url = api.getUri({
+      url: '/api/exports/answers',
+      params: { session_id: sessionId, format: 'csv' }
+    })
+    const link = document.createElement('a')
+    link.href = url
+    link.download = ''
+    document.body.appendChild(link)
+    link.click()
+    link.remove()
+    return { status: 'success', url }
   }
 
   function resetSession() {